@@ -0,0 +1,82 @@
+"""
+Versions of the data of each model, bumped when writes to the model are committed and again
+by the outbox relay. Cached responses built from a model include its version in their keys,
+so they're invalidated by a single increment instead of deleting every key.
+"""
+import logging
+from typing import Any, Iterable, Optional
+
+from django.core.cache import caches
+
+import redis
+
+from base.utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION_KEY = 'base:cache:version:{}'
+
+
+def get_cache_version(label: str) -> Optional[int]:
+    """Current version of ``label`` data, None if it can't be read and nothing should be cached."""
+    try:
+        version = get_redis_client().get(CACHE_VERSION_KEY.format(label))
+    except redis.RedisError:
+        logger.warning('Cache versions unavailable.', exc_info=True)
+        return None
+    return int(version or 0)
+
+
+def bump_cache_versions(labels: Iterable[str], fail_silently: bool = False) -> None:
+    pipeline = get_redis_client().pipeline(transaction=False)
+    for label in labels:
+        pipeline.incr(CACHE_VERSION_KEY.format(label))
+    try:
+        pipeline.execute()
+    except redis.RedisError:
+        if not fail_silently:
+            raise
+        logger.warning('Cache versions unavailable.', exc_info=True)
+
+
+def get_cache_versions(labels: list[str]) -> Optional[list[int]]:
+    """Versions of ``labels`` data read at once, None if they can't be read."""
+    try:
+        versions = get_redis_client().mget([CACHE_VERSION_KEY.format(label) for label in labels])
+    except redis.RedisError:
+        logger.warning('Cache versions unavailable.', exc_info=True)
+        return None
+    return [int(version or 0) for version in versions]
+
+
+class TwoTierCache:
+    """
+    A local memory cache in front of a shared one. Keys have to include the versions of the
+    data they're built from, entries are never invalidated otherwise.
+    """
+
+    def __init__(self, local: str, shared: str, local_timeout: float, timeout: float) -> None:
+        self.local = caches[local]
+        self.shared = caches[shared]
+        self.local_timeout = local_timeout
+        self.timeout = timeout
+
+    def get(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        try:
+            value = self.shared.get(key)
+        except redis.RedisError:
+            logger.warning('Shared cache unavailable.', exc_info=True)
+            return None
+        if value is not None:
+            self.local.set(key, value, self.local_timeout)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.local.set(key, value, self.local_timeout)
+        try:
+            self.shared.set(key, value, self.timeout)
+        except redis.RedisError:
+            logger.warning('Shared cache unavailable.', exc_info=True)
@@ -0,0 +1,255 @@
+"""
+Database dumps kept in ``dumps``, apart from the initial data shipped in ``geolocations/fixtures``.
+A full dump is a snapshot of ``DUMP_MODELS`` loadable with ``loaddata dumps/geolocations.json``,
+compressed according to DUMP_COMPRESSION. Incremental dumps append
+rows saved since the previous dump (by their ``updated_at``) and rows deleted since then
+(by their ``Tombstone``) to a JSON Lines log, which ``compact`` folds into the snapshot.
+Rows are streamed in chunks, so memory use doesn't depend on the size of the tables.
+"""
+import datetime
+import gzip
+import itertools
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import IO, Callable, Iterable, Iterator, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from base.models import Tombstone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = 'dumps/geolocations.json'
+DELTA_PATH = 'dumps/geolocations.delta.jsonl'
+STATE_PATH = 'dumps/geolocations.state.json'
+
+# Dumped in dependency order.
+DUMP_MODELS = ('languages.language', 'locations.location', 'geolocations.geolocation')
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _open(path: str, mode: str, compression: Optional[str] = None) -> IO[str]:
+    if compression == 'gzip':
+        return gzip.open(path, f'{mode}t', compresslevel=6, encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured('zstd compressed dumps require the zstandard package.')
+        return zstandard.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _compression(path: str) -> Optional[str]:
+    return next((compression for compression, suffix in COMPRESSION_SUFFIXES.items() if suffix and path.endswith(suffix)), None)
+
+
+def _write_atomic(path: str, write: Callable[[IO[str]], None]) -> None:
+    # Readers never see a partially written file.
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    try:
+        with _open(tmp_path, 'w', _compression(path)) as file:
+            write(file)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def _read_delta_lines() -> Iterator[str]:
+    if not os.path.exists(DELTA_PATH):
+        return
+    with open(DELTA_PATH, encoding='utf-8') as file:
+        for line in file:
+            if not line.endswith('\n'):
+                # Left by a dump that crashed while appending, the next dump truncates it.
+                logger.warning('Skipping an incomplete line at the end of %s.', DELTA_PATH)
+                return
+            yield line
+
+
+def _truncate_incomplete_line(path: str) -> None:
+    # Appends only ever add whole lines after this, so a crash can't corrupt logged changes.
+    with open(path, 'r+b') as file:
+        end = position = file.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(4096, position)
+            file.seek(position - step)
+            newline = file.read(step).rfind(b'\n')
+            if newline != -1:
+                position += newline + 1 - step
+                break
+            position -= step
+        if position != end:
+            logger.warning('Truncating an incomplete line at the end of %s.', path)
+            file.truncate(position)
+
+
+def _snapshot_path() -> str:
+    return SNAPSHOT_PATH + COMPRESSION_SUFFIXES[settings.DUMP_COMPRESSION]
+
+
+def _find_snapshot() -> Optional[str]:
+    # The snapshot may have been written with another compression.
+    paths = [_snapshot_path()] + [SNAPSHOT_PATH + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+    return next((path for path in paths if os.path.exists(path)), None)
+
+
+def _publish_snapshot(write: Callable[[IO[str]], None]) -> None:
+    path = _snapshot_path()
+    _write_atomic(path, write)
+    # loaddata refuses to pick between fixtures differing only in compression.
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if SNAPSHOT_PATH + suffix != path and os.path.exists(SNAPSHOT_PATH + suffix):
+            os.remove(SNAPSHOT_PATH + suffix)
+
+
+def _serialize(queryset: QuerySet) -> Iterator[dict]:
+    many_to_many = [field.name for field in queryset.model._meta.many_to_many]
+    # A server-side cursor on PostgreSQL, the serializer is given a chunk at a time.
+    rows = queryset.prefetch_related(*many_to_many).iterator(chunk_size=settings.DUMP_CHUNK_SIZE)
+    while chunk := list(itertools.islice(rows, settings.DUMP_CHUNK_SIZE)):
+        yield from serializers.serialize('python', chunk)
+
+
+def _write_objects(file: IO[str], objects: Iterable[dict]) -> None:
+    # A JSON array with an object per line, compaction reads it back line by line.
+    file.write('[')
+    separator = '\n'
+    for obj in objects:
+        file.write(separator + json.dumps(obj, cls=DjangoJSONEncoder))
+        separator = ',\n'
+    file.write('\n]\n')
+
+
+def _read_objects(path: str) -> Iterator[dict]:
+    with _open(path, 'r', _compression(path)) as file:
+        first_line = file.readline()
+        if first_line.strip() != '[':
+            # Written by dumpdata.
+            yield from json.loads(first_line + file.read())
+            return
+        for line in file:
+            line = line.strip().rstrip(',')
+            if line and line != ']':
+                yield json.loads(line)
+
+
+def _read_watermark() -> Optional[datetime.datetime]:
+    try:
+        with open(STATE_PATH, encoding='utf-8') as file:
+            return datetime.datetime.fromisoformat(json.load(file)['watermark'])
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def _write_watermark(watermark: datetime.datetime) -> None:
+    _write_atomic(STATE_PATH, lambda file: json.dump({'watermark': watermark.isoformat()}, file))
+
+
+def _all_objects() -> Iterator[dict]:
+    for label in DUMP_MODELS:
+        yield from _serialize(apps.get_model(label)._default_manager.order_by('pk'))
+
+
+def dump_full() -> None:
+    started_at = timezone.now()
+    try:
+        _publish_snapshot(lambda file: _write_objects(file, _all_objects()))
+    except DatabaseError:
+        logger.debug('Connection with primary database failed.')
+        return
+    # The snapshot includes every change logged so far.
+    _write_atomic(DELTA_PATH, lambda file: None)
+    _write_watermark(started_at)
+
+
+def dump_delta() -> None:
+    watermark = _read_watermark()
+    if watermark is None or _find_snapshot() is None:
+        dump_full()
+        return
+
+    started_at = timezone.now()
+    # Rows committed after the previous dump with an earlier updated_at are picked up
+    # by the overlap, logging a row twice is harmless.
+    since = watermark - datetime.timedelta(seconds=settings.DUMP_DELTA_OVERLAP_SECONDS)
+
+    if os.path.exists(DELTA_PATH):
+        _truncate_incomplete_line(DELTA_PATH)
+    else:
+        os.makedirs(os.path.dirname(DELTA_PATH) or '.', exist_ok=True)
+    # Appended, a dump costs the changes since the previous one whatever the size of the log.
+    # The watermark only moves once the batch is synced, a batch cut short is logged again.
+    with open(DELTA_PATH, 'a', encoding='utf-8') as file:
+        for label in DUMP_MODELS:
+            queryset = apps.get_model(label)._default_manager.filter(updated_at__gt=since).order_by('updated_at', 'pk')
+            for obj in _serialize(queryset):
+                file.write(json.dumps({'op': 'save', **obj}, cls=DjangoJSONEncoder) + '\n')
+
+        # Primary keys are never reused, so deletes can follow all saves.
+        tombstones = Tombstone.objects.filter(deleted_at__gt=since, model__in=DUMP_MODELS).order_by('deleted_at', 'pk')
+        for tombstone in tombstones.iterator(chunk_size=settings.DUMP_CHUNK_SIZE):
+            file.write(json.dumps({'op': 'delete', 'model': tombstone.model, 'pk': tombstone.object_pk}) + '\n')
+        file.flush()
+        os.fsync(file.fileno())
+    _write_watermark(started_at)
+
+
+def compact() -> None:
+    """Fold the change log into the snapshot and drop tombstones no dump will read again."""
+    path = _find_snapshot()
+    if path is None:
+        return
+
+    # Only rows changed since the previous compaction are held in memory.
+    changes: OrderedDict[tuple, Optional[dict]] = OrderedDict()
+    for line in _read_delta_lines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        key = (entry['model'], entry['pk'])
+        changes.pop(key, None)
+        if entry['op'] == 'delete':
+            changes[key] = None
+        else:
+            changes[key] = {'model': entry['model'], 'pk': entry['pk'], 'fields': entry['fields']}
+
+    def folded() -> Iterator[dict]:
+        for obj in _read_objects(path):
+            key = (obj['model'], obj['pk'])
+            if key not in changes:
+                yield obj
+            elif changes[key] is not None:
+                yield changes.pop(key)
+            else:
+                del changes[key]
+        yield from (obj for obj in changes.values() if obj is not None)
+
+    _publish_snapshot(lambda file: _write_objects(file, folded()))
+    _write_atomic(DELTA_PATH, lambda file: None)
+    watermark = _read_watermark()
+    if watermark is not None:
+        since = watermark - datetime.timedelta(seconds=settings.DUMP_DELTA_OVERLAP_SECONDS)
+        Tombstone.objects.filter(deleted_at__lte=since).delete()
+
+
+def dump() -> None:
+    if settings.DUMP_MODE == 'incremental':
+        dump_delta()
+    else:
+        dump_full()
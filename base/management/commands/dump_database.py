@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from base import dumps
+from base.tasks import compact_dumps
+
+
+class Command(BaseCommand):
+    help = 'Dump the database to dumps/, incrementally unless DUMP_MODE is "full".'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Write a new snapshot and drop the change log.')
+        parser.add_argument('--compact', action='store_true', help='Fold the change log into the snapshot.')
+
+    def handle(self, *args, **options):
+        if options['compact']:
+            compact_dumps()
+        elif options['full']:
+            dumps.dump_full()
+        else:
+            dumps.dump()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from base.snapshots import FORMATS, export_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Export languages, locations and geo locations with COPY, to be restored with import_snapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to write the snapshot to.')
+        parser.add_argument('--format', choices=FORMATS, default='binary', help='COPY format of the table files.')
+        parser.add_argument('--gzip', action='store_true', help='Compress the table files.')
+
+    def handle(self, *args, **options):
+        manifest = export_snapshot(options['directory'], fmt=options['format'], compress=options['gzip'])
+        for entry in manifest['tables']:
+            self.stdout.write(f'{entry["table"]}: {entry["rows"]} rows')
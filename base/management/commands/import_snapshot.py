@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.snapshots import SnapshotError, import_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Restore languages, locations and geo locations from a snapshot written by export_snapshot. '
+        'Run dump_database --full afterwards, the restore bypasses the change log.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory of the snapshot.')
+        parser.add_argument('--truncate', action='store_true', help='Replace the rows already stored.')
+
+    def handle(self, *args, **options):
+        try:
+            manifest = import_snapshot(options['directory'], truncate=options['truncate'])
+        except SnapshotError as exc:
+            raise CommandError(str(exc)) from exc
+        for entry in manifest['tables']:
+            self.stdout.write(f'{entry["table"]}: {entry["rows"]} rows')
@@ -0,0 +1,103 @@
+import hashlib
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from base.cache import TwoTierCache, get_cache_versions
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETags for list and retrieve responses of a viewset, derived from the data versions
+    of ``etag_models`` (bumped when writes commit, see ``base.signals.invalidate_cache``) and
+    the requested url. A matching ``If-None-Match`` is answered with 304 before the database
+    is queried.
+    """
+    # Labels of the models the representation is built from.
+    etag_models: tuple[str, ...] = ()
+
+    def get_etag(self, request: Request) -> Optional[str]:
+        if not self.etag_models:
+            return None
+        versions = get_cache_versions(list(self.etag_models))
+        if versions is None:
+            return None
+        key = '|'.join(
+            [f'{label}={version}' for label, version in zip(self.etag_models, versions)]
+            + [request.build_absolute_uri(), request.accepted_media_type or '']
+        )
+        return f'W/"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+
+    def _conditional(self, handler: Callable[..., Response], request: Request, *args, **kwargs) -> Response:
+        etag = self.get_etag(request)
+        if etag is not None:
+            # Weak comparison, as for every GET.
+            if_none_match = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+            if '*' in if_none_match or etag.removeprefix('W/') in if_none_match:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                self.patch_conditional_headers(response, etag)
+                return response
+            response = self.get_cached_response(etag)
+            if response is not None:
+                self.patch_conditional_headers(response, etag)
+                return response
+        response = handler(request, *args, **kwargs)
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            self.cache_response(etag, response)
+            self.patch_conditional_headers(response, etag)
+        return response
+
+    def patch_conditional_headers(self, response: Response, etag: str) -> None:
+        # A 304 carries the headers of the 200 it stands for. Responses depend on the
+        # user and are revalidated with the ETag every time.
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+
+    def get_cached_response(self, etag: str) -> Optional[Response]:
+        return None
+
+    def cache_response(self, etag: str, response: Response) -> None:
+        pass
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+
+class CachedResponseMixin(ConditionalGetMixin):
+    """
+    Keeps the data of list and retrieve responses in a ``TwoTierCache`` under their ETag,
+    which changes with the data versions, so a cached response is never stale.
+    """
+
+    def _response_cache(self) -> TwoTierCache:
+        return TwoTierCache(
+            settings.RESPONSE_CACHE['LOCAL'],
+            settings.RESPONSE_CACHE['SHARED'],
+            settings.RESPONSE_CACHE['LOCAL_TIMEOUT'],
+            settings.RESPONSE_CACHE['TIMEOUT'],
+        )
+
+    def _response_cache_key(self, etag: str) -> str:
+        digest = etag.removeprefix('W/').strip('"')
+        return f'responses:{self.basename}:{digest}'
+
+    def get_cached_response(self, etag: str) -> Optional[Response]:
+        if not settings.RESPONSE_CACHE['ENABLED']:
+            return None
+        data = self._response_cache().get(self._response_cache_key(etag))
+        return Response(data) if data is not None else None
+
+    def cache_response(self, etag: str, response: Response) -> None:
+        if not settings.RESPONSE_CACHE['ENABLED']:
+            return
+        self._response_cache().set(self._response_cache_key(etag), response.data)
@@ -1,4 +1,6 @@
 from django.contrib.gis.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
 
 
 class BaseModel(models.Model):
@@ -7,3 +9,38 @@ class BaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+    def save(self, *args, **kwargs) -> None:
+        # The outbox event of the save is written in the same transaction as the row.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class Tombstone(models.Model):
+    """Deleted row, recorded for incremental dumps (see ``base.dumps``)."""
+    model = models.CharField(max_length=100)
+    object_pk = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __repr__(self) -> str:
+        return f'{self.model}-{self.object_pk}'
+
+
+class OutboxOperations(models.TextChoices):
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+
+class OutboxEvent(models.Model):
+    """Change of a ``BaseModel`` row, relayed to the sinks by ``base.outbox.relay``."""
+    model = models.CharField(max_length=100)
+    object_pk = models.BigIntegerField()
+    operation = models.CharField(max_length=6, choices=OutboxOperations.choices)
+    # Fields of the row after the change, null for deletes and changes made by bulk updates.
+    payload = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __repr__(self) -> str:
+        return f'{self.operation}:{self.model}-{self.object_pk}'
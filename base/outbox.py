@@ -0,0 +1,87 @@
+"""
+Transactional outbox of ``BaseModel`` changes. Every create, update and delete writes an
+``OutboxEvent`` in the transaction of the change, ``relay`` drains the events in batches into
+the OUTBOX_SINKS, see ``base.sinks``.
+
+A batch is deleted in the transaction that locked it, after all sinks handled it, so every
+committed change is relayed and a failing sink leaves the batch for the next relay. Delivery
+is at least once, not exactly once: the sinks act on Redis and Celery while the transaction
+is still open, so a failing sink or a relay dying before the commit has the whole batch
+relayed again, to the sinks that already handled it too. Sinks have to tolerate replays,
+cache version bumps and dump requests are harmless twice and feed consumers deduplicate
+by the event id.
+"""
+from typing import Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Model
+from django.dispatch import Signal
+from django.utils.module_loading import import_string
+
+from base.models import OutboxEvent, OutboxOperations
+
+Sink = Callable[[list[OutboxEvent]], None]
+
+# Sent with the model as the sender and the database alias as ``using`` after events are recorded.
+changes_recorded = Signal()
+
+
+def _payload(instance: Model) -> dict:
+    fields = [field.name for field in instance._meta.concrete_fields if not field.primary_key]
+    return serializers.serialize('python', [instance], fields=fields)[0]['fields']
+
+
+def record(instances: Iterable[Model], operation: str, using: Optional[str] = None) -> None:
+    """Record changes of ``instances`` with their fields as the payload (none for deletes)."""
+    instances = list(instances)
+    if not instances:
+        return
+    OutboxEvent.objects.using(using).bulk_create([
+        OutboxEvent(
+            model=instance._meta.label_lower,
+            object_pk=instance.pk,
+            operation=operation,
+            payload=None if operation == OutboxOperations.DELETE else _payload(instance),
+        )
+        for instance in instances
+    ])
+    changes_recorded.send(sender=type(instances[0]), using=using)
+
+
+def record_pks(model: type[Model], pks: Iterable[int], operation: str, using: Optional[str] = None) -> None:
+    """Record changes of rows updated in bulk, consumers reload them."""
+    pks = list(pks)
+    if not pks:
+        return
+    OutboxEvent.objects.using(using).bulk_create([
+        OutboxEvent(model=model._meta.label_lower, object_pk=pk, operation=operation)
+        for pk in pks
+    ])
+    changes_recorded.send(sender=model, using=using)
+
+
+def _sinks() -> list[Sink]:
+    return [import_string(path) for path in settings.OUTBOX_SINKS]
+
+
+def relay(batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> int:
+    """Relay up to ``max_batches`` batches of ``batch_size`` events, returns the number relayed."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    max_batches = max_batches or settings.OUTBOX_MAX_BATCHES
+    sinks = _sinks()
+    relayed = 0
+    for _ in range(max_batches):
+        with transaction.atomic():
+            # Concurrent relays take other batches instead of waiting for this one.
+            events = list(OutboxEvent.objects.select_for_update(skip_locked=True).order_by('pk')[:batch_size])
+            if not events:
+                break
+            for sink in sinks:
+                sink(events)
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+        relayed += len(events)
+        if len(events) < batch_size:
+            break
+    return relayed
@@ -0,0 +1,142 @@
+import base64
+import binascii
+import datetime
+from collections import OrderedDict
+from typing import Optional
+
+from django.db import connections
+from django.db.models import BooleanField, QuerySet
+from django.db.models.expressions import RawSQL
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# created_at and id of the row a page starts after, and whether the page precedes it.
+Position = tuple[datetime.datetime, int, bool]
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages ordered by ``(created_at, id)``, the cursor holds the key of the row a page starts
+    after. Every page is a range scan of the composite index, whatever its depth, and no
+    ``COUNT(*)`` is run.
+    """
+    ordering = ('created_at', 'id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None) -> list:
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        reverse = position is not None and position[2]
+
+        if position is not None:
+            # A row value comparison is matched against the index, unlike its expansion with OR.
+            connection = connections[queryset.db]
+            quote_name = connection.ops.quote_name
+            opts = queryset.model._meta
+            fields = [opts.get_field(name) for name in self.ordering]
+            columns = ', '.join(f'{quote_name(opts.db_table)}.{quote_name(field.column)}' for field in fields)
+            condition = RawSQL(
+                f'({columns}) {"<" if reverse else ">"} (%s, %s)',
+                [field.get_db_prep_value(value, connection) for field, value in zip(fields, position[:2])],
+                output_field=BooleanField(),
+            )
+            queryset = queryset.filter(condition)
+        queryset = queryset.order_by(*(f'-{name}' if reverse else name for name in self.ordering))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = position is not None if not reverse else has_more
+        return self.page
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request: Request) -> Optional[Position]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk, reverse = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.datetime.fromisoformat(created_at), int(pk), reverse == '1'
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item, reverse: bool) -> str:
+        key = f'{item.created_at.isoformat()}|{item.pk}|{int(reverse)}'
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, base64.urlsafe_b64encode(key.encode('ascii')).decode('ascii'))
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Before the first row, the next page starts from the beginning.
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class OptionalKeysetPagination(LimitOffsetPagination):
+    """
+    ``LimitOffsetPagination`` unless ``?pagination=cursor`` or a cursor is requested,
+    then ``KeysetPagination``.
+    """
+    mode_query_param = 'pagination'
+    keyset_pagination_class = KeysetPagination
+
+    def is_keyset_requested(self, request: Request) -> bool:
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_pagination_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None) -> Optional[list]:
+        self.keyset = None
+        if self.is_keyset_requested(request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data) -> Response:
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
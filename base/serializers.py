@@ -1,17 +1,39 @@
-from django.db import transaction
+import datetime
+import functools
+from typing import Callable, Optional
 
-from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
 
-from base.tasks import dump_data_base
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
+DatetimeFormatter = Callable[[Optional[datetime.datetime]], Optional[str]]
 
-class BaseModelSerializer(serializers.ModelSerializer):
-    def save(self, **kwargs):
-        instance = super().save(**kwargs)
-        transaction.on_commit(lambda: dump_data_base.delay())
-        return instance
-    
-    def update(self, instance, validated_data):
-        instance = super().update(instance, validated_data)
-        transaction.on_commit(lambda: dump_data_base.delay())
-        return instance
+
+@functools.lru_cache(maxsize=32)
+def _iso_8601_formatter(field_timezone: datetime.tzinfo) -> DatetimeFormatter:
+    # DateTimeField.to_representation for aware datetimes with the ISO 8601 format.
+    def to_representation(value: Optional[datetime.datetime]) -> Optional[str]:
+        if not value:
+            return None
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return to_representation
+
+
+class BaseModelReadSerializer(serializers.BaseSerializer):
+    """
+    Output of a ``ModelSerializer`` built straight from the attributes of an instance
+    loaded from the database, without a serializer field per attribute. Subclasses return
+    the keys in the order of the model serializer.
+    """
+    datetime_field = serializers.DateTimeField()
+
+    def get_datetime_formatter(self) -> DatetimeFormatter:
+        # DateTimeField looks the current timezone up for every value, here it's done once per instance.
+        output_format = api_settings.DATETIME_FORMAT
+        if settings.USE_TZ and output_format is not None and output_format.lower() == ISO_8601:
+            return _iso_8601_formatter(timezone.get_current_timezone())
+        return self.datetime_field.to_representation
@@ -0,0 +1,76 @@
+import functools
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.utils import timezone
+
+from base import outbox
+from base.cache import bump_cache_versions
+from base.dumps import DUMP_MODELS
+from base.models import BaseModel, OutboxOperations, Tombstone
+
+
+def record_tombstone(sender, instance, using, **kwargs) -> None:
+    Tombstone.objects.using(using).create(model=sender._meta.label_lower, object_pk=instance.pk)
+
+
+def record_save(sender, instance, created, raw, using, **kwargs) -> None:
+    # Rows loaded from fixtures aren't changes.
+    if not raw:
+        outbox.record([instance], OutboxOperations.CREATE if created else OutboxOperations.UPDATE, using)
+
+
+def record_delete(sender, instance, using, **kwargs) -> None:
+    outbox.record([instance], OutboxOperations.DELETE, using)
+
+
+def invalidate_cache(sender, using, **kwargs) -> None:
+    # ETags and versioned caches follow the write as soon as it's committed, the outbox relay
+    # bumps the version again in case this fails.
+    bump = functools.partial(bump_cache_versions, [sender._meta.label_lower], fail_silently=True)
+    transaction.on_commit(bump, using=using)
+
+
+def touch_location(sender, instance, action, reverse, pk_set, using, **kwargs) -> None:
+    # Changed languages don't save the location, its updated_at has to be bumped for the dump.
+    Location = apps.get_model('locations', 'Location')
+    if reverse and action == 'pre_clear':
+        pks = list(Location.objects.using(using).filter(languages=instance).values_list('pk', flat=True))
+    elif reverse and action in ('post_add', 'post_remove'):
+        pks = list(pk_set)
+    elif not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        pks = [instance.pk]
+    else:
+        return
+    Location.objects.using(using).filter(pk__in=pks).update(updated_at=timezone.now())
+    outbox.record_pks(Location, pks, OutboxOperations.UPDATE, using)
+
+
+def touch_language_locations(sender, instance, using, **kwargs) -> None:
+    Location = apps.get_model('locations', 'Location')
+    pks = list(Location.objects.using(using).filter(languages=instance).values_list('pk', flat=True))
+    Location.objects.using(using).filter(pk__in=pks).update(updated_at=timezone.now())
+    outbox.record_pks(Location, pks, OutboxOperations.UPDATE, using)
+
+
+def touch_geolocations(sender, instance, using, **kwargs) -> None:
+    # Geo locations of a deleted location are set null with an UPDATE that leaves updated_at alone.
+    GeoLocation = apps.get_model('geolocations', 'GeoLocation')
+    pks = list(GeoLocation.objects.using(using).filter(location=instance).values_list('pk', flat=True))
+    GeoLocation.objects.using(using).filter(pk__in=pks).update(updated_at=timezone.now())
+    outbox.record_pks(GeoLocation, pks, OutboxOperations.UPDATE, using)
+
+
+def connect() -> None:
+    for label in DUMP_MODELS:
+        post_delete.connect(record_tombstone, sender=apps.get_model(label), dispatch_uid=f'tombstone-{label}')
+    for model in apps.get_models():
+        if issubclass(model, BaseModel):
+            post_save.connect(record_save, sender=model, dispatch_uid=f'outbox-save-{model._meta.label_lower}')
+            post_delete.connect(record_delete, sender=model, dispatch_uid=f'outbox-delete-{model._meta.label_lower}')
+    outbox.changes_recorded.connect(invalidate_cache, dispatch_uid='invalidate-cache')
+    Location = apps.get_model('locations', 'Location')
+    m2m_changed.connect(touch_location, sender=Location.languages.through, dispatch_uid='touch-location')
+    pre_delete.connect(touch_geolocations, sender=Location, dispatch_uid='touch-geolocations')
+    pre_delete.connect(touch_language_locations, sender=apps.get_model('languages', 'Language'), dispatch_uid='touch-language-locations')
@@ -0,0 +1,36 @@
+"""
+Sinks of the outbox relay, each is called with a batch of ``OutboxEvent``s inside the
+transaction holding them and raises to have the batch relayed again. A batch may reach a
+sink more than once, see ``base.outbox``.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from base.cache import bump_cache_versions
+from base.models import OutboxEvent
+from base.tasks import request_dump
+from base.utils import get_redis_client
+
+
+def dump_sink(events: list[OutboxEvent]) -> None:
+    request_dump()
+
+
+def cache_sink(events: list[OutboxEvent]) -> None:
+    bump_cache_versions(sorted({event.model for event in events}))
+
+
+def change_feed_sink(events: list[OutboxEvent]) -> None:
+    pipeline = get_redis_client().pipeline(transaction=False)
+    for event in events:
+        pipeline.xadd(settings.OUTBOX_FEED_STREAM, {
+            'id': event.pk,
+            'model': event.model,
+            'pk': event.object_pk,
+            'operation': event.operation,
+            'payload': json.dumps(event.payload, cls=DjangoJSONEncoder),
+            'created_at': event.created_at.isoformat(),
+        }, maxlen=settings.OUTBOX_FEED_MAXLEN, approximate=True)
+    pipeline.execute()
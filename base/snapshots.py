@@ -0,0 +1,173 @@
+"""
+Snapshots of languages, locations and geo locations written and restored with PostgreSQL
+``COPY``, in binary or CSV format (geometries travel as EWKB either way). Restores drop
+the secondary indexes and constraints of the tables, load them in bulk, rebuild indexes
+and constraints once, reset sequences and analyze the tables.
+"""
+import functools
+import gzip
+import json
+import os
+from typing import IO
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import Model
+from django.utils import timezone
+
+from base.cache import bump_cache_versions
+from geolocations.models import GeoLocation, GeoLocationStatistic
+from languages.models import Language
+from locations.models import Location
+
+MANIFEST_NAME = 'manifest.json'
+FORMATS = ('binary', 'csv')
+APPS = ('languages', 'locations', 'geolocations')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _models() -> list[type[Model]]:
+    # In dependency order.
+    return [Language, Location, Location.languages.through, GeoLocation]
+
+
+def _copy_options(fmt: str) -> str:
+    return '(FORMAT binary)' if fmt == 'binary' else '(FORMAT csv, HEADER true)'
+
+
+def _open(path: str, mode: str, compress: bool) -> IO[bytes]:
+    return gzip.open(path, mode, compresslevel=1) if compress else open(path, mode)
+
+
+def _migrations() -> dict[str, list[str]]:
+    applied = MigrationRecorder(connection).migration_qs.filter(app__in=APPS).order_by('app', 'name')
+    migrations = {app: [] for app in APPS}
+    for app, name in applied.values_list('app', 'name'):
+        migrations[app].append(name)
+    return migrations
+
+
+def export_snapshot(directory: str, fmt: str = 'binary', compress: bool = False) -> dict:
+    if fmt not in FORMATS:
+        raise SnapshotError(f'Unknown format {fmt!r}, expected one of {", ".join(FORMATS)}.')
+    os.makedirs(directory, exist_ok=True)
+    quote_name = connection.ops.quote_name
+    manifest = {
+        'format': fmt,
+        'compress': compress,
+        'created_at': timezone.now().isoformat(),
+        'migrations': _migrations(),
+        'tables': [],
+    }
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(), connection.cursor() as cursor:
+        if outermost:
+            # The tables are exported consistently with each other.
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        for model in _models():
+            opts = model._meta
+            columns = [field.column for field in opts.concrete_fields]
+            file_name = f'{opts.db_table}.{"copy" if fmt == "binary" else "csv"}{".gz" if compress else ""}'
+            query = (
+                f'COPY (SELECT {", ".join(quote_name(column) for column in columns)} '
+                f'FROM {quote_name(opts.db_table)} ORDER BY {quote_name(opts.pk.column)}) '
+                f'TO STDOUT WITH {_copy_options(fmt)}'
+            )
+            with _open(os.path.join(directory, file_name), 'wb', compress) as file:
+                cursor.copy_expert(query, file)
+            manifest['tables'].append({
+                'table': opts.db_table,
+                'columns': columns,
+                'file': file_name,
+                'rows': cursor.rowcount if cursor.rowcount >= 0 else model._base_manager.count(),
+            })
+
+    with open(os.path.join(directory, MANIFEST_NAME), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def _secondary_indexes(cursor, tables: list[str]) -> list[tuple[str, str]]:
+    cursor.execute(
+        'SELECT indexname, indexdef FROM pg_indexes '
+        'WHERE schemaname = current_schema() AND tablename = ANY(%s) '
+        'AND indexname NOT IN (SELECT conname FROM pg_constraint)',
+        [tables],
+    )
+    return cursor.fetchall()
+
+
+def _constraints(cursor, tables: list[str], contype: str) -> list[tuple[str, str, str]]:
+    cursor.execute(
+        'SELECT rel.relname, con.conname, pg_get_constraintdef(con.oid) FROM pg_constraint con '
+        'JOIN pg_class rel ON rel.oid = con.conrelid '
+        'WHERE con.contype = %s AND rel.relname = ANY(%s) '
+        'AND rel.relnamespace = current_schema()::regnamespace',
+        [contype, tables],
+    )
+    return cursor.fetchall()
+
+
+def import_snapshot(directory: str, truncate: bool = False) -> dict:
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as file:
+        manifest = json.load(file)
+    if manifest['migrations'] != _migrations():
+        raise SnapshotError('The snapshot was exported from a database with other migrations applied.')
+
+    models = {model._meta.db_table: model for model in _models()}
+    tables = [entry['table'] for entry in manifest['tables']]
+    if set(tables) != set(models):
+        raise SnapshotError(f'The snapshot has to contain the tables {", ".join(models)}.')
+    quote_name = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Tables can't be altered with deferred constraint checks of this transaction pending.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        if truncate:
+            cursor.execute(f'TRUNCATE {", ".join(quote_name(table) for table in tables)} RESTART IDENTITY CASCADE')
+        elif any(model.objects.exists() for model in (Language, Location, GeoLocation)):
+            raise SnapshotError('The tables aren\'t empty, restore with truncate to replace their rows.')
+
+        foreign_keys = _constraints(cursor, tables, 'f')
+        uniques = _constraints(cursor, tables, 'u')
+        indexes = _secondary_indexes(cursor, tables)
+        for table, name, _ in foreign_keys + uniques:
+            cursor.execute(f'ALTER TABLE {quote_name(table)} DROP CONSTRAINT {quote_name(name)}')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {quote_name(name)}')
+        # Statistics are counted once after the load instead of by row triggers.
+        for table in tables:
+            cursor.execute(f'ALTER TABLE {quote_name(table)} DISABLE TRIGGER USER')
+
+        for entry in manifest['tables']:
+            query = (
+                f'COPY {quote_name(entry["table"])} ({", ".join(quote_name(column) for column in entry["columns"])}) '
+                f'FROM STDIN WITH {_copy_options(manifest["format"])}'
+            )
+            with _open(os.path.join(directory, entry['file']), 'rb', manifest['compress']) as file:
+                cursor.copy_expert(query, file)
+            if cursor.rowcount not in (-1, entry['rows']):
+                raise SnapshotError(f'{entry["table"]}: {cursor.rowcount} rows loaded, {entry["rows"]} expected.')
+
+        # Built once over the loaded rows instead of maintained per row.
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for table, name, definition in uniques + foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name(name)} {definition}')
+
+        for table in tables:
+            cursor.execute(f'ALTER TABLE {quote_name(table)} ENABLE TRIGGER USER')
+        GeoLocationStatistic.objects.rebuild()
+
+        for query in connection.ops.sequence_reset_sql(no_style(), _models()):
+            cursor.execute(query)
+        for table in tables:
+            cursor.execute(f'ANALYZE {quote_name(table)}')
+        # Restored rows send no signals, cached responses, tiles and ETags are invalidated here.
+        labels = [model._meta.label_lower for model in (Language, Location, GeoLocation)]
+        transaction.on_commit(functools.partial(bump_cache_versions, labels, fail_silently=True))
+    return manifest
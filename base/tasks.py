@@ -1,18 +1,112 @@
 import logging
+import uuid
+from typing import Optional
 
-from django.core.management import CommandError, call_command
-from django.core.management.commands import dumpdata
+from django.conf import settings
 
+import redis
+
+from base import dumps, outbox
+from base.utils import get_redis_client
 from django_gis.celery import app
 
 logger = logging.getLogger(__name__)
 
+DUMP_PENDING_KEY = 'base:dump:pending'
+DUMP_DIRTY_KEY = 'base:dump:dirty'
+DUMP_LOCK_KEY = 'base:dump:lock'
+
+# Deletes the lock only if it is still held by the caller's token.
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def request_dump() -> None:
+    """
+    Schedule ``dump_data_base`` after writes. Requests made within DUMP_DEBOUNCE_SECONDS
+    of the first one are served by a single dump.
+    """
+    client = get_redis_client()
+    try:
+        client.set(DUMP_DIRTY_KEY, 1)
+        scheduled = client.set(DUMP_PENDING_KEY, 1, nx=True, ex=max(int(settings.DUMP_DEBOUNCE_SECONDS * 2), 1))
+    except redis.RedisError:
+        logger.warning('Dump debouncing unavailable, dumping right away.', exc_info=True)
+        dump_data_base.delay(force=True)
+        return
+    if scheduled:
+        dump_data_base.apply_async(countdown=settings.DUMP_DEBOUNCE_SECONDS)
+
+
+def _acquire_dump_lock(client: redis.Redis) -> Optional[str]:
+    token = uuid.uuid4().hex
+    if client.set(DUMP_LOCK_KEY, token, nx=True, ex=settings.DUMP_LOCK_TIMEOUT):
+        return token
+    return None
+
 
 @app.task
-def dump_data_base() -> None:
+def dump_data_base(force: bool = False) -> None:
+    client = get_redis_client()
+    try:
+        client.delete(DUMP_PENDING_KEY)
+        token = _acquire_dump_lock(client)
+        if token is None:
+            # The running dump schedules another one if there were writes in the meantime.
+            return
+        dirty, _ = client.pipeline().get(DUMP_DIRTY_KEY).delete(DUMP_DIRTY_KEY).execute()
+    except redis.RedisError:
+        logger.warning('Dump lock unavailable, dumping anyway.', exc_info=True)
+        dumps.dump()
+        return
 
-    with open('geolocations/fixtures/geolocations.json', 'w', encoding='utf-8') as file:
+    failed = False
+    try:
+        if force or dirty is not None:
+            dumps.dump()
+    except Exception:
+        failed = True
+        raise
+    finally:
         try:
-            call_command(dumpdata.Command(), exclude=['contenttypes', 'auth'], format='json', stdout=file)
-        except CommandError:
-            logger.debug('Connection with primary database failed.')
+            if failed:
+                # The writes weren't dumped, the flag has them retried by the next dump.
+                client.set(DUMP_DIRTY_KEY, 1)
+            client.eval(RELEASE_SCRIPT, 1, DUMP_LOCK_KEY, token)
+            rearm = client.exists(DUMP_DIRTY_KEY)
+        except redis.RedisError:
+            logger.warning('Dump lock unavailable.', exc_info=True)
+            rearm = False
+        if rearm:
+            request_dump()
+
+
+@app.task
+def compact_dumps() -> None:
+    client = get_redis_client()
+    try:
+        token = _acquire_dump_lock(client)
+    except redis.RedisError:
+        logger.warning('Dump lock unavailable, compaction skipped.', exc_info=True)
+        return
+    if token is None:
+        logger.info('A dump is running, compaction skipped.')
+        return
+    try:
+        dumps.compact()
+    finally:
+        try:
+            client.eval(RELEASE_SCRIPT, 1, DUMP_LOCK_KEY, token)
+        except redis.RedisError:
+            logger.warning('Dump lock unavailable.', exc_info=True)
+
+
+@app.task
+def relay_outbox() -> None:
+    relayed = outbox.relay()
+    if relayed:
+        logger.info('Relayed %d outbox events.', relayed)
@@ -1,35 +1,545 @@
+import collections
+import datetime
+import gzip
 import json
-from unittest.mock import patch
+import os
+import tempfile
+from unittest.mock import ANY, MagicMock, patch
 
-from django.test import tag
+import redis
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings, tag
 from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 
+from base import dumps
+from base.models import OutboxEvent, OutboxOperations, Tombstone
+from base.outbox import relay
+from base.sinks import change_feed_sink
+from base.snapshots import SnapshotError, export_snapshot, import_snapshot
+from base.tasks import DUMP_DIRTY_KEY, DUMP_LOCK_KEY, DUMP_PENDING_KEY, dump_data_base, request_dump
+from geolocations.models import GeoLocation
 from languages.models import Language
+from locations.models import Location
 
 
 @tag('base')
 class BaseModelTests(APITestCase):
     def test_save(self):
-        with patch('base.tasks.dump_data_base') as dump_data_base_mock:
-            with patch('django.db.transaction.on_commit') as on_commit_mock:
-                Language.objects.create(**{'code':'AA','name':'AAA','native':'AAA'})
-                dump_data_base_mock.delay.assert_called_once
-                on_commit_mock.delay.assert_called_once
+        language = Language.objects.create(**{'code':'AA','name':'AAA','native':'AAA'})
+        event = OutboxEvent.objects.get(model='languages.language', object_pk=language.pk)
+        self.assertEqual(event.operation, OutboxOperations.CREATE)
+        self.assertEqual(event.payload['code'], 'AA')
 
     def test_update(self):
         language = Language.objects.create(**{'code':'AA','name':'AAA','native':'AAA'})
+        language.code = 'BB'
+        language.save()
+        event = OutboxEvent.objects.filter(model='languages.language', object_pk=language.pk).latest('pk')
+        self.assertEqual(event.operation, OutboxOperations.UPDATE)
+        self.assertEqual(event.payload['code'], 'BB')
+
+
+@tag('base-outbox')
+class OutboxTests(TestCase):
+    def setUp(self) -> None:
+        self.sink = MagicMock()
+        patcher = patch('base.outbox._sinks', return_value=[self.sink])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_delete_recorded(self):
+        language = Language.objects.create(code='AA', name='AAA', native='AAA')
+        pk = language.pk
+        language.delete()
+        event = OutboxEvent.objects.latest('pk')
+        self.assertEqual((event.model, event.object_pk, event.operation, event.payload), ('languages.language', pk, OutboxOperations.DELETE, None))
+
+    def test_bulk_upsert_recorded(self):
+        GeoLocation.objects.bulk_upsert([
+            GeoLocation(ip='1.1.1.1', continent_code='EU', continent_name='Europe', country_code='PL', country_name='Poland', coordinates=Point(1, 2)),
+        ])
+        GeoLocation.objects.bulk_upsert([
+            GeoLocation(ip='1.1.1.1', continent_code='EU', continent_name='Europe', country_code='DE', country_name='Germany', coordinates=Point(1, 2)),
+        ])
+        events = OutboxEvent.objects.filter(model='geolocations.geolocation').order_by('pk')
+        self.assertEqual([event.operation for event in events], [OutboxOperations.CREATE, OutboxOperations.UPDATE])
+        self.assertEqual(events[1].payload['country_code'], 'DE')
+
+    def test_languages_change_recorded_for_location(self):
+        location = Location.objects.create(is_eu=False)
+        language = Language.objects.create(code='AA', name='AAA', native='AAA')
+        location.languages.add(language)
+        event = OutboxEvent.objects.latest('pk')
+        self.assertEqual((event.model, event.object_pk, event.operation), ('locations.location', location.pk, OutboxOperations.UPDATE))
+
+    def test_relay_in_batches(self):
+        for code in ('AA', 'BB', 'CC'):
+            Language.objects.create(code=code, name=code, native=code)
+        self.assertEqual(relay(batch_size=2), 3)
+        self.assertEqual([len(call.args[0]) for call in self.sink.call_args_list], [2, 1])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_relay_failed_sink_keeps_events(self):
+        Language.objects.create(code='AA', name='AAA', native='AAA')
+        self.sink.side_effect = redis.RedisError
+        with self.assertRaises(redis.RedisError):
+            relay()
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_change_feed_sink(self):
+        Language.objects.create(code='AA', name='AAA', native='AAA')
+        client = MagicMock()
+        with patch('base.sinks.get_redis_client', return_value=client):
+            change_feed_sink(list(OutboxEvent.objects.all()))
+        client.pipeline.return_value.xadd.assert_called_once_with(
+            'base:changes', ANY, maxlen=100000, approximate=True,
+        )
+        client.pipeline.return_value.execute.assert_called_once_with()
+
+
+@tag('base-dump')
+@override_settings(DUMP_DEBOUNCE_SECONDS=30, DUMP_LOCK_TIMEOUT=600)
+class DumpDataBaseTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.client = MagicMock()
+        patcher = patch('base.tasks.get_redis_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_request_dump_schedules_once_per_window(self):
+        self.client.set.side_effect = [True, True, True, None]
+        with patch.object(dump_data_base, 'apply_async') as apply_async_mock:
+            request_dump()
+            request_dump()
+        apply_async_mock.assert_called_once_with(countdown=30)
+        self.client.set.assert_any_call(DUMP_DIRTY_KEY, 1)
+        self.client.set.assert_any_call(DUMP_PENDING_KEY, 1, nx=True, ex=60)
+
+    def test_request_dump_without_redis_dumps_right_away(self):
+        self.client.set.side_effect = redis.ConnectionError
+        with patch.object(dump_data_base, 'delay') as delay_mock:
+            request_dump()
+        delay_mock.assert_called_once_with(force=True)
+
+    def test_dump_skipped_while_another_runs(self):
+        self.client.set.return_value = None
+        with patch('base.tasks.dumps.dump') as dump_mock:
+            dump_data_base()
+        dump_mock.assert_not_called()
+        self.client.set.assert_called_once_with(DUMP_LOCK_KEY, ANY, nx=True, ex=600)
+
+    def test_dump_runs_once_for_pending_writes(self):
+        self.client.set.return_value = True
+        self.client.pipeline.return_value.get.return_value.delete.return_value.execute.return_value = [b'1', 1]
+        self.client.exists.return_value = 0
+        with patch('base.tasks.dumps.dump') as dump_mock, patch('base.tasks.request_dump') as request_dump_mock:
+            dump_data_base()
+        dump_mock.assert_called_once_with()
+        request_dump_mock.assert_not_called()
+        self.client.eval.assert_called_once_with(ANY, 1, DUMP_LOCK_KEY, ANY)
+
+    def test_dump_rearmed_after_writes_during_run(self):
+        self.client.set.return_value = True
+        self.client.pipeline.return_value.get.return_value.delete.return_value.execute.return_value = [b'1', 1]
+        self.client.exists.return_value = 1
+        with patch('base.tasks.dumps.dump'), patch('base.tasks.request_dump') as request_dump_mock:
+            dump_data_base()
+        request_dump_mock.assert_called_once_with()
+
+    def test_failed_dump_keeps_writes_pending(self):
+        self.client.set.return_value = True
+        self.client.pipeline.return_value.get.return_value.delete.return_value.execute.return_value = [b'1', 1]
+        self.client.exists.return_value = 1
+        with patch('base.tasks.dumps.dump', side_effect=OSError('disk full')), \
+                patch('base.tasks.request_dump') as request_dump_mock:
+            with self.assertRaises(OSError):
+                dump_data_base()
+        self.client.set.assert_called_with(DUMP_DIRTY_KEY, 1)
+        self.client.eval.assert_called_once_with(ANY, 1, DUMP_LOCK_KEY, ANY)
+        request_dump_mock.assert_called_once_with()
+
+    def test_dump_skipped_without_writes(self):
+        self.client.set.return_value = True
+        self.client.pipeline.return_value.get.return_value.delete.return_value.execute.return_value = [None, 0]
+        self.client.exists.return_value = 0
+        with patch('base.tasks.dumps.dump') as dump_mock:
+            dump_data_base()
+        dump_mock.assert_not_called()
+
+
+@tag('base-incremental-dump')
+@override_settings(DUMP_DELTA_OVERLAP_SECONDS=0, DUMP_COMPRESSION=None, DUMP_CHUNK_SIZE=2)
+class IncrementalDumpTests(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.snapshot_path = os.path.join(directory.name, 'geolocations.json')
+        self.delta_path = os.path.join(directory.name, 'geolocations.delta.jsonl')
+        self.state_path = os.path.join(directory.name, 'geolocations.state.json')
+        for name, path in (('SNAPSHOT_PATH', self.snapshot_path), ('DELTA_PATH', self.delta_path), ('STATE_PATH', self.state_path)):
+            patcher = patch.object(dumps, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_snapshot(self, objects: list, watermark: datetime.datetime) -> None:
+        with open(self.snapshot_path, 'w', encoding='utf-8') as file:
+            json.dump(objects, file)
+        with open(self.state_path, 'w', encoding='utf-8') as file:
+            json.dump({'watermark': watermark.isoformat()}, file)
+
+    def read_delta(self) -> list[dict]:
+        with open(self.delta_path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_delete_records_tombstone(self):
+        language = Language.objects.create(code='AA', name='AAA', native='AAA')
+        pk = language.pk
+        language.delete()
+        self.assertTrue(Tombstone.objects.filter(model='languages.language', object_pk=pk).exists())
+
+    def test_languages_change_touches_location(self):
+        location = Location.objects.create(is_eu=False)
+        Location.objects.filter(pk=location.pk).update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        language = Language.objects.create(code='AA', name='AAA', native='AAA')
+        location.languages.add(language)
+        location.refresh_from_db()
+        self.assertGreater(location.updated_at, timezone.now() - datetime.timedelta(minutes=1))
+
+    def test_first_dump_is_full(self):
+        with patch.object(dumps, 'dump_full') as dump_full_mock:
+            dumps.dump_delta()
+        dump_full_mock.assert_called_once_with()
+
+    def test_delta_logs_changes_since_previous_dump(self):
+        old_language = Language.objects.create(code='AA', name='AAA', native='AAA')
+        self.write_snapshot([], timezone.now())
+        language = Language.objects.create(code='BB', name='BBB', native='BBB')
+        location = Location.objects.create(is_eu=True)
+        location.languages.add(language)
+        old_language_pk = old_language.pk
+        old_language.delete()
+
+        dumps.dump_delta()
+        entries = self.read_delta()
+        self.assertEqual([(entry['op'], entry['model'], entry['pk']) for entry in entries], [
+            ('save', 'languages.language', language.pk),
+            ('save', 'locations.location', location.pk),
+            ('delete', 'languages.language', old_language_pk),
+        ])
+        self.assertEqual(entries[1]['fields']['languages'], [language.pk])
+
+        dumps.dump_delta()
+        self.assertEqual(len(self.read_delta()), 3)
+
+    @override_settings(DUMP_COMPRESSION='gzip')
+    def test_full_dump_streamed_compressed(self):
+        languages = [Language.objects.create(code=code, name=code, native=code) for code in ('AA', 'BB', 'CC')]
+        location = Location.objects.create(is_eu=True)
+        location.languages.add(*languages[:2])
+        self.write_snapshot([], timezone.now())
+
+        dumps.dump_full()
+        self.assertFalse(os.path.exists(self.snapshot_path))
+        with gzip.open(f'{self.snapshot_path}.gz', 'rt', encoding='utf-8') as file:
+            objects = json.load(file)
+        self.assertEqual([(obj['model'], obj['pk']) for obj in objects], [
+            *[('languages.language', language.pk) for language in languages],
+            ('locations.location', location.pk),
+        ])
+        self.assertCountEqual(objects[3]['fields']['languages'], [languages[0].pk, languages[1].pk])
+        self.assertEqual(self.read_delta(), [])
+
+    def test_compact_folds_delta_into_snapshot(self):
+        self.write_snapshot([
+            {'model': 'languages.language', 'pk': 1, 'fields': {'code': 'AA'}},
+            {'model': 'languages.language', 'pk': 2, 'fields': {'code': 'BB'}},
+            {'model': 'sessions.session', 'pk': 'x', 'fields': {}},
+        ], timezone.now() + datetime.timedelta(minutes=1))
+        with open(self.delta_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'op': 'save', 'model': 'languages.language', 'pk': 2, 'fields': {'code': 'CC'}}) + '\n')
+            file.write(json.dumps({'op': 'save', 'model': 'languages.language', 'pk': 3, 'fields': {'code': 'DD'}}) + '\n')
+            file.write(json.dumps({'op': 'delete', 'model': 'languages.language', 'pk': 1}) + '\n')
+        Tombstone.objects.create(model='languages.language', object_pk=1)
+
+        dumps.compact()
+        with open(self.snapshot_path, encoding='utf-8') as file:
+            self.assertEqual(json.load(file), [
+                {'model': 'languages.language', 'pk': 2, 'fields': {'code': 'CC'}},
+                {'model': 'sessions.session', 'pk': 'x', 'fields': {}},
+                {'model': 'languages.language', 'pk': 3, 'fields': {'code': 'DD'}},
+            ])
+        self.assertEqual(self.read_delta(), [])
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_incomplete_last_line_skipped(self):
+        self.write_snapshot([{'model': 'languages.language', 'pk': 1, 'fields': {'code': 'AA'}}], timezone.now())
+        with open(self.delta_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'op': 'save', 'model': 'languages.language', 'pk': 1, 'fields': {'code': 'BB'}}) + '\n')
+            file.write('{"op": "save", "model": "languages.lang')
+
+        dumps.dump_delta()
+        # read_delta fails on a partial line.
+        self.assertEqual([entry['fields']['code'] for entry in self.read_delta()], ['BB'])
+        dumps.compact()
+        with open(self.snapshot_path, encoding='utf-8') as file:
+            self.assertEqual(json.load(file), [{'model': 'languages.language', 'pk': 1, 'fields': {'code': 'BB'}}])
+
+    def test_delta_appended_to_log(self):
+        self.write_snapshot([], timezone.now())
+        with open(self.delta_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'op': 'delete', 'model': 'languages.language', 'pk': 1}) + '\n')
+        inode = os.stat(self.delta_path).st_ino
+        Language.objects.create(code='AA', name='AAA', native='AAA')
+
+        dumps.dump_delta()
+        self.assertEqual(os.stat(self.delta_path).st_ino, inode)
+        self.assertEqual([entry['op'] for entry in self.read_delta()], ['delete', 'save'])
+
+    def test_failed_delta_leaves_log_intact(self):
+        self.write_snapshot([], timezone.now())
+        with open(self.delta_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'op': 'delete', 'model': 'languages.language', 'pk': 1}) + '\n')
+        Language.objects.create(code='AA', name='AAA', native='AAA')
+
+        with patch.object(dumps, '_serialize', side_effect=OSError('No space left on device')):
+            with self.assertRaises(OSError):
+                dumps.dump_delta()
+        self.assertEqual(self.read_delta(), [{'op': 'delete', 'model': 'languages.language', 'pk': 1}])
+
+
+@tag('base-snapshot')
+class SnapshotTests(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.language = Language.objects.create(code='en', name='English', native='English')
+        self.location = Location.objects.create(geoname_id=5368361, capital='Washington D.C.', is_eu=False)
+        self.location.languages.add(self.language)
+        self.geolocation = GeoLocation.objects.create(
+            ip='134.201.250.155', ip_type='ipv4', continent_code='NA', continent_name='North America',
+            country_code='US', country_name='United States', coordinates=Point(-118.2405, 34.0655),
+            location=self.location,
+        )
+
+    def assert_restored(self) -> None:
+        geolocation = GeoLocation.objects.select_related('location').get(ip='134.201.250.155')
+        self.assertEqual(geolocation.pk, self.geolocation.pk)
+        self.assertEqual(geolocation.coordinates.coords, (-118.2405, 34.0655))
+        self.assertEqual(list(geolocation.location.languages.all()), [self.language])
+        self.assertEqual(geolocation.created_at, self.geolocation.created_at)
+        # Sequences continue after the restored rows.
+        self.assertGreater(Language.objects.create(code='pl', name='Polish', native='Polski').pk, self.language.pk)
+
+    def test_binary_snapshot_restored(self):
+        manifest = export_snapshot(self.directory)
+        self.assertEqual([entry['rows'] for entry in manifest['tables']], [1, 1, 1, 1])
+        import_snapshot(self.directory, truncate=True)
+        self.assert_restored()
+
+    def test_compressed_csv_snapshot_restored(self):
+        export_snapshot(self.directory, fmt='csv', compress=True)
+        import_snapshot(self.directory, truncate=True)
+        self.assert_restored()
+
+    def test_restore_into_stored_rows_negative(self):
+        export_snapshot(self.directory)
+        with self.assertRaisesMessage(SnapshotError, "The tables aren't empty"):
+            import_snapshot(self.directory)
+
+    def test_restore_with_other_migrations_negative(self):
+        export_snapshot(self.directory)
+        manifest_path = os.path.join(self.directory, 'manifest.json')
+        with open(manifest_path, encoding='utf-8') as file:
+            manifest = json.load(file)
+        manifest['migrations']['geolocations'].append('9999_future')
+        with open(manifest_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file)
+        with self.assertRaises(SnapshotError):
+            import_snapshot(self.directory, truncate=True)
+
+
+@tag('base-pagination')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class KeysetPaginationTests(APITestCase):
+    def setUp(self) -> None:
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        created_at = timezone.now()
+        for code in ('AA', 'BB', 'CC', 'DD', 'EE'):
+            Language.objects.create(code=code, name=code, native=code)
+        # Rows sharing created_at are ordered by id.
+        Language.objects.update(created_at=created_at)
+        self.ids = list(Language.objects.order_by('created_at', 'id').values_list('id', flat=True))
+
+    def test_pages_follow_cursor(self):
+        url = f'{reverse("api:languages-list")}?pagination=cursor&limit=2'
+        ids, pages = [], []
+        while url:
+            # The user and the page, no count.
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids += [language['id'] for language in response.data['results']]
+            pages.append(response.data)
+            url = response.data['next']
+        self.assertEqual(ids, self.ids)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([language['id'] for language in response.data['results']], self.ids[2:4])
+
+    def test_limit_offset_by_default(self):
+        response = self.client.get(reverse('api:languages-list'), {'limit': 2, 'offset': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor_negative(self):
+        response = self.client.get(reverse('api:languages-list'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@tag('base-conditional-get')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class ConditionalGetTests(APITestCase):
+    def setUp(self) -> None:
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.language = Language.objects.create(code='AA', name='AAA', native='AAA')
+        patcher = patch('base.mixins.get_cache_versions', return_value=[1])
+        self.get_cache_versions_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_list_not_modified(self):
+        url = reverse('api:languages-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        # Only the user is read.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_not_modified_headers(self):
+        url = reverse('api:languages-list')
+        response = self.client.get(url)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        for header in ('ETag', 'Cache-Control', 'Vary'):
+            self.assertEqual(not_modified[header], response[header])
+        self.assertIn('Authorization', response['Vary'])
+
+    def test_modified_after_version_bumped(self):
+        url = reverse('api:languages-detail', args=(self.language.pk,))
+        etag = self.client.get(url)['ETag']
+        self.get_cache_versions_mock.return_value = [2]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_modified_after_snapshot_restored(self):
+        versions = collections.Counter()
+        self.get_cache_versions_mock.side_effect = lambda labels: [versions[label] for label in labels]
+        url = reverse('api:languages-list')
+        etag = self.client.get(url)['ETag']
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('base.snapshots.bump_cache_versions', side_effect=lambda labels, **kwargs: versions.update(labels)):
+            export_snapshot(directory)
+            with self.captureOnCommitCallbacks(execute=True):
+                import_snapshot(directory, truncate=True)
+        self.assertEqual(set(versions), {'languages.language', 'locations.location', 'geolocations.geolocation'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_differs_per_page(self):
+        url = reverse('api:languages-list')
+        self.assertNotEqual(self.client.get(url, {'offset': 1})['ETag'], self.client.get(url)['ETag'])
+
+    def test_without_versions(self):
+        self.get_cache_versions_mock.return_value = None
+        response = self.client.get(reverse('api:languages-list'), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_versions_bumped_on_commit(self):
+        # ETags change as soon as the write commits, not only after the outbox relay.
+        with patch('base.signals.bump_cache_versions') as bump_cache_versions_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                Language.objects.create(code='BB', name='BBB', native='BBB')
+        bump_cache_versions_mock.assert_called_once_with(['languages.language'], fail_silently=True)
+
+
+@tag('base-response-cache')
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'local'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+    },
+    RESPONSE_CACHE={'ENABLED': True, 'LOCAL': 'default', 'SHARED': 'shared', 'LOCAL_TIMEOUT': 60, 'TIMEOUT': 600},
+)
+class ResponseCacheTests(APITestCase):
+    def setUp(self) -> None:
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        Language.objects.create(code='AA', name='AAA', native='AAA')
+        patcher = patch('base.mixins.get_cache_versions', return_value=[1])
+        self.get_cache_versions_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('api:languages-list')
+
+    def test_cached(self):
+        data = self.client.get(self.url).data
+        # Only the user is read.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, data)
+
+    def test_shared_tier_fills_local_tier(self):
+        self.client.get(self.url)
+        caches['default'].clear()
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        self.assertEqual(len(caches['default']._cache), 1)
 
-        with patch('base.tasks.dump_data_base') as dump_data_base_mock:
-            with patch('django.db.transaction.on_commit') as on_commit_mock:
-                Language.objects.update(**{'id': language.pk, 'code': 'BB'})
-                dump_data_base_mock.delay.assert_called_once
-                on_commit_mock.delay.assert_called_once
+    def test_version_bump_invalidates(self):
+        self.client.get(self.url)
+        Language.objects.create(code='BB', name='BBB', native='BBB')
+        self.get_cache_versions_mock.return_value = [2]
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 2)
 
 
 @tag('jwt')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
 class JwtTests(APITestCase):
     def setUp(self) -> None:
         self.user = User.objects.create_user(username='test_user', email='test_user@test.com', password='test_pass')
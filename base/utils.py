@@ -1,6 +1,11 @@
+import functools
 import ipaddress
 from typing import Union
 
+from django.conf import settings
+
+import redis
+
 from geolocations.models import IPTypes
 
 
@@ -12,3 +17,9 @@ def is_ip_address(input: str) -> Union[bool, tuple[bool, int]]:
     else:
         ret = getattr(IPTypes, f"IPV{network.version}").value
     return ret
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    # Shares the Redis instance Celery already uses as its broker.
+    return redis.Redis.from_url(settings.CELERY_BROKER_URL, **settings.REDIS_OPTIONS)
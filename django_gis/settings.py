@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -138,6 +140,30 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 GEOIP_PATH = BASE_DIR / 'geolocations/data'
+# maxminddb.MODE_MMAP: pages of the .mmdb files are shared between forked workers.
+GEOIP_CACHE_MODE = 2
+# Seconds between checks of the .mmdb files for a newer database.
+GEOIP_RELOAD_INTERVAL = 5.0
+
+# Provider payloads cached per network. GeoIP2 reports the network of every record,
+# ipstack results are shared by the enclosing PREFIXLEN network of each IP version.
+GEOLOCATION_LOOKUP_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 60 * 60 * 24,
+    'PREFIXLEN': {4: 24, 6: 48},
+    'REDIS': os.environ.get('GEOLOCATION_LOOKUP_CACHE_REDIS', '0') == '1',
+}
+
+# Hostnames of url lookups are cached for the TTL of their DNS records, kept within
+# MIN_TTL..MAX_TTL seconds, and names that don't exist for NEGATIVE_TTL seconds.
+# LIFETIME bounds the seconds spent resolving a single name.
+GEOLOCATION_DNS = {
+    'MAX_ENTRIES': 10000,
+    'MIN_TTL': 30,
+    'MAX_TTL': 60 * 60,
+    'NEGATIVE_TTL': 60,
+    'LIFETIME': 2.0,
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -146,7 +172,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAdminUser',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    # Limit/offset pages, or keyset pages ordered by (created_at, id) with ?pagination=cursor.
+    'DEFAULT_PAGINATION_CLASS': 'base.pagination.OptionalKeysetPagination',
     'PAGE_SIZE': 100
 }
 
@@ -182,6 +209,153 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+IPSTACK = {
+    'URL': 'http://api.ipstack.com/',
+    'CONNECT_TIMEOUT': 1.0,
+    'READ_TIMEOUT': 3.0,
+    'RETRIES': 2,
+    'BACKOFF': 0.1,
+    'POOL_MAXSIZE': 32,
+    # Consecutive failed calls opening the circuit, and seconds before ipstack is probed again.
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+    # Addresses per Bulk Lookup Endpoint call (at most 50 on ipstack's side), and seconds
+    # concurrent single lookups wait to be sent together. 0 disables batching of single lookups.
+    'BULK_SIZE': 50,
+    'BATCH_DELAY': 0.005,
+    # Budget shared by all workers through Redis: calls per calendar month (UTC) of the ipstack
+    # plan and calls per second with bursts of up to BURST calls. None means no limit. Once spent,
+    # lookups go straight to GeoIP2.
+    'QUOTA': {
+        'REDIS': os.environ.get('IPSTACK_QUOTA_REDIS', '0') == '1',
+        'MONTHLY': int(os.environ.get('IPSTACK_MONTHLY_QUOTA', '0')) or None,
+        'RATE': float(os.environ.get('IPSTACK_RATE_LIMIT', '0')) or None,
+        'BURST': 10,
+    },
+}
+
+GEOLOCATION_BULK_MAX_ITEMS = 1000
+# Limits of the nearest and within searches, in geo locations and metres.
+GEOLOCATION_NEAREST_MAX_K = 100
+GEOLOCATION_MAX_RADIUS = 20000000
+# Exports read geo locations from a server-side cursor GEOLOCATION_EXPORT_CHUNK_SIZE at a time.
+GEOLOCATION_EXPORT_CHUNK_SIZE = 2000
+GEOLOCATION_BULK_MAX_WORKERS = 32
+
+# Concurrent adds of the same address share one lookup and write. With REDIS workers
+# coordinate through a lock held for at most LOCK_TIMEOUT seconds, waiting for up to
+# WAIT_TIMEOUT seconds for the result, which is kept for RESULT_TIMEOUT seconds.
+GEOLOCATION_SINGLE_FLIGHT = {
+    'LOCK_TIMEOUT': 15.0,
+    'WAIT_TIMEOUT': 10.0,
+    'RESULT_TIMEOUT': 5.0,
+    'POLL_INTERVAL': 0.05,
+    'REDIS': os.environ.get('GEOLOCATION_SINGLE_FLIGHT_REDIS', '0') == '1',
+}
+
+# Writes within DUMP_DEBOUNCE_SECONDS share one database dump, a single dump runs at a time
+# and holds its lock for at most DUMP_LOCK_TIMEOUT seconds.
+DUMP_DEBOUNCE_SECONDS = 30
+DUMP_LOCK_TIMEOUT = 60 * 30
+# 'incremental' appends rows changed since the previous dump to a change log, compacted
+# into the snapshot by the compact-dumps schedule, 'full' writes a new snapshot every time.
+DUMP_MODE = os.environ.get('DUMP_MODE', 'incremental')
+# Seconds the window of every incremental dump reaches back before the previous one,
+# covering transactions committed after it.
+DUMP_DELTA_OVERLAP_SECONDS = 60 * 5
+# Languages, locations and geo locations are dumped to dumps/geolocations.json
+# compressed with DUMP_COMPRESSION: 'gzip', 'zstd' (requires zstandard, not readable by
+# loaddata) or None. Rows are read DUMP_CHUNK_SIZE at a time.
+DUMP_COMPRESSION = os.environ.get('DUMP_COMPRESSION', 'gzip') or None
+DUMP_CHUNK_SIZE = 2000
+
+# Changes of BaseModel rows are written to an outbox in their transaction and relayed to
+# OUTBOX_SINKS every OUTBOX_RELAY_INTERVAL seconds, OUTBOX_BATCH_SIZE events at a time and
+# at most OUTBOX_MAX_BATCHES batches per relay, at least once. The change feed is the
+# OUTBOX_FEED_STREAM Redis stream, trimmed to about OUTBOX_FEED_MAXLEN entries, events can
+# repeat in it and carry their id for deduplication.
+OUTBOX_SINKS = [
+    'base.sinks.dump_sink',
+    'base.sinks.cache_sink',
+    'base.sinks.change_feed_sink',
+]
+OUTBOX_RELAY_INTERVAL = 5.0
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_MAX_BATCHES = 20
+OUTBOX_FEED_STREAM = 'base:changes'
+OUTBOX_FEED_MAXLEN = 100000
+
 CELERY_TIMEZONE = 'Europe/Warsaw'
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
+
+# Redis is on the request path (lookup cache, quota, single flight, response cache and ETags),
+# commands give up after REDIS_SOCKET_TIMEOUT seconds and callers take their fallback instead
+# of hanging. Idle connections are checked every REDIS_HEALTH_CHECK_INTERVAL seconds.
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 1.0))
+REDIS_HEALTH_CHECK_INTERVAL = 30
+REDIS_OPTIONS = {
+    'socket_timeout': REDIS_SOCKET_TIMEOUT,
+    'socket_connect_timeout': REDIS_SOCKET_TIMEOUT,
+    'health_check_interval': REDIS_HEALTH_CHECK_INTERVAL,
+}
+
+# 'default' is the local memory tier of the response cache, 'shared' holds tiles, aggregates
+# and the shared tier of responses.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        # TILE_CACHE_URL is the name of the variable before the cache was shared.
+        'LOCATION': os.environ.get('SHARED_CACHE_URL') or os.environ.get('TILE_CACHE_URL', CELERY_BROKER_URL),
+        'KEY_PREFIX': 'django_gis',
+        'OPTIONS': REDIS_OPTIONS,
+    },
+}
+
+# List and retrieve responses of the viewsets are kept for LOCAL_TIMEOUT seconds in the LOCAL
+# cache and TIMEOUT seconds in the SHARED one, under the versions of the data they show.
+# Test cases roll their writes back instead of committing them, versions wouldn't follow,
+# so the ones reading the viewsets turn it off.
+RESPONSE_CACHE = {
+    'ENABLED': True,
+    'LOCAL': 'default',
+    'SHARED': 'shared',
+    'LOCAL_TIMEOUT': 60,
+    'TIMEOUT': 60 * 10,
+}
+
+# Vector tiles of geo locations up to MAX_ZOOM, EXTENT units wide with a BUFFER around, are kept
+# in the CACHE cache for TIMEOUT seconds or until the next write, browsers keep them for MAX_AGE.
+GEOLOCATION_TILES = {
+    'CACHE': 'shared',
+    'TIMEOUT': 60 * 60 * 24,
+    'MAX_AGE': 60,
+    'MAX_ZOOM': 22,
+    'EXTENT': 4096,
+    'BUFFER': 64,
+}
+
+# Density aggregates split every tile of the zoom level into CELLS_PER_TILE cells per side,
+# over boxes of at most MAX_TILES tiles. They're cached like tiles.
+GEOLOCATION_AGGREGATION = {
+    'CACHE': 'shared',
+    'TIMEOUT': 60 * 60 * 24,
+    'MAX_AGE': 60,
+    'MAX_ZOOM': 22,
+    'CELLS_PER_TILE': 8,
+    'MAX_TILES': 64,
+}
+CELERY_BEAT_SCHEDULE = {
+    'compact-dumps': {
+        'task': 'base.tasks.compact_dumps',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'relay-outbox': {
+        'task': 'base.tasks.relay_outbox',
+        'schedule': OUTBOX_RELAY_INTERVAL,
+    },
+}
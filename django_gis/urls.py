@@ -24,7 +24,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
-from geolocations.views import GeoLocationViewSet
+from geolocations.views import GeoLocationAsyncAddView, GeoLocationTileView, GeoLocationViewSet
 from languages.views import LanguageViewSet
 from locations.views import LocationViewSet
 
@@ -33,10 +33,16 @@ router.register(r'geolocations', GeoLocationViewSet, basename='geolocations')
 router.register(r'languages', LanguageViewSet, basename='languages')
 router.register(r'locations', LocationViewSet, basename='locations')
 
+api_urlpatterns = [
+    # Before the router urls, they'd take 'async-add' for a geolocation pk.
+    path('geolocations/async-add/', GeoLocationAsyncAddView.as_view(), name='geolocations-async-add'),
+    path('geolocations/tiles/<int:z>/<int:x>/<int:y>.mvt', GeoLocationTileView.as_view(), name='geolocations-tiles'),
+] + router.urls
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include((router.urls, 'router'), namespace='api')),
+    path('api/', include((api_urlpatterns, 'router'), namespace='api')),
     path('api/token/', TokenObtainPairView.as_view(permission_classes=(AllowAny,)), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(permission_classes=(AllowAny,)), name='token_refresh'),
 ]
@@ -0,0 +1,133 @@
+"""
+Density of geo locations in a bounding box: counts and centroids of square or hexagonal
+grid cells, or of DBSCAN clusters, computed by PostGIS in Web Mercator. The cell size
+follows the zoom level and the box is widened to the tiles of that zoom, so results of
+nearby boxes share cache entries.
+"""
+import logging
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+import redis
+
+from base.cache import get_cache_version
+from geolocations.models import GeoLocation
+
+logger = logging.getLogger(__name__)
+
+MODES = ('grid', 'hex', 'cluster')
+# Half the circumference of the Web Mercator world, in metres.
+MERCATOR_EXTENT = 20037508.342789244
+MERCATOR_MAX_LATITUDE = 85.0511287798066
+
+
+class AggregationError(Exception):
+    pass
+
+
+def _mercator(longitude: float, latitude: float) -> tuple[float, float]:
+    latitude = max(min(latitude, MERCATOR_MAX_LATITUDE), -MERCATOR_MAX_LATITUDE)
+    x = longitude * MERCATOR_EXTENT / 180
+    y = math.log(math.tan(math.radians(90 + latitude) / 2)) * MERCATOR_EXTENT / math.pi
+    return x, y
+
+
+def tile_range(bbox: tuple[float, float, float, float], zoom: int) -> tuple[int, int, int, int]:
+    """Columns and rows of the tiles of ``zoom`` covering ``bbox``, counted from the south-west corner."""
+    tile_size = 2 * MERCATOR_EXTENT / 2 ** zoom
+    west, south = _mercator(bbox[0], bbox[1])
+    east, north = _mercator(bbox[2], bbox[3])
+    last = 2 ** zoom - 1
+
+    def tile(coordinate: float) -> int:
+        return max(0, min(int((coordinate + MERCATOR_EXTENT) // tile_size), last))
+
+    return tile(west), tile(south), tile(east), tile(north)
+
+
+def _query(mode: str) -> str:
+    opts = GeoLocation._meta
+    quote_name = connection.ops.quote_name
+    coordinates = quote_name(opts.get_field('coordinates').column)
+    srid = opts.get_field('coordinates').srid
+    points = (
+        f'SELECT {quote_name(opts.pk.column)} AS id, ST_Transform({coordinates}, 3857) AS geom '
+        f'FROM {quote_name(opts.db_table)} '
+        # Compared in the SRID of the column, so the spatial index serves it.
+        f'WHERE {coordinates} && ST_Transform(ST_MakeEnvelope(%(west)s, %(south)s, %(east)s, %(north)s, 3857), {srid})'
+    )
+    centroid = 'ST_Transform(ST_Centroid(ST_Collect(points.geom)), 4326)'
+    if mode == 'grid':
+        return (
+            f'SELECT count(*), ST_X({centroid}), ST_Y({centroid}), '
+            'ST_X(ST_Transform(cell, 4326)), ST_Y(ST_Transform(cell, 4326)) '
+            f'FROM (SELECT geom, ST_SnapToGrid(geom, %(size)s) AS cell FROM ({points}) points) points '
+            'GROUP BY cell'
+        )
+    if mode == 'hex':
+        # A point on the edge shared by cells intersects all of them, it's counted in the first by (i, j).
+        return (
+            f'SELECT count(*), ST_X({centroid}), ST_Y({centroid}), '
+            'ST_X(ST_Transform(ST_Centroid(cell), 4326)), ST_Y(ST_Transform(ST_Centroid(cell), 4326)) '
+            'FROM (SELECT DISTINCT ON (points.id) points.geom, cells.geom AS cell '
+            'FROM ST_HexagonGrid(%(size)s, ST_MakeEnvelope(%(west)s, %(south)s, %(east)s, %(north)s, 3857)) cells '
+            f'JOIN ({points}) points ON ST_Intersects(cells.geom, points.geom) '
+            'ORDER BY points.id, cells.i, cells.j) points '
+            'GROUP BY cell'
+        )
+    return (
+        f'SELECT count(*), ST_X({centroid}), ST_Y({centroid}), NULL, NULL '
+        'FROM (SELECT geom, ST_ClusterDBSCAN(geom, eps := %(size)s, minpoints := 1) OVER () AS cluster '
+        f'FROM ({points}) points) points '
+        'GROUP BY cluster'
+    )
+
+
+def compute(mode: str, zoom: int, tiles: tuple[int, int, int, int]) -> list[dict]:
+    tile_size = 2 * MERCATOR_EXTENT / 2 ** zoom
+    params = {
+        'west': tiles[0] * tile_size - MERCATOR_EXTENT,
+        'south': tiles[1] * tile_size - MERCATOR_EXTENT,
+        'east': (tiles[2] + 1) * tile_size - MERCATOR_EXTENT,
+        'north': (tiles[3] + 1) * tile_size - MERCATOR_EXTENT,
+        'size': tile_size / settings.GEOLOCATION_AGGREGATION['CELLS_PER_TILE'],
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(_query(mode), params)
+        rows = cursor.fetchall()
+    return sorted((
+        {
+            'count': count,
+            'centroid': [longitude, latitude],
+            'cell': [cell_longitude, cell_latitude] if cell_longitude is not None else None,
+        }
+        for count, longitude, latitude, cell_longitude, cell_latitude in rows
+    ), key=lambda item: (-item['count'], item['centroid']))
+
+
+def aggregate(bbox: tuple[float, float, float, float], zoom: int, mode: str) -> dict:
+    tiles = tile_range(bbox, zoom)
+    if (tiles[2] - tiles[0] + 1) * (tiles[3] - tiles[1] + 1) > settings.GEOLOCATION_AGGREGATION['MAX_TILES']:
+        raise AggregationError('The bounding box is too large for the zoom level.')
+
+    version = get_cache_version(GeoLocation._meta.label_lower)
+    if version is None:
+        return {'mode': mode, 'zoom': zoom, 'cells': compute(mode, zoom, tiles)}
+
+    cache = caches[settings.GEOLOCATION_AGGREGATION['CACHE']]
+    key = f'geolocations:aggregate:{version}:{mode}:{zoom}:{":".join(map(str, tiles))}'
+    try:
+        cells = cache.get(key)
+    except redis.RedisError:
+        logger.warning('Aggregation cache unavailable.', exc_info=True)
+        return {'mode': mode, 'zoom': zoom, 'cells': compute(mode, zoom, tiles)}
+    if cells is None:
+        cells = compute(mode, zoom, tiles)
+        try:
+            cache.set(key, cells, settings.GEOLOCATION_AGGREGATION['TIMEOUT'])
+        except redis.RedisError:
+            logger.warning('Aggregation cache unavailable.', exc_info=True)
+    return {'mode': mode, 'zoom': zoom, 'cells': cells}
@@ -0,0 +1,67 @@
+from django.db import transaction
+
+from base import outbox
+from base.models import OutboxOperations
+from geolocations.models import GeoLocation
+from geolocations.serializers import GeoLocationUpsertSerializer
+from languages.models import Language
+from locations.models import Location
+
+
+class GeoLocationBulkWriter:
+    """
+    Stores geolocations validated by the provider serializers with ``defer_location``
+    in their context: all locations, languages and geolocations of a batch are written
+    with one bulk statement per table, in a single transaction.
+    """
+
+    def __init__(self) -> None:
+        self.items: list[tuple[dict, dict]] = []
+
+    def add(self, validated_data: dict) -> None:
+        data = dict(validated_data)
+        location_data = data.pop('location')
+        serializer = GeoLocationUpsertSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        self.items.append((serializer.validated_data, location_data))
+
+    @transaction.atomic
+    def save(self) -> list[tuple[GeoLocation, bool]]:
+        if not self.items:
+            return []
+
+        language_data = {
+            (language['code'], language['name'], language['native']): language
+            for _, location_data in self.items
+            for language in location_data['languages']
+        }
+        languages = {
+            (language.code, language.name, language.native): language
+            for language in Language.objects.get_or_create_many(list(language_data.values()))
+        }
+
+        locations = Location.objects.bulk_create([
+            Location(**{key: value for key, value in location_data.items() if key != 'languages'})
+            for _, location_data in self.items
+        ])
+        outbox.record(locations, OutboxOperations.CREATE)
+        Location.languages.through.objects.bulk_create([
+            Location.languages.through(
+                location_id=location.pk,
+                language_id=languages[(language['code'], language['name'], language['native'])].pk,
+            )
+            for location, (_, location_data) in zip(locations, self.items)
+            for language in location_data['languages']
+        ], ignore_conflicts=True)
+
+        results = GeoLocation.objects.bulk_upsert([
+            GeoLocation(**validated_data, location=location)
+            for location, (validated_data, _) in zip(locations, self.items)
+        ])
+        # Locations of rows overwritten by a later duplicate of the same batch aren't referenced.
+        stored = {geolocation.location_id for geolocation, _ in results}
+        orphaned = [location.pk for location in locations if location.pk not in stored]
+        if orphaned:
+            Location.objects.filter(pk__in=orphaned).delete()
+
+        return results
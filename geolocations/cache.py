@@ -0,0 +1,177 @@
+import copy
+import ipaddress
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Union
+
+from django.conf import settings
+
+import redis
+
+from base.utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class LookupCache:
+    """
+    TTL/LRU cache of provider payloads keyed by the network the looked up address belongs to,
+    so every address of a cached network is served by a single entry.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int,
+        timeout: float,
+        default_prefixlen: dict[int, int],
+        use_redis: bool = False,
+    ) -> None:
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.default_prefixlen = default_prefixlen
+        self.use_redis = use_redis
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._prefixlens: dict[int, set[int]] = {4: set(), 6: set()}
+        self.hits = 0
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, suffix: str) -> str:
+        return f'geolocations:lookup:{self.namespace}:{suffix}'
+
+    def _candidates(self, address: ipaddress._BaseAddress, prefixlens: set[int]) -> list[str]:
+        return [
+            str(ipaddress.ip_network((address, prefixlen), strict=False))
+            for prefixlen in sorted(prefixlens, reverse=True)
+        ]
+
+    def _get_local(self, address: ipaddress._BaseAddress) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            for key in self._candidates(address, self._prefixlens[address.version]):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, payload = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                return payload
+        return None
+
+    def _set_local(self, key: str, version: int, prefixlen: int, expires_at: float, payload: dict) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            self._prefixlens[version].add(prefixlen)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_redis(self, address: ipaddress._BaseAddress) -> Optional[dict]:
+        client = get_redis_client()
+        prefixlens = {int(x) for x in client.smembers(self._redis_key(f'prefixlens:{address.version}'))}
+        keys = self._candidates(address, prefixlens)
+        if not keys:
+            return None
+        for key, value in zip(keys, client.mget([self._redis_key(key) for key in keys])):
+            if value is None:
+                continue
+            entry = json.loads(value)
+            network = ipaddress.ip_network(key)
+            self._set_local(key, network.version, network.prefixlen, entry['expires_at'], entry['payload'])
+            return entry['payload']
+        return None
+
+    def _set_redis(self, key: str, version: int, prefixlen: int, expires_at: float, payload: dict) -> None:
+        value = json.dumps({'expires_at': expires_at, 'payload': payload})
+        pipeline = get_redis_client().pipeline()
+        pipeline.set(self._redis_key(key), value, ex=max(int(self.timeout), 1))
+        pipeline.sadd(self._redis_key(f'prefixlens:{version}'), prefixlen)
+        pipeline.execute()
+
+    def get(self, ip: str) -> Optional[dict]:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+
+        payload = self._get_local(address)
+        if payload is not None:
+            with self._lock:
+                self.hits += 1
+                self.local_hits += 1
+            return copy.deepcopy(payload)
+
+        if self.use_redis:
+            try:
+                payload = self._get_redis(address)
+            except redis.RedisError:
+                logger.warning('Lookup cache %s: Redis tier unavailable.', self.namespace, exc_info=True)
+            if payload is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.redis_hits += 1
+                return copy.deepcopy(payload)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, ip: str, payload: dict, network: Optional[Network] = None) -> None:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return
+        if network is None:
+            network = ipaddress.ip_network((address, self.default_prefixlen[address.version]), strict=False)
+
+        key = str(network)
+        expires_at = time.time() + self.timeout
+        payload = copy.deepcopy(payload)
+        self._set_local(key, network.version, network.prefixlen, expires_at, payload)
+        if self.use_redis:
+            try:
+                self._set_redis(key, network.version, network.prefixlen, expires_at, payload)
+            except redis.RedisError:
+                logger.warning('Lookup cache %s: Redis tier unavailable.', self.namespace, exc_info=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._prefixlens = {4: set(), 6: set()}
+            self.hits = self.local_hits = self.redis_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'local_hits': self.local_hits,
+                'redis_hits': self.redis_hits,
+                'misses': self.misses,
+            }
+
+
+def _lookup_cache(namespace: str) -> LookupCache:
+    options = settings.GEOLOCATION_LOOKUP_CACHE
+    return LookupCache(
+        namespace,
+        max_entries=options['MAX_ENTRIES'],
+        timeout=options['TIMEOUT'],
+        default_prefixlen=options['PREFIXLEN'],
+        use_redis=options['REDIS'],
+    )
+
+
+geoip2_cache = _lookup_cache('geoip2')
+ipstack_cache = _lookup_cache('ipstack')
@@ -0,0 +1,107 @@
+"""
+Exports of every geo location with its location and languages as a GeoJSON FeatureCollection,
+NDJSON features or CSV. Rows are read from a server-side cursor and written a chunk at a
+time, so memory use doesn't depend on the number of rows.
+"""
+import csv
+import io
+import itertools
+import json
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from geolocations.models import GeoLocation
+
+CONTENT_TYPES = {
+    'geojson': 'application/geo+json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+FORMATS = tuple(CONTENT_TYPES)
+
+FIELDS = (
+    'ip', 'ip_type', 'continent_code', 'continent_name', 'country_code', 'country_name',
+    'region_code', 'region_name', 'city', 'postal_code', 'created_at', 'updated_at',
+)
+CSV_HEADER = (
+    ('id',) + FIELDS + ('longitude', 'latitude', 'location_id', 'geoname_id', 'capital', 'is_eu', 'languages')
+)
+
+
+def _chunks() -> Iterator[list[GeoLocation]]:
+    chunk_size = settings.GEOLOCATION_EXPORT_CHUNK_SIZE
+    rows = GeoLocation.objects.with_location().order_by('pk').iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        yield chunk
+
+
+def _languages(geolocation: GeoLocation) -> list:
+    if geolocation.location is None:
+        return []
+    return sorted(geolocation.location.languages.all(), key=lambda language: language.pk)
+
+
+def feature(geolocation: GeoLocation) -> dict:
+    location = geolocation.location
+    properties = {field: getattr(geolocation, field) for field in FIELDS}
+    properties['location'] = None if location is None else {
+        'id': location.pk,
+        'geoname_id': location.geoname_id,
+        'capital': location.capital,
+        'is_eu': location.is_eu,
+        'languages': [
+            {'code': language.code, 'name': language.name, 'native': language.native}
+            for language in _languages(geolocation)
+        ],
+    }
+    return {
+        'type': 'Feature',
+        'id': geolocation.pk,
+        'geometry': {'type': 'Point', 'coordinates': [geolocation.coordinates.x, geolocation.coordinates.y]},
+        'properties': properties,
+    }
+
+
+def _dumps(geolocation: GeoLocation) -> str:
+    return json.dumps(feature(geolocation), cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def export_geojson(chunks: Iterable[list[GeoLocation]]) -> Iterator[str]:
+    yield '{"type": "FeatureCollection", "features": [\n'
+    separator = ''
+    for chunk in chunks:
+        yield separator + ',\n'.join(_dumps(geolocation) for geolocation in chunk)
+        separator = ',\n'
+    yield '\n]}\n'
+
+
+def export_ndjson(chunks: Iterable[list[GeoLocation]]) -> Iterator[str]:
+    for chunk in chunks:
+        yield ''.join(_dumps(geolocation) + '\n' for geolocation in chunk)
+
+
+def export_csv(chunks: Iterable[list[GeoLocation]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for chunk in chunks:
+        for geolocation in chunk:
+            location = geolocation.location
+            writer.writerow(
+                [geolocation.pk]
+                + [getattr(geolocation, field) for field in FIELDS]
+                + [geolocation.coordinates.x, geolocation.coordinates.y, geolocation.location_id]
+                + ([location.geoname_id, location.capital, location.is_eu] if location is not None else ['', '', ''])
+                + [';'.join(language.code for language in _languages(geolocation))]
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export(fmt: str) -> Iterator[str]:
+    return {'geojson': export_geojson, 'ndjson': export_ndjson, 'csv': export_csv}[fmt](_chunks())
@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+import ipaddress
+import time
+from typing import Optional, Union
+
+from django.conf import settings
+
+import geoip2.database
+from geoip2.models import City
+from maxminddb import MODE_MMAP
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkGeoIP2:
+    """
+    Reader of the GeoIP2 City database. Records are in the format of Django's
+    ``GeoIP2.city()``, together with the network they apply to.
+    """
+
+    def __init__(self, cache: int = MODE_MMAP) -> None:
+        path = str(settings.GEOIP_PATH)
+        if os.path.isdir(path):
+            path = os.path.join(path, getattr(settings, 'GEOIP_CITY', 'GeoLite2-City.mmdb'))
+        self._reader = geoip2.database.Reader(path, mode=cache)
+
+    @staticmethod
+    def _record(response: City) -> dict:
+        return {
+            'city': response.city.name,
+            'continent_code': response.continent.code,
+            'continent_name': response.continent.name,
+            'country_code': response.country.iso_code,
+            'country_name': response.country.name,
+            'dma_code': response.location.metro_code,
+            'is_in_european_union': response.country.is_in_european_union,
+            'latitude': response.location.latitude,
+            'longitude': response.location.longitude,
+            'postal_code': response.postal.code,
+            'region': response.subdivisions[0].iso_code if response.subdivisions else None,
+            'time_zone': response.location.time_zone,
+        }
+
+    def city_with_network(self, ip: str) -> tuple[dict, Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+        response = self._reader.city(ip)
+        return self._record(response), response.traits.network
+
+
+class GeoIP2ReaderPool:
+    """
+    Process-wide GeoIP2 reader, opened once in memory-mapped mode and
+    swapped for a fresh one when the ``.mmdb`` files under ``GEOIP_PATH`` change.
+    """
+
+    def __init__(self, cache: int = MODE_MMAP, check_interval: float = 5.0) -> None:
+        self.cache = cache
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._reader: Optional[NetworkGeoIP2] = None
+        self._signature: Optional[tuple] = None
+        self._checked_at = 0.0
+
+    def _database_signature(self) -> tuple:
+        path = str(settings.GEOIP_PATH)
+        if os.path.isfile(path):
+            entries = [path]
+        else:
+            entries = sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith('.mmdb')
+            )
+        signature = []
+        for entry in entries:
+            stat = os.stat(entry)
+            signature.append((entry, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def get(self) -> NetworkGeoIP2:
+        reader = self._reader
+        if reader is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return reader
+
+        with self._lock:
+            now = time.monotonic()
+            if self._reader is not None and now - self._checked_at < self.check_interval:
+                return self._reader
+
+            signature = self._database_signature()
+            if self._reader is None or signature != self._signature:
+                try:
+                    reader = NetworkGeoIP2(cache=self.cache)
+                except Exception:
+                    if self._reader is None:
+                        raise
+                    # Keep serving from the previous database until the new one is complete.
+                    logger.exception('Reloading GeoIP2 database failed, keeping the current reader.')
+                else:
+                    # Readers still held by in-flight lookups are closed once released.
+                    self._reader = reader
+                    self._signature = signature
+            self._checked_at = now
+            return self._reader
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reader = None
+            self._signature = None
+            self._checked_at = 0.0
+
+
+geoip2_readers = GeoIP2ReaderPool(
+    cache=settings.GEOIP_CACHE_MODE,
+    check_interval=settings.GEOIP_RELOAD_INTERVAL,
+)
+
+
+def get_geoip2() -> NetworkGeoIP2:
+    return geoip2_readers.get()
@@ -0,0 +1,418 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from geolocations.quota import IPStackQuota
+
+logger = logging.getLogger(__name__)
+
+IPSTACK_URL = settings.IPSTACK['URL']
+
+USAGE_LIMIT_REACHED = 104
+BATCH_NOT_SUPPORTED_ON_PLAN = 303
+
+
+class IPStackUnavailable(Exception):
+    pass
+
+
+class IPStackQuotaExhausted(IPStackUnavailable):
+    pass
+
+
+def _error_code(payload) -> Optional[int]:
+    # https://ipstack.com/documentation#errors
+    if not isinstance(payload, dict) or payload.get('success') not in (False, 'false'):
+        return None
+    error = payload.get('error')
+    return error.get('code') if isinstance(error, dict) else None
+
+
+def _usage_limit_reached(payload) -> bool:
+    return _error_code(payload) == USAGE_LIMIT_REACHED
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                # Let a single request through to check whether ipstack recovered.
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning('ipstack circuit opened after %s failures.', self._failures)
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def cancel_request(self) -> None:
+        # The request let through by allow_request() won't be made.
+        with self._lock:
+            self._probing = False
+
+
+class IPStackClient:
+    """
+    Keep-alive HTTP client for ipstack with bounded timeouts, retries with full jitter
+    and a circuit breaker. ``IPStackUnavailable`` is raised when ipstack can't be reached
+    or the circuit is open, callers fall back to GeoIP2.
+    """
+
+    RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int,
+        backoff: float,
+        pool_maxsize: int,
+        breaker: CircuitBreaker,
+        bulk_size: int = 50,
+        quota: Optional[IPStackQuota] = None,
+    ) -> None:
+        self.base_url = base_url
+        self.bulk_size = bulk_size
+        self.bulk_supported = True
+        self.quota = quota
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _request(self, query: str, calls: int = 1):
+        # The circuit is checked first, calls it rejects don't use up the budget.
+        if not self.breaker.allow_request():
+            raise IPStackUnavailable('ipstack circuit is open.')
+        if self.quota is not None and not self.quota.acquire(calls):
+            self.breaker.cancel_request()
+            raise IPStackQuotaExhausted('ipstack quota exhausted.')
+
+        # Whatever is raised, the outcome is recorded, a half-open circuit must not wait for it forever.
+        succeeded = False
+        try:
+            error = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._sleep_before_retry(attempt - 1)
+                try:
+                    r = self.session.get(
+                        self.base_url + query,
+                        params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]},
+                        timeout=self.timeout,
+                    )
+                    if r.status_code in self.RETRY_STATUSES:
+                        error = requests.HTTPError(f'ipstack responded with {r.status_code}.', response=r)
+                        continue
+                    payload = r.json()
+                except (requests.RequestException, ValueError) as exc:
+                    error = exc
+                    continue
+                succeeded = True
+                if self.quota is not None and _usage_limit_reached(payload):
+                    self.quota.mark_exhausted()
+                return payload
+
+            raise IPStackUnavailable(str(error)) from error
+        finally:
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def get(self, ip: str) -> dict:
+        return self._request(ip)
+
+    def bulk_get(self, ips: list[str]) -> dict[str, dict]:
+        """
+        Look ``ips`` up with the ipstack Bulk Lookup Endpoint, ``bulk_size`` addresses per call.
+        Addresses missing from a response are mapped to an error payload. On plans without
+        bulk lookups the addresses are looked up one by one.
+        """
+        results = {}
+        for start in range(0, len(ips), self.bulk_size):
+            chunk = ips[start:start + self.bulk_size]
+            if len(chunk) == 1 or not self.bulk_supported:
+                results.update({ip: self._request(ip) for ip in chunk})
+                continue
+            payload = self._request(','.join(chunk), calls=len(chunk))
+            if _error_code(payload) == BATCH_NOT_SUPPORTED_ON_PLAN:
+                logger.warning('ipstack bulk lookups are not available on the current plan, looking addresses up one by one.')
+                self.bulk_supported = False
+                results.update({ip: self._request(ip) for ip in chunk})
+                continue
+            if _error_code(payload) is not None:
+                # The whole call failed, e.g. the access key is invalid or the usage limit reached.
+                results.update({ip: payload for ip in chunk})
+                continue
+            if isinstance(payload, dict):
+                payload = [payload]
+            entries = {_normalize_ip(entry.get('ip')): entry for entry in payload if isinstance(entry, dict)}
+            for ip in chunk:
+                results[ip] = entries.get(_normalize_ip(ip), {'success': False})
+        return results
+
+
+def _normalize_ip(ip: Optional[str]) -> Optional[str]:
+    try:
+        return str(ipaddress.ip_address(ip))
+    except ValueError:
+        return ip
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.futures: dict[str, Future] = {}
+        self.full = threading.Event()
+
+
+class IPStackBatcher:
+    """
+    Collects lookups made concurrently in this process and sends them to ipstack as
+    bulk calls. A lookup made while no other is in progress is sent at once. Otherwise
+    the first caller of a batch waits up to ``max_delay`` seconds for others to join,
+    or until ``max_batch`` addresses are pending, and then sends it.
+    """
+
+    def __init__(self, client: IPStackClient, max_batch: int, max_delay: float) -> None:
+        self.client = client
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._batch: Optional[_Batch] = None
+        self._in_progress = 0
+
+    def lookup(self, ip: str) -> dict:
+        if self.max_delay <= 0:
+            return self.client.get(ip)
+
+        with self._lock:
+            alone = not self._in_progress
+            self._in_progress += 1
+            if not alone:
+                batch = self._batch
+                leader = batch is None
+                if leader:
+                    batch = self._batch = _Batch()
+                future = batch.futures.setdefault(ip, Future())
+                if len(batch.futures) >= self.max_batch:
+                    self._batch = None
+                    batch.full.set()
+
+        try:
+            if alone:
+                # Nothing to batch it with, waiting would only add latency.
+                return self.client.get(ip)
+            if leader:
+                batch.full.wait(self.max_delay)
+                with self._lock:
+                    if self._batch is batch:
+                        self._batch = None
+                self._send(batch)
+            return future.result()
+        finally:
+            with self._lock:
+                self._in_progress -= 1
+
+    def _send(self, batch: _Batch) -> None:
+        try:
+            results = self.client.bulk_get(list(batch.futures))
+        except Exception as exc:
+            for future in batch.futures.values():
+                future.set_exception(exc)
+        else:
+            for ip, future in batch.futures.items():
+                future.set_result(results[ip])
+
+
+class AsyncIPStackClient:
+    """
+    ``IPStackClient`` counterpart for the ASGI application, built on ``httpx.AsyncClient``.
+    The circuit breaker is meant to be shared with the synchronous client.
+    """
+
+    RETRY_STATUSES = IPStackClient.RETRY_STATUSES
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int,
+        backoff: float,
+        pool_maxsize: int,
+        breaker: CircuitBreaker,
+        quota: Optional[IPStackQuota] = None,
+    ) -> None:
+        self.base_url = base_url
+        self.quota = quota
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker
+        # Connections of an AsyncClient belong to the event loop they were opened in.
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+        # The loop only keeps weak references to its tasks.
+        self._closers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task] = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._closers[loop] = loop.create_task(self._close_on_shutdown(client))
+        return client
+
+    async def _close_on_shutdown(self, client: httpx.AsyncClient) -> None:
+        # asyncio.run, asgiref and ASGI servers cancel the pending tasks of a loop before closing it.
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            await client.aclose()
+
+    async def aclose(self) -> None:
+        """Close the client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        closer = self._closers.pop(loop, None)
+        client = self._clients.pop(loop, None)
+        if closer is not None:
+            closer.cancel()
+        if client is not None:
+            await client.aclose()
+
+    async def get(self, ip: str) -> dict:
+        if not self.breaker.allow_request():
+            raise IPStackUnavailable('ipstack circuit is open.')
+        if self.quota is not None and not await sync_to_async(self.quota.acquire, thread_sensitive=False)():
+            self.breaker.cancel_request()
+            raise IPStackQuotaExhausted('ipstack quota exhausted.')
+
+        succeeded = False
+        try:
+            error = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+                try:
+                    r = await self.client.get(self.base_url + ip, params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]})
+                    if r.status_code in self.RETRY_STATUSES:
+                        error = httpx.HTTPStatusError(f'ipstack responded with {r.status_code}.', request=r.request, response=r)
+                        continue
+                    payload = r.json()
+                except (httpx.HTTPError, httpx.InvalidURL, ValueError) as exc:
+                    error = exc
+                    continue
+                succeeded = True
+                if self.quota is not None and _usage_limit_reached(payload):
+                    await sync_to_async(self.quota.mark_exhausted, thread_sensitive=False)()
+                return payload
+
+            raise IPStackUnavailable(str(error)) from error
+        finally:
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+
+ipstack_quota = IPStackQuota(
+    monthly_limit=settings.IPSTACK['QUOTA']['MONTHLY'],
+    rate=settings.IPSTACK['QUOTA']['RATE'],
+    burst=settings.IPSTACK['QUOTA']['BURST'],
+    use_redis=settings.IPSTACK['QUOTA']['REDIS'],
+)
+
+ipstack_client = IPStackClient(
+    IPSTACK_URL,
+    connect_timeout=settings.IPSTACK['CONNECT_TIMEOUT'],
+    read_timeout=settings.IPSTACK['READ_TIMEOUT'],
+    retries=settings.IPSTACK['RETRIES'],
+    backoff=settings.IPSTACK['BACKOFF'],
+    pool_maxsize=settings.IPSTACK['POOL_MAXSIZE'],
+    breaker=CircuitBreaker(
+        failure_threshold=settings.IPSTACK['FAILURE_THRESHOLD'],
+        reset_timeout=settings.IPSTACK['RESET_TIMEOUT'],
+    ),
+    bulk_size=settings.IPSTACK['BULK_SIZE'],
+    quota=ipstack_quota,
+)
+
+async_ipstack_client = AsyncIPStackClient(
+    IPSTACK_URL,
+    connect_timeout=settings.IPSTACK['CONNECT_TIMEOUT'],
+    read_timeout=settings.IPSTACK['READ_TIMEOUT'],
+    retries=settings.IPSTACK['RETRIES'],
+    backoff=settings.IPSTACK['BACKOFF'],
+    pool_maxsize=settings.IPSTACK['POOL_MAXSIZE'],
+    breaker=ipstack_client.breaker,
+    quota=ipstack_quota,
+)
+
+ipstack_batcher = IPStackBatcher(
+    ipstack_client,
+    max_batch=settings.IPSTACK['BULK_SIZE'],
+    max_delay=settings.IPSTACK['BATCH_DELAY'],
+)
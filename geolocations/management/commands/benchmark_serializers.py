@@ -0,0 +1,38 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.renderers import JSONRenderer
+
+from geolocations.models import GeoLocation
+from geolocations.serializers import GeoLocationReadSerializer, GeoLocationSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the output and the time of GeoLocationSerializer and GeoLocationReadSerializer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of geo locations serialized.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs, the fastest is reported.')
+
+    def handle(self, *args, **options):
+        # Loaded once, only serialization is timed.
+        geolocations = list(GeoLocation.objects.with_location().order_by('pk')[:options['rows']])
+        if not geolocations:
+            raise CommandError('There are no geo locations to serialize.')
+
+        renderer = JSONRenderer()
+        results = {}
+        for serializer_class in (GeoLocationSerializer, GeoLocationReadSerializer):
+            def serialize():
+                return serializer_class(geolocations, many=True).data
+
+            seconds = min(timeit.repeat(serialize, number=1, repeat=options['repeat']))
+            results[serializer_class.__name__] = (seconds, renderer.render(serialize()))
+
+        (model_seconds, model_output), (read_seconds, read_output) = results.values()
+        if model_output != read_output:
+            raise CommandError('GeoLocationReadSerializer output differs from GeoLocationSerializer.')
+        for name, (seconds, _) in results.items():
+            self.stdout.write(f'{name}: {seconds * 1000:.1f} ms for {len(geolocations)} rows')
+        self.stdout.write(f'Identical output, {model_seconds / read_seconds:.1f}x faster.')
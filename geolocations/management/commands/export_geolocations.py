@@ -0,0 +1,21 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from geolocations.export import FORMATS, export
+
+
+class Command(BaseCommand):
+    help = 'Export every geo location with its location and languages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', help='Format of the export.')
+        parser.add_argument('--output', help='File to write the export to, standard output by default.')
+
+    def handle(self, *args, **options):
+        if options['output'] is None:
+            # Written unbuffered, without the newlines self.stdout appends.
+            sys.stdout.writelines(export(options['format']))
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+            file.writelines(export(options['format']))
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def remove_duplicated_ips(apps, schema_editor):
+    GeoLocation = apps.get_model('geolocations', 'GeoLocation')
+    Location = apps.get_model('locations', 'Location')
+    db_alias = schema_editor.connection.alias
+
+    latest_ids = (
+        GeoLocation.objects.using(db_alias)
+        .filter(ip__isnull=False)
+        .values('ip')
+        .annotate(latest_id=models.Max('id'))
+        .values_list('latest_id', flat=True)
+    )
+    duplicates = GeoLocation.objects.using(db_alias).filter(ip__isnull=False).exclude(id__in=list(latest_ids))
+    location_ids = list(duplicates.exclude(location__isnull=True).values_list('location_id', flat=True))
+    duplicates.delete()
+    Location.objects.using(db_alias).filter(id__in=location_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+        ('geolocations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicated_ips, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='geolocation',
+            constraint=models.UniqueConstraint(fields=('ip',), name='geolocations_geolocation_ip_unique'),
+        ),
+    ]
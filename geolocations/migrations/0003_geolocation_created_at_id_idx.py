@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geolocations', '0002_geolocation_ip_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='geolocation',
+            index=models.Index(fields=['created_at', 'id'], name='geolocation_created_at_id_idx'),
+        ),
+    ]
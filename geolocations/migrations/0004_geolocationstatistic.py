@@ -0,0 +1,112 @@
+from django.db import migrations, models
+
+# Counters of geolocations_geolocationstatistic follow every insert, update and delete of
+# geo locations (COPY included) and EU membership changes of their locations.
+CREATE_TRIGGERS_SQL = '''
+CREATE FUNCTION geolocations_count_statistic(continent varchar, country varchar, location bigint, delta bigint)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO geolocations_geolocationstatistic (continent_code, country_code, is_eu, count)
+    VALUES (continent, country, COALESCE((SELECT is_eu FROM locations_location WHERE id = location), false), delta)
+    ON CONFLICT (continent_code, country_code, is_eu)
+    DO UPDATE SET count = geolocations_geolocationstatistic.count + EXCLUDED.count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION geolocations_geolocation_statistics() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND OLD.continent_code = NEW.continent_code
+        AND OLD.country_code = NEW.country_code
+        AND OLD.location_id IS NOT DISTINCT FROM NEW.location_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM geolocations_count_statistic(OLD.continent_code, OLD.country_code, OLD.location_id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM geolocations_count_statistic(NEW.continent_code, NEW.country_code, NEW.location_id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER geolocations_geolocation_statistics
+AFTER INSERT OR UPDATE OR DELETE ON geolocations_geolocation
+FOR EACH ROW EXECUTE FUNCTION geolocations_geolocation_statistics();
+
+CREATE FUNCTION geolocations_geolocation_statistics_truncate() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM geolocations_geolocationstatistic;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER geolocations_geolocation_statistics_truncate
+AFTER TRUNCATE ON geolocations_geolocation
+FOR EACH STATEMENT EXECUTE FUNCTION geolocations_geolocation_statistics_truncate();
+
+CREATE FUNCTION geolocations_location_statistics() RETURNS trigger AS $$
+DECLARE
+    geolocation record;
+BEGIN
+    FOR geolocation IN SELECT continent_code, country_code FROM geolocations_geolocation WHERE location_id = NEW.id LOOP
+        INSERT INTO geolocations_geolocationstatistic (continent_code, country_code, is_eu, count)
+        VALUES (geolocation.continent_code, geolocation.country_code, OLD.is_eu, -1), (geolocation.continent_code, geolocation.country_code, NEW.is_eu, 1)
+        ON CONFLICT (continent_code, country_code, is_eu)
+        DO UPDATE SET count = geolocations_geolocationstatistic.count + EXCLUDED.count;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER geolocations_location_statistics
+AFTER UPDATE OF is_eu ON locations_location
+FOR EACH ROW WHEN (OLD.is_eu IS DISTINCT FROM NEW.is_eu)
+EXECUTE FUNCTION geolocations_location_statistics();
+'''
+
+COUNT_SQL = '''
+INSERT INTO geolocations_geolocationstatistic (continent_code, country_code, is_eu, count)
+SELECT geolocation.continent_code, geolocation.country_code, COALESCE(location.is_eu, false), count(*)
+FROM geolocations_geolocation geolocation
+LEFT JOIN locations_location location ON location.id = geolocation.location_id
+GROUP BY 1, 2, 3
+'''
+
+DROP_TRIGGERS_SQL = '''
+DROP TRIGGER geolocations_location_statistics ON locations_location;
+DROP FUNCTION geolocations_location_statistics();
+DROP TRIGGER geolocations_geolocation_statistics_truncate ON geolocations_geolocation;
+DROP FUNCTION geolocations_geolocation_statistics_truncate();
+DROP TRIGGER geolocations_geolocation_statistics ON geolocations_geolocation;
+DROP FUNCTION geolocations_geolocation_statistics();
+DROP FUNCTION geolocations_count_statistic(varchar, varchar, bigint, bigint);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geolocations', '0003_geolocation_created_at_id_idx'),
+        ('locations', '0002_location_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoLocationStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('continent_code', models.CharField(max_length=2)),
+                ('country_code', models.CharField(max_length=2)),
+                ('is_eu', models.BooleanField()),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='geolocationstatistic',
+            constraint=models.UniqueConstraint(fields=('continent_code', 'country_code', 'is_eu'), name='geolocations_statistic_unique'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+        migrations.RunSQL(COUNT_SQL, migrations.RunSQL.noop),
+    ]
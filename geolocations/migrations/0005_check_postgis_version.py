@@ -0,0 +1,24 @@
+from django.db import migrations
+
+# ST_TileEnvelope of the vector tiles needs PostGIS 3.0, ST_HexagonGrid of the hex aggregation 3.1.
+MIN_POSTGIS_VERSION = (3, 1)
+
+
+def check_postgis_version(apps, schema_editor):
+    version = schema_editor.connection.ops.spatial_version
+    if version < MIN_POSTGIS_VERSION:
+        raise RuntimeError(
+            f'PostGIS {".".join(map(str, MIN_POSTGIS_VERSION))} or newer is required, '
+            f'the database has {".".join(map(str, version))}.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geolocations', '0004_geolocationstatistic'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_postgis_version, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,15 @@
+import math
+from collections import Counter
+
 from django.contrib.gis.db import models
+from django.contrib.gis.db.models.functions import Distance, GeometryDistance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.db import connections, transaction
+from django.db.models import sql
 
-from base.models import BaseModel
+from base import outbox
+from base.models import BaseModel, OutboxOperations
 
 from locations.models import Location
 
@@ -11,6 +20,134 @@ class IPTypes(models.TextChoices):
     NOT_PROVIDED = ''
 
 
+# Less than a degree of latitude, or of longitude at the equator, so the degrees of the
+# prefilter of ``within`` are never too few.
+METRES_PER_DEGREE = 111000
+
+
+class GeoLocationQuerySet(models.QuerySet):
+    def with_location(self) -> 'GeoLocationQuerySet':
+        # Everything GeoLocationSerializer represents, in two queries for any number of rows.
+        return self.select_related('location').prefetch_related('location__languages')
+
+    def nearest(self, point: Point, k: int) -> 'GeoLocationQuerySet':
+        """The ``k`` rows nearest to ``point`` in metres, ordered by distance."""
+        # The ``<->`` order served by the spatial index is in degrees, which overstate east-west
+        # distances away from the equator and don't wrap at the antimeridian. The K nearest rows
+        # by degrees are only used to bound the radius ``within`` searches exactly.
+        distances = (
+            self.annotate(distance=Distance('coordinates', point))
+            .order_by(GeometryDistance('coordinates', point))
+            .values_list('distance', flat=True)[:k]
+        )
+        radius = max((distance.m for distance in distances), default=None)
+        if radius is None:
+            return self.none()
+        # Slack for the rounding of the distance on its way back to the database.
+        return self.within(point, radius + 1e-6).order_by('distance', 'id')[:k]
+
+    def within(self, point: Point, radius: float) -> 'GeoLocationQuerySet':
+        """Rows at most ``radius`` metres from ``point``."""
+        # Metres can't be compared with the index of a geometry in degrees. ST_DWithin in degrees,
+        # widened for the latitude farthest from the equator it reaches, prefilters rows with
+        # the index, the exact spherical distance is computed only for them.
+        latitude_delta = radius / METRES_PER_DEGREE
+        farthest_latitude = min(abs(point.y) + latitude_delta, 90)
+        degrees = min(latitude_delta / max(math.cos(math.radians(farthest_latitude)), 1e-9), 360)
+        # Longitudes don't wrap in degrees, a circle crossing the antimeridian is also searched
+        # around the point shifted by a full turn.
+        prefilter = models.Q(coordinates__dwithin=(point, degrees))
+        if point.x + degrees > 180:
+            prefilter |= models.Q(coordinates__dwithin=(Point(point.x - 360, point.y, srid=point.srid), degrees))
+        if point.x - degrees < -180:
+            prefilter |= models.Q(coordinates__dwithin=(Point(point.x + 360, point.y, srid=point.srid), degrees))
+        return self.filter(prefilter, coordinates__distance_lte=(point, D(m=radius))).annotate(
+            distance=Distance('coordinates', point)
+        )
+
+
+class GeoLocationManager(models.Manager.from_queryset(GeoLocationQuerySet)):
+    def upsert(self, **values) -> tuple['GeoLocation', bool]:
+        return self.bulk_upsert([self.model(**values)])[0]
+
+    def bulk_upsert(self, objs: list['GeoLocation']) -> list[tuple['GeoLocation', bool]]:
+        """
+        Insert ``objs`` in a single ``INSERT ... ON CONFLICT (ip) DO UPDATE`` statement.
+        Returns ``(instance, created)`` pairs in the order of ``objs``; locations
+        replaced on already existing rows are deleted.
+        """
+        if not objs:
+            return []
+        with transaction.atomic(using=self.db):
+            return self._bulk_upsert(objs)
+
+    def _bulk_upsert(self, objs: list['GeoLocation']) -> list[tuple['GeoLocation', bool]]:
+        # A statement can't update the same row twice, the last object for an ip wins.
+        unique_objs = {}
+        for obj in objs:
+            unique_objs[obj.ip if obj.ip is not None else id(obj)] = obj
+        # Concurrent batches lock the statistic counters (by country) and the rows (by ip) in
+        # the same order, instead of deadlocking on each other.
+        rows = sorted(unique_objs.values(), key=lambda obj: (obj.continent_code, obj.country_code, obj.ip or ''))
+
+        opts = self.model._meta
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        compiler = sql.InsertQuery(self.model).get_compiler(using=self.db)
+        fields = [field for field in opts.concrete_fields if not field.primary_key]
+        update_columns = [quote_name(field.column) for field in fields if field.name != 'created_at']
+        table = quote_name(opts.db_table)
+        ip_column = quote_name(opts.get_field('ip').column)
+        location_column = quote_name(opts.get_field('location').column)
+        created_at_column = quote_name(opts.get_field('created_at').column)
+
+        values_sql, params = [], []
+        ips = [obj.ip for obj in rows if obj.ip is not None]
+        params.append(ips)
+        for obj in rows:
+            placeholders = []
+            for field in fields:
+                value = compiler.prepare_value(field, compiler.pre_save_val(field, obj))
+                placeholder, value_params = compiler.field_as_sql(field, value)
+                placeholders.append(placeholder)
+                params.extend(value_params)
+            values_sql.append(f'({", ".join(placeholders)})')
+
+        query = (
+            f'WITH previous AS (SELECT {ip_column}, {location_column} FROM {table} WHERE {ip_column} = ANY(%s::inet[])) '
+            f'INSERT INTO {table} ({", ".join(quote_name(field.column) for field in fields)}) '
+            f'VALUES {", ".join(values_sql)} '
+            f'ON CONFLICT ({ip_column}) DO UPDATE SET '
+            f'{", ".join(f"{column} = EXCLUDED.{column}" for column in update_columns)} '
+            f'RETURNING {table}.{quote_name(opts.pk.column)}, {table}.{created_at_column}, ({table}.xmax = 0), '
+            f'(SELECT previous.{location_column} FROM previous WHERE previous.{ip_column} = {table}.{ip_column})'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            returned = cursor.fetchall()
+
+        created_rows, stale_locations = set(), []
+        for obj, (pk, created_at, created, previous_location_id) in zip(rows, returned):
+            obj.pk = pk
+            obj.created_at = created_at
+            obj._state.adding = False
+            obj._state.db = self.db
+            if created:
+                created_rows.add(id(obj))
+            if previous_location_id is not None and previous_location_id != obj.location_id:
+                stale_locations.append(previous_location_id)
+        outbox.record([obj for obj in rows if id(obj) in created_rows], OutboxOperations.CREATE, self.db)
+        outbox.record([obj for obj in rows if id(obj) not in created_rows], OutboxOperations.UPDATE, self.db)
+        if stale_locations:
+            Location.objects.using(self.db).filter(pk__in=stale_locations).delete()
+
+        results = []
+        for obj in objs:
+            row = unique_objs[obj.ip if obj.ip is not None else id(obj)]
+            results.append((row, row is obj and id(row) in created_rows))
+        return results
+
+
 class GeoLocation(BaseModel):
     ip = models.GenericIPAddressField(null=True)
     ip_type = models.CharField(max_length=4, default=IPTypes.NOT_PROVIDED, choices=IPTypes.choices)
@@ -25,6 +162,16 @@ class GeoLocation(BaseModel):
     coordinates = models.PointField()
     location = models.OneToOneField(Location, on_delete=models.SET_NULL, null=True)
 
+    objects = GeoLocationManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ip'], name='geolocations_geolocation_ip_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='geolocation_created_at_id_idx'),
+        ]
+
     @property
     def latitude(self) -> float:
         return self.coordinates.x
@@ -35,3 +182,59 @@ class GeoLocation(BaseModel):
     
     def __repr__(self) -> str:
         return f'{self.continent_name}-{self.country_name}:{self.latitude},{self.longitude}'
+
+
+REBUILD_STATISTICS_SQL = '''
+INSERT INTO geolocations_geolocationstatistic (continent_code, country_code, is_eu, count)
+SELECT geolocation.continent_code, geolocation.country_code, COALESCE(location.is_eu, false), count(*)
+FROM geolocations_geolocation geolocation
+LEFT JOIN locations_location location ON location.id = geolocation.location_id
+GROUP BY 1, 2, 3
+'''
+
+
+class GeoLocationStatisticManager(models.Manager):
+    def rebuild(self) -> None:
+        """Recount every geo location, the counters are otherwise kept by triggers (see migration 0004)."""
+        with transaction.atomic(using=self.db), connections[self.db].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.model._meta.db_table}')
+            cursor.execute(REBUILD_STATISTICS_SQL)
+
+    def summary(self) -> dict:
+        """Counts of geo locations in total, per continent, per country and per EU membership."""
+        continents, countries, is_eu = Counter(), Counter(), Counter({True: 0, False: 0})
+        for statistic in self.filter(count__gt=0):
+            continents[statistic.continent_code] += statistic.count
+            countries[(statistic.continent_code, statistic.country_code)] += statistic.count
+            is_eu[statistic.is_eu] += statistic.count
+        return {
+            'total': sum(continents.values()),
+            'continents': [
+                {'continent_code': continent_code, 'count': count}
+                for continent_code, count in sorted(continents.items())
+            ],
+            'countries': [
+                {'continent_code': continent_code, 'country_code': country_code, 'count': count}
+                for (continent_code, country_code), count in sorted(countries.items())
+            ],
+            'is_eu': {'true': is_eu[True], 'false': is_eu[False]},
+        }
+
+
+class GeoLocationStatistic(models.Model):
+    """Number of geo locations per continent, country and EU membership of their location."""
+    continent_code = models.CharField(max_length=2)
+    country_code = models.CharField(max_length=2)
+    # Geo locations without a location count as outside the EU.
+    is_eu = models.BooleanField()
+    count = models.BigIntegerField(default=0)
+
+    objects = GeoLocationStatisticManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['continent_code', 'country_code', 'is_eu'], name='geolocations_statistic_unique'),
+        ]
+
+    def __repr__(self) -> str:
+        return f'{self.continent_code}-{self.country_code}-is_eu={self.is_eu}:{self.count}'
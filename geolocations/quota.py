@@ -0,0 +1,130 @@
+import datetime
+import logging
+from typing import Optional
+
+import redis
+
+from base.utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# KEYS: token bucket, monthly counter, monthly exhausted flag.
+# ARGV: rate, burst, monthly limit (-1 for none), calls, counter TTL.
+# The bucket is refilled by the clock of the Redis server, the clocks of workers may disagree.
+ACQUIRE_SCRIPT = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local n = tonumber(ARGV[4])
+local time = redis.call('time')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local used = tonumber(redis.call('get', KEYS[2]) or '0')
+if redis.call('exists', KEYS[3]) == 1 or (limit >= 0 and used + n > limit) then
+    return {0, used}
+end
+if rate > 0 then
+    local bucket = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    -- Calls larger than the bucket wait for a full bucket and leave it in debt.
+    local allowed = tokens >= math.min(n, burst)
+    if allowed then
+        tokens = tokens - n
+    end
+    redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('expire', KEYS[1], math.ceil((burst + n) / rate) + 1)
+    if not allowed then
+        return {0, used}
+    end
+end
+used = redis.call('incrby', KEYS[2], n)
+redis.call('expire', KEYS[2], ARGV[5])
+return {1, used}
+"""
+
+
+class IPStackQuota:
+    """
+    Budget of ipstack calls shared by all workers through Redis: a token bucket refilled with
+    ``rate`` calls per second, up to ``burst``, and a counter of calls made in the current
+    calendar month (UTC), capped by ``monthly_limit``. Disabled without ``use_redis``.
+    """
+
+    MONTH_TIMEOUT = 60 * 60 * 24 * 32
+
+    def __init__(
+        self,
+        monthly_limit: Optional[int],
+        rate: Optional[float],
+        burst: int,
+        use_redis: bool = False,
+    ) -> None:
+        self.monthly_limit = monthly_limit
+        self.rate = rate
+        self.burst = burst
+        self.use_redis = use_redis
+
+    def _redis_key(self, suffix: str) -> str:
+        return f'geolocations:ipstack:quota:{suffix}'
+
+    def _month(self) -> str:
+        return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m')
+
+    def acquire(self, calls: int = 1) -> bool:
+        if not self.use_redis:
+            return True
+        month = self._month()
+        try:
+            allowed, _ = get_redis_client().eval(
+                ACQUIRE_SCRIPT,
+                3,
+                self._redis_key('bucket'),
+                self._redis_key(f'used:{month}'),
+                self._redis_key(f'exhausted:{month}'),
+                self.rate or 0,
+                self.burst,
+                -1 if self.monthly_limit is None else self.monthly_limit,
+                calls,
+                self.MONTH_TIMEOUT,
+            )
+        except redis.RedisError:
+            logger.warning('ipstack quota: Redis unavailable.', exc_info=True)
+            return True
+        return bool(allowed)
+
+    def mark_exhausted(self) -> None:
+        # ipstack reported the monthly limit reached, e.g. the plan changed or calls were made elsewhere.
+        if not self.use_redis:
+            return
+        try:
+            get_redis_client().set(self._redis_key(f'exhausted:{self._month()}'), 1, ex=self.MONTH_TIMEOUT)
+        except redis.RedisError:
+            logger.warning('ipstack quota: Redis unavailable.', exc_info=True)
+
+    def usage(self) -> dict:
+        usage = {
+            'month': self._month(),
+            'monthly_limit': self.monthly_limit,
+            'rate': self.rate,
+            'burst': self.burst,
+            'used': None,
+            'remaining': None,
+            'exhausted': None,
+        }
+        if not self.use_redis:
+            return usage
+        month = usage['month']
+        try:
+            used, exhausted = get_redis_client().mget(
+                self._redis_key(f'used:{month}'), self._redis_key(f'exhausted:{month}')
+            )
+        except redis.RedisError:
+            logger.warning('ipstack quota: Redis unavailable.', exc_info=True)
+            return usage
+        usage['used'] = int(used or 0)
+        if self.monthly_limit is not None:
+            usage['remaining'] = max(self.monthly_limit - usage['used'], 0)
+        usage['exhausted'] = exhausted is not None or usage['remaining'] == 0
+        return usage
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Union
+
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+logger = logging.getLogger(__name__)
+
+
+class HostnameNotResolved(Exception):
+    pass
+
+
+# Messages of the socket.gaierror previously raised by GeoIP2 lookups.
+NOT_FOUND = 'Name or service not known'
+TEMPORARY_FAILURE = 'Temporary failure in name resolution'
+
+
+class HostnameResolver:
+    """
+    DNS resolver caching answers for their TTL (clamped to ``min_ttl``..``max_ttl``) and
+    names that don't exist for ``negative_ttl`` seconds. A records are preferred, AAAA
+    records are used for IPv6-only names. Names unknown to DNS are looked up with
+    ``getaddrinfo``, which reads ``/etc/hosts`` and the other sources of nsswitch, and
+    cached for ``min_ttl``.
+    """
+
+    RDTYPES = ('A', 'AAAA')
+
+    def __init__(
+        self,
+        max_entries: int,
+        min_ttl: float,
+        max_ttl: float,
+        negative_ttl: float,
+        lifetime: float,
+    ) -> None:
+        self.max_entries = max_entries
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.lifetime = lifetime
+        self._lock = threading.Lock()
+        # hostname -> (expires at, address or None for names that don't exist)
+        self._entries: OrderedDict[str, tuple[float, Optional[str]]] = OrderedDict()
+        self._resolver: Optional[dns.resolver.Resolver] = None
+        self._async_resolver: Optional[dns.asyncresolver.Resolver] = None
+
+    @property
+    def resolver(self) -> dns.resolver.Resolver:
+        if self._resolver is None:
+            self._resolver = dns.resolver.Resolver()
+        return self._resolver
+
+    @property
+    def async_resolver(self) -> dns.asyncresolver.Resolver:
+        if self._async_resolver is None:
+            self._async_resolver = dns.asyncresolver.Resolver()
+        return self._async_resolver
+
+    def _key(self, hostname: str) -> str:
+        return hostname.rstrip('.').lower()
+
+    def _get_cached(self, key: str) -> Union[str, None, bool]:
+        # Returns False on a miss, None for a cached name that doesn't exist.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            expires_at, address = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return address
+
+    def _set_cached(self, key: str, address: Optional[str], ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, address)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _store_answer(self, key: str, answer: dns.resolver.Answer) -> str:
+        ttl = min(max(answer.rrset.ttl, self.min_ttl), self.max_ttl)
+        address = answer[0].address
+        self._set_cached(key, address, ttl)
+        return address
+
+    def _store_addresses(self, key: str, infos: list[tuple]) -> str:
+        # IPv4 addresses are preferred, as with DNS.
+        address = next((info[4][0] for info in infos if info[0] == socket.AF_INET), infos[0][4][0])
+        self._set_cached(key, address, self.min_ttl)
+        return address
+
+    def _store_error(self, key: str, hostname: str, exc: dns.exception.DNSException) -> HostnameNotResolved:
+        if isinstance(exc, (dns.resolver.NoNameservers, dns.exception.Timeout)):
+            # Resolver trouble rather than an answer, not cached.
+            logger.warning('Resolving %s failed: %s', hostname, exc)
+            return HostnameNotResolved(TEMPORARY_FAILURE)
+        self._set_cached(key, None, self.negative_ttl)
+        return HostnameNotResolved(NOT_FOUND)
+
+    def resolve(self, hostname: str) -> str:
+        key = self._key(hostname)
+        address = self._get_cached(key)
+        if address is None:
+            raise HostnameNotResolved(NOT_FOUND)
+        if address:
+            return address
+
+        for rdtype in self.RDTYPES:
+            try:
+                answer = self.resolver.resolve(key, rdtype, lifetime=self.lifetime)
+            except dns.resolver.NoAnswer as exc:
+                error = exc
+                continue
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoNameservers) as exc:
+                error = exc
+                break
+            except dns.exception.DNSException as exc:
+                raise self._store_error(key, hostname, exc) from exc
+            return self._store_answer(key, answer)
+
+        # E.g. localhost, docker-compose services and other names of /etc/hosts.
+        try:
+            infos = socket.getaddrinfo(key, None, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise self._store_error(key, hostname, error) from error
+        return self._store_addresses(key, infos)
+
+    async def resolve_async(self, hostname: str) -> str:
+        key = self._key(hostname)
+        address = self._get_cached(key)
+        if address is None:
+            raise HostnameNotResolved(NOT_FOUND)
+        if address:
+            return address
+
+        for rdtype in self.RDTYPES:
+            try:
+                answer = await self.async_resolver.resolve(key, rdtype, lifetime=self.lifetime)
+            except dns.resolver.NoAnswer as exc:
+                error = exc
+                continue
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoNameservers) as exc:
+                error = exc
+                break
+            except dns.exception.DNSException as exc:
+                raise self._store_error(key, hostname, exc) from exc
+            return self._store_answer(key, answer)
+
+        # E.g. localhost, docker-compose services and other names of /etc/hosts.
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(key, None, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise self._store_error(key, hostname, error) from error
+        return self._store_addresses(key, infos)
+
+    async def _resolve_many(self, hostnames: list[str]) -> dict[str, Union[str, HostnameNotResolved]]:
+        results = await asyncio.gather(*[self.resolve_async(hostname) for hostname in hostnames], return_exceptions=True)
+        return dict(zip(hostnames, results))
+
+    def resolve_many(self, hostnames: list[str]) -> dict[str, Union[str, HostnameNotResolved]]:
+        """
+        Resolve ``hostnames`` concurrently. Maps every hostname to its address,
+        or to the ``HostnameNotResolved`` raised for it.
+        """
+        hostnames = list(dict.fromkeys(hostnames))
+        if not hostnames:
+            return {}
+        return async_to_sync(self._resolve_many)(hostnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+hostname_resolver = HostnameResolver(
+    max_entries=settings.GEOLOCATION_DNS['MAX_ENTRIES'],
+    min_ttl=settings.GEOLOCATION_DNS['MIN_TTL'],
+    max_ttl=settings.GEOLOCATION_DNS['MAX_TTL'],
+    negative_ttl=settings.GEOLOCATION_DNS['NEGATIVE_TTL'],
+    lifetime=settings.GEOLOCATION_DNS['LIFETIME'],
+)
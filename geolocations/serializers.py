@@ -1,14 +1,31 @@
+from typing import Optional
+
+from django.conf import settings
+
 from drf_extra_fields.geo_fields import PointField
 
 from rest_framework import serializers
 
-from base.serializers import BaseModelSerializer
+from base.serializers import BaseModelReadSerializer
+from geolocations.aggregation import MODES as AGGREGATION_MODES
 from geolocations.models import GeoLocation
 from locations.models import Location
-from locations.serializers import LocationSerializer, LocationWithLanguagesSerializer
+from locations.serializers import LocationReadSerializer, LocationSerializer, LocationWithLanguagesSerializer
+
+
+class LocationCreateMixin:
+    def create_location(self, location_data: dict, languages: Optional[list] = None):
+        # With ``defer_location`` in the context the location is returned as data,
+        # to be stored later together with other locations (see ``GeoLocationBulkWriter``).
+        if self.context.get('defer_location'):
+            return {**location_data, 'languages': languages or []}
+        location = Location.objects.create(**location_data)
+        if languages:
+            location.languages.add(*languages)
+        return location.pk
 
 
-class GeoIP2Serializer(serializers.Serializer):
+class GeoIP2Serializer(LocationCreateMixin, serializers.Serializer):
     city = serializers.CharField(max_length=163, required=False, allow_blank=True, allow_null=True)
     continent_code = serializers.CharField(max_length=2, required=True)
     continent_name = serializers.CharField(max_length=13, required=True)
@@ -22,13 +39,13 @@ class GeoIP2Serializer(serializers.Serializer):
 
     def to_internal_value(self, data):
         internal_value = super().to_internal_value(data)
-        location = Location.objects.create(is_eu=internal_value.get('is_in_european_union', False))
+        location = self.create_location({'is_eu': internal_value.get('is_in_european_union', False)})
         ret = {
             'continent_code': internal_value['continent_code'],
             'continent_name': internal_value['continent_name'],
             'country_code': internal_value['country_code'],
             'country_name': internal_value['country_name'],
-            'location': location.pk,
+            'location': location,
             'coordinates': {
                 'longitude': internal_value['longitude'],
                 'latitude': internal_value['latitude']
@@ -56,7 +73,7 @@ class GeoIP2WithIPSerializer(GeoIP2Serializer):
         return internal_value
 
 
-class IPStackSerializer(serializers.Serializer):
+class IPStackSerializer(LocationCreateMixin, serializers.Serializer):
     ip = serializers.IPAddressField(required=True)
     type = serializers.ChoiceField(choices=('ipv4', 'ipv6'), required=True)
     continent_code = serializers.CharField(max_length=2, required=True)
@@ -74,9 +91,7 @@ class IPStackSerializer(serializers.Serializer):
     def to_internal_value(self, data):
         internal_value =  super().to_internal_value(data)
         languages = internal_value['location'].pop('languages', None)
-        location = Location.objects.create(**internal_value['location'])
-        if languages:
-            location.languages.add(*languages)
+        location = self.create_location(internal_value['location'], languages)
 
         return {
             'ip': internal_value['ip'],
@@ -93,18 +108,135 @@ class IPStackSerializer(serializers.Serializer):
                 'longitude': internal_value['longitude'],
                 'latitude': internal_value['latitude']
             },
-            'location': location.pk
+            'location': location
         }
 
 
-class GeoLocationSerializer(BaseModelSerializer):
+class GeoLocationSerializer(serializers.ModelSerializer):
     coordinates = PointField(required=True)
 
     class Meta:
         model = GeoLocation
         fields = '__all__'
+
+    def validate_ip(self, value):
+        queryset = GeoLocation.objects.filter(ip=value)
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if value is not None and queryset.exists():
+            raise serializers.ValidationError('geo location with this ip already exists.', code='unique')
+        return value
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['location'] = LocationSerializer(instance.location).data
         return representation
+
+
+class GeoLocationReadSerializer(BaseModelReadSerializer):
+    """The output of ``GeoLocationSerializer`` for list and retrieve, at a fraction of its cost."""
+    location_serializer = LocationReadSerializer()
+
+    def to_representation(self, instance) -> dict:
+        to_datetime = self.get_datetime_formatter()
+        coordinates = instance.coordinates
+        location = instance.location
+        return {
+            'id': instance.pk,
+            'coordinates': {'latitude': coordinates.y, 'longitude': coordinates.x},
+            'created_at': to_datetime(instance.created_at),
+            'updated_at': to_datetime(instance.updated_at),
+            'ip': instance.ip,
+            'ip_type': instance.ip_type,
+            'continent_code': instance.continent_code,
+            'continent_name': instance.continent_name,
+            'country_code': instance.country_code,
+            'country_name': instance.country_name,
+            'region_code': instance.region_code,
+            'region_name': instance.region_name,
+            'city': instance.city,
+            'postal_code': instance.postal_code,
+            # Without a location the model serializer gives the initial data of LocationSerializer.
+            'location': self.location_serializer.to_representation(location) if location is not None else LocationSerializer().data,
+        }
+
+
+class GeoLocationUpsertSerializer(GeoLocationSerializer):
+    created = None
+
+    def validate_ip(self, value):
+        return value
+
+    def create(self, validated_data):
+        instance, self.created = GeoLocation.objects.upsert(**validated_data)
+        return instance
+
+
+class GeoLocationBulkAddSerializer(serializers.Serializer):
+    ips = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    urls = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+
+    def validate(self, attrs):
+        count = len(attrs['ips']) + len(attrs['urls'])
+        if not count:
+            raise serializers.ValidationError("'ips' or 'urls' is required.")
+        if count > settings.GEOLOCATION_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(f'At most {settings.GEOLOCATION_BULK_MAX_ITEMS} addresses can be added at once.')
+        return attrs
+
+
+class GeoLocationSearchSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    ip_type = serializers.ChoiceField(choices=('ipv4', 'ipv6'), required=False)
+    continent_code = serializers.CharField(max_length=2, required=False)
+    country_code = serializers.CharField(max_length=2, required=False)
+    region_code = serializers.CharField(max_length=2, required=False)
+    city = serializers.CharField(max_length=163, required=False)
+
+    filter_fields = ('ip_type', 'continent_code', 'country_code', 'region_code', 'city')
+
+    @property
+    def filters(self) -> dict:
+        return {field: self.validated_data[field] for field in self.filter_fields if field in self.validated_data}
+
+
+class GeoLocationNearestSerializer(GeoLocationSearchSerializer):
+    k = serializers.IntegerField(min_value=1, default=10)
+
+    def validate_k(self, value):
+        if value > settings.GEOLOCATION_NEAREST_MAX_K:
+            raise serializers.ValidationError(f'At most {settings.GEOLOCATION_NEAREST_MAX_K} nearest geo locations can be requested.')
+        return value
+
+
+class GeoLocationWithinSerializer(GeoLocationSearchSerializer):
+    radius = serializers.FloatField(min_value=0, max_value=settings.GEOLOCATION_MAX_RADIUS)
+
+
+class GeoLocationDistanceSerializer(GeoLocationSerializer):
+    distance = serializers.SerializerMethodField()
+
+    def get_distance(self, instance) -> float:
+        # Metres.
+        return instance.distance.m
+
+
+class GeoLocationAggregateSerializer(serializers.Serializer):
+    bbox = serializers.CharField(help_text='west,south,east,north')
+    zoom = serializers.IntegerField(min_value=0)
+    mode = serializers.ChoiceField(choices=AGGREGATION_MODES, default='grid')
+
+    def validate_bbox(self, value):
+        try:
+            west, south, east, north = (float(coordinate) for coordinate in value.split(','))
+        except ValueError:
+            raise serializers.ValidationError('Expected west,south,east,north.')
+        if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+            raise serializers.ValidationError('Expected west,south,east,north in degrees, west of east and south of north.')
+        return west, south, east, north
+
+    def validate_zoom(self, value):
+        if value > settings.GEOLOCATION_AGGREGATION['MAX_ZOOM']:
+            raise serializers.ValidationError(f'At most {settings.GEOLOCATION_AGGREGATION["MAX_ZOOM"]}.')
+        return value
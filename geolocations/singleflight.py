@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+
+import redis
+
+from base.utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Deletes the lock only if it is still held by the caller's token.
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlightError(Exception):
+    """The call made by a worker of another process failed."""
+
+
+class SingleFlight:
+    """
+    Runs a function once per key for callers arriving while it is in flight, and hands its
+    result to all of them. Callers of one process wait on a shared future, with ``use_redis``
+    workers of other processes wait on a Redis lock and read the leader's result, which has to
+    be JSON serializable. ``do`` returns the result and whether it was produced by another caller.
+    When the leader of another process fails, its followers raise ``SingleFlightError``.
+    ``do_async`` does the same for coroutine functions, under the same keys.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        lock_timeout: float,
+        wait_timeout: float,
+        result_timeout: float,
+        poll_interval: float,
+        use_redis: bool = False,
+    ) -> None:
+        self.namespace = namespace
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.result_timeout = result_timeout
+        self.poll_interval = poll_interval
+        self.use_redis = use_redis
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+        self._async_calls: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Future]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _redis_key(self, suffix: str) -> str:
+        return f'geolocations:flight:{self.namespace}:{suffix}'
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result, shared = self._do_across_workers(key, fn) if self.use_redis else (fn(), False)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, shared
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = calls[key] = loop.create_future()
+        try:
+            result, shared = await self._do_across_workers_async(key, fn) if self.use_redis else (await fn(), False)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Retrieved, so a flight without followers isn't logged as an unhandled error.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, shared
+        finally:
+            del calls[key]
+
+    def _acquire(self, client: redis.Redis, lock_key: str, result_key: str, token: str) -> bool:
+        acquired = client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        if acquired:
+            # Waiters must not pick up the result of a previous flight.
+            client.delete(result_key)
+        return bool(acquired)
+
+    def _shared_result(self, value: bytes) -> Any:
+        outcome = json.loads(value)
+        if 'error' in outcome:
+            raise SingleFlightError(outcome['error'])
+        return outcome['result']
+
+    def _do_across_workers(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        lock_key, result_key = self._redis_key(f'lock:{key}'), self._redis_key(f'result:{key}')
+        token = uuid.uuid4().hex
+        try:
+            client = get_redis_client()
+            acquired = self._acquire(client, lock_key, result_key, token)
+            if not acquired:
+                value = self._wait_for_result(client, lock_key, result_key)
+                if value is not None:
+                    return self._shared_result(value), True
+                acquired = self._acquire(client, lock_key, result_key, token)
+        except redis.RedisError:
+            logger.warning('Single flight %s: Redis unavailable.', self.namespace, exc_info=True)
+            return fn(), False
+
+        # Without the lock (the leader is stuck or gone) the lookup is made anyway.
+        outcome = {'error': 'The call was interrupted.'}
+        try:
+            result = fn()
+            outcome = {'result': result}
+            return result, False
+        except Exception as exc:
+            outcome = {'error': f'{type(exc).__name__}: {exc}'}
+            raise
+        finally:
+            # Followers are released whatever happened, instead of waiting for the lock to expire.
+            self._publish(client, lock_key, result_key, token, acquired, outcome)
+
+    async def _do_across_workers_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        lock_key, result_key = self._redis_key(f'lock:{key}'), self._redis_key(f'result:{key}')
+        token = uuid.uuid4().hex
+        try:
+            client = get_redis_client()
+            acquired = await sync_to_async(self._acquire, thread_sensitive=False)(client, lock_key, result_key, token)
+            if not acquired:
+                value = await self._wait_for_result_async(client, lock_key, result_key)
+                if value is not None:
+                    return self._shared_result(value), True
+                acquired = await sync_to_async(self._acquire, thread_sensitive=False)(client, lock_key, result_key, token)
+        except redis.RedisError:
+            logger.warning('Single flight %s: Redis unavailable.', self.namespace, exc_info=True)
+            return await fn(), False
+
+        outcome = {'error': 'The call was interrupted.'}
+        try:
+            result = await fn()
+            outcome = {'result': result}
+            return result, False
+        except Exception as exc:
+            outcome = {'error': f'{type(exc).__name__}: {exc}'}
+            raise
+        finally:
+            await sync_to_async(self._publish, thread_sensitive=False)(client, lock_key, result_key, token, acquired, outcome)
+
+    def _publish(self, client: redis.Redis, lock_key: str, result_key: str, token: str, acquired: bool, outcome: dict) -> None:
+        try:
+            pipeline = client.pipeline()
+            pipeline.set(result_key, json.dumps(outcome), px=int(self.result_timeout * 1000))
+            if acquired:
+                pipeline.eval(RELEASE_SCRIPT, 1, lock_key, token)
+            pipeline.execute()
+        except redis.RedisError:
+            logger.warning('Single flight %s: Redis unavailable.', self.namespace, exc_info=True)
+
+    def _wait_for_result(self, client: redis.Redis, lock_key: str, result_key: str):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            value = client.get(result_key)
+            if value is not None or not client.exists(lock_key) or time.monotonic() >= deadline:
+                return value if value is not None else client.get(result_key)
+            time.sleep(self.poll_interval)
+
+    async def _wait_for_result_async(self, client: redis.Redis, lock_key: str, result_key: str):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            value = await sync_to_async(client.get, thread_sensitive=False)(result_key)
+            if (
+                value is not None
+                or not await sync_to_async(client.exists, thread_sensitive=False)(lock_key)
+                or time.monotonic() >= deadline
+            ):
+                return value if value is not None else await sync_to_async(client.get, thread_sensitive=False)(result_key)
+            await asyncio.sleep(self.poll_interval)
+
+
+geolocation_flight = SingleFlight(
+    'geolocation',
+    lock_timeout=settings.GEOLOCATION_SINGLE_FLIGHT['LOCK_TIMEOUT'],
+    wait_timeout=settings.GEOLOCATION_SINGLE_FLIGHT['WAIT_TIMEOUT'],
+    result_timeout=settings.GEOLOCATION_SINGLE_FLIGHT['RESULT_TIMEOUT'],
+    poll_interval=settings.GEOLOCATION_SINGLE_FLIGHT['POLL_INTERVAL'],
+    use_redis=settings.GEOLOCATION_SINGLE_FLIGHT['REDIS'],
+)
@@ -0,0 +1,15 @@
+import logging
+from typing import Optional
+
+from django_gis.celery import app
+from geolocations.views import GeoLocationCreateFactory
+
+logger = logging.getLogger(__name__)
+
+
+@app.task
+def add_geolocations(ips: Optional[list[str]] = None, urls: Optional[list[str]] = None) -> dict:
+    results, errors = GeoLocationCreateFactory().bulk_create(ips or [], urls or [])
+    if errors:
+        logger.info('Geolocations not added: %s', errors)
+    return {'geolocations': [geolocation.pk for geolocation, _ in results], 'errors': errors}
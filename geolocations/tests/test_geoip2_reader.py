@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, tag
+
+from geolocations.geoip import GeoIP2ReaderPool, NetworkGeoIP2
+
+
+@tag('geoip2-reader')
+class GeoIP2ReaderPoolTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.pool = GeoIP2ReaderPool(check_interval=0)
+        self.signature = (('GeoLite2-City.mmdb', 1, 100, 1),)
+
+    def test_reader_is_shared_between_calls(self):
+        with mock.patch.object(GeoIP2ReaderPool, '_database_signature', return_value=self.signature), \
+                mock.patch('geolocations.geoip.NetworkGeoIP2') as geoip2_mock:
+            reader = self.pool.get()
+            self.assertIs(self.pool.get(), reader)
+            geoip2_mock.assert_called_once_with(cache=self.pool.cache)
+
+    def test_reader_is_not_checked_within_interval(self):
+        pool = GeoIP2ReaderPool(check_interval=60)
+        with mock.patch.object(GeoIP2ReaderPool, '_database_signature', return_value=self.signature) as signature_mock, \
+                mock.patch('geolocations.geoip.NetworkGeoIP2'):
+            pool.get()
+            pool.get()
+            signature_mock.assert_called_once()
+
+    def test_reader_reloaded_when_database_changes(self):
+        new_signature = (('GeoLite2-City.mmdb', 2, 120, 2),)
+        with mock.patch.object(GeoIP2ReaderPool, '_database_signature', side_effect=[self.signature, new_signature]), \
+                mock.patch('geolocations.geoip.NetworkGeoIP2', side_effect=[mock.Mock(), mock.Mock()]) as geoip2_mock:
+            first = self.pool.get()
+            second = self.pool.get()
+            self.assertIsNot(first, second)
+            self.assertEqual(geoip2_mock.call_count, 2)
+
+    def test_failed_reload_keeps_current_reader(self):
+        new_signature = (('GeoLite2-City.mmdb', 2, 10, 2),)
+        with mock.patch.object(GeoIP2ReaderPool, '_database_signature', side_effect=[self.signature, new_signature]), \
+                mock.patch('geolocations.geoip.NetworkGeoIP2', side_effect=[mock.Mock(), Exception('truncated database')]):
+            first = self.pool.get()
+            with self.assertLogs('geolocations.geoip', level='ERROR'):
+                self.assertIs(self.pool.get(), first)
+
+
+@tag('geoip2-reader')
+class NetworkGeoIP2Tests(SimpleTestCase):
+    def test_city_with_network(self):
+        with mock.patch('geolocations.geoip.geoip2.database.Reader') as reader_mock:
+            response = reader_mock.return_value.city.return_value
+            response.city.name = 'Gdańsk'
+            response.country.iso_code = 'PL'
+            response.subdivisions = []
+            record, network = NetworkGeoIP2().city_with_network('1.1.1.1')
+
+        reader_mock.return_value.city.assert_called_once_with('1.1.1.1')
+        self.assertEqual(record['city'], 'Gdańsk')
+        self.assertEqual(record['country_code'], 'PL')
+        self.assertIsNone(record['region'])
+        self.assertIs(network, response.traits.network)
@@ -0,0 +1,93 @@
+import json
+import math
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.test import override_settings, tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from geolocations.aggregation import MERCATOR_EXTENT
+from geolocations.models import GeoLocation
+
+
+@tag('geolocations-aggregate')
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+})
+class GeoLocationAggregateTests(APITestCase):
+    def setUp(self) -> None:
+        for ip, city, longitude, latitude in (
+            ('1.1.1.1', 'Warsaw', 21.0122, 52.2297),
+            ('1.1.1.2', 'Warsaw', 21.0200, 52.2300),
+            ('1.1.1.3', 'Krakow', 19.9450, 50.0647),
+            ('1.1.1.4', 'Berlin', 13.4050, 52.5200),
+            ('1.1.1.5', 'New York', -74.0060, 40.7128),
+        ):
+            GeoLocation.objects.create(
+                ip=ip, ip_type='ipv4', continent_code='EU', continent_name='Europe', country_code='PL',
+                country_name='Poland', city=city, coordinates=Point(longitude, latitude, srid=4326),
+            )
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        patcher = patch('geolocations.aggregation.get_cache_version', return_value=1)
+        self.get_cache_version_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_aggregate(self, **params):
+        return self.client.get(reverse('api:geolocations-aggregate'), {'bbox': '10,45,25,56', 'zoom': 6, **params})
+
+    def test_modes(self):
+        for mode in ('grid', 'hex', 'cluster'):
+            with self.subTest(mode=mode):
+                response = self.get_aggregate(mode=mode)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                cells = response.data['cells']
+                # New York is out of the box, the Warsaw points share a cell.
+                self.assertEqual(sum(cell['count'] for cell in cells), 4)
+                self.assertEqual(len(cells), 3)
+                self.assertEqual(cells[0]['count'], 2)
+                self.assertAlmostEqual(cells[0]['centroid'][0], 21.016, places=2)
+
+    def test_hex_edge_points_counted_once(self):
+        zoom = 6
+        size = 2 * MERCATOR_EXTENT / 2 ** zoom / settings.GEOLOCATION_AGGREGATION['CELLS_PER_TILE']
+        # A vertex shared by three cells of the grid anchored at the origin and the middle of an edge shared by two.
+        for ip, x, y in (('1.1.1.6', size, 0), ('1.1.1.7', 0, size * math.sqrt(3) / 2)):
+            longitude = x * 180 / MERCATOR_EXTENT
+            latitude = math.degrees(2 * math.atan(math.exp(y * math.pi / MERCATOR_EXTENT)) - math.pi / 2)
+            GeoLocation.objects.create(
+                ip=ip, ip_type='ipv4', continent_code='AF', continent_name='Africa', country_code='GH',
+                country_name='Ghana', coordinates=Point(longitude, latitude, srid=4326),
+            )
+        response = self.get_aggregate(bbox='-1,-1,1,1', zoom=zoom, mode='hex')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(cell['count'] for cell in response.data['cells']), 2)
+
+    def test_cached_until_version_bumped(self):
+        data = self.get_aggregate().data
+        # Only the user is read.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_aggregate().data, data)
+
+        self.get_cache_version_mock.return_value = 2
+        with self.assertNumQueries(2):
+            self.get_aggregate()
+
+    def test_too_large_bbox_negative(self):
+        response = self.get_aggregate(bbox='-180,-90,180,90', zoom=10)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_bbox_negative(self):
+        response = self.get_aggregate(bbox='25,45,10,56')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -3,7 +3,7 @@ import json
 from django.contrib.auth.models import User
 from django.contrib.gis.geos import GEOSGeometry
 from django.shortcuts import get_object_or_404
-from django.test import tag
+from django.test import override_settings, tag
 from django.urls import reverse
 
 from rest_framework import status
@@ -11,11 +11,14 @@ from rest_framework.test import APITestCase
 
 from geolocations.models import GeoLocation
 from geolocations.serializers import GeoLocationSerializer
+from languages.models import Language
 from languages.serializers import LanguageSerializer
+from locations.models import Location
 from locations.serializers import LocationSerializer
 
 
 @tag('geolocations-api')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
 class GeoLocationApiTests(APITestCase):
     def setUp(self) -> None:
         location_serializer = LocationSerializer(data={'geoname_id': 12345, 'capital':'Capital City'})
@@ -71,6 +74,37 @@ class GeoLocationApiTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertListEqual(response.data['results'], GeoLocationSerializer(GeoLocation.objects.all(), many=True).data)
 
+    def create_geolocations(self, count: int) -> None:
+        for i in range(count):
+            location = Location.objects.create(geoname_id=i, capital=f'Capital {i}')
+            location.languages.add(
+                Language.objects.create(code='AA', name='AAA', native=f'AAA{i}'),
+                Language.objects.create(code='BB', name='BBB', native=f'BBB{i}'),
+            )
+            GeoLocation.objects.create(
+                ip=f'10.0.0.{i}', ip_type='ipv4', continent_code='EU', continent_name='Europe',
+                country_code='PL', country_name='Poland', coordinates=GEOSGeometry('POINT(18.6 54.3)'),
+                location=location,
+            )
+
+    def test_list_query_count_independent_of_page_size(self):
+        self.create_geolocations(20)
+        # The user, the count, the page with locations and the languages of the page.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('api:geolocations-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 21)
+        self.assertListEqual(
+            sorted(response.data['results'], key=lambda item: item['id']),
+            GeoLocationSerializer(GeoLocation.objects.order_by('id'), many=True).data,
+        )
+
+    def test_retrieve_query_count(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('api:geolocations-detail', args=(self.geolocation_1.pk,)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['location']['languages'][0]['id'], self.language_1.pk)
+
     def test_can_get_geolocation_details(self):
         response = self.client.get(reverse('api:geolocations-detail', args=(self.geolocation_1.pk,)))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
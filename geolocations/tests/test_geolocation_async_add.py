@@ -0,0 +1,93 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.test import tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from geolocations.cache import geoip2_cache, ipstack_cache
+from geolocations.ipstack import AsyncIPStackClient, IPStackUnavailable, ipstack_client
+from geolocations.models import GeoLocation
+
+
+@tag('geolocation-async-add')
+class GeoLocationAsyncAddViewTests(APITestCase):
+    ipstack_payload = {
+        'ip': '134.201.250.155', 'type': 'ipv4', 'continent_code': 'NA',
+        'continent_name': 'North America', 'country_code': 'US',
+        'country_name': 'United States', 'region_code': 'CA', 'region_name': 'California',
+        'city': 'Los Angeles', 'zip': '90012',
+        'latitude': 34.0655517578125, 'longitude': -118.24053955078125,
+        'location': {
+            'geoname_id': 5368361, 'capital': 'Washington D.C.',
+            'languages': [{'code': 'en', 'name': 'English', 'native': 'English'}],
+            'is_eu': False
+        }
+    }
+
+    def setUp(self) -> None:
+        geoip2_cache.clear()
+        ipstack_cache.clear()
+        ipstack_client.breaker.record_success()
+        self.user = User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.token = response.data["access"]
+        self.url = reverse('api:geolocations-async-add')
+
+    async def test_async_add_valid_ip_positive(self):
+        with mock.patch.object(AsyncIPStackClient, 'get', mock.AsyncMock(return_value=dict(self.ipstack_payload))) as get_mock:
+            response = await self.async_client.get(f'{self.url}?ip=134.201.250.155', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['ip'], '134.201.250.155')
+        get_mock.assert_awaited_once_with('134.201.250.155')
+        self.assertEqual(await sync_to_async(GeoLocation.objects.count)(), 1)
+
+    async def test_concurrent_async_adds_share_one_lookup(self):
+        async def get(ip):
+            await asyncio.sleep(0.1)
+            return dict(self.ipstack_payload)
+
+        with mock.patch.object(AsyncIPStackClient, 'get', mock.AsyncMock(side_effect=get)) as get_mock:
+            responses = await asyncio.gather(*[
+                self.async_client.get(f'{self.url}?ip=134.201.250.155', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+                for _ in range(2)
+            ])
+        get_mock.assert_awaited_once_with('134.201.250.155')
+        self.assertCountEqual([response.status_code for response in responses], [status.HTTP_200_OK, status.HTTP_201_CREATED])
+        self.assertEqual(await sync_to_async(GeoLocation.objects.count)(), 1)
+
+    async def test_async_add_ipstack_unavailable_falls_back_to_geoip2(self):
+        with mock.patch.object(AsyncIPStackClient, 'get', mock.AsyncMock(side_effect=IPStackUnavailable)):
+            response = await self.async_client.get(f'{self.url}?ip=134.201.250.155', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['ip'], '134.201.250.155')
+
+    async def test_async_add_valid_url_positive(self):
+        response = await self.async_client.get(f'{self.url}?url=wp.pl', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    async def test_async_add_no_parameters_negative(self):
+        response = await self.async_client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), ["'url' or 'ip' parameter is required."])
+
+    async def test_async_add_unauthenticated_negative(self):
+        response = await self.async_client.get(f'{self.url}?ip=134.201.250.155')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_add_not_staff_negative(self):
+        self.user.is_staff = False
+        await sync_to_async(self.user.save)()
+        response = await self.async_client.get(f'{self.url}?ip=134.201.250.155', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
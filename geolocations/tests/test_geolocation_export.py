@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.core.management import call_command
+from django.test import override_settings, tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from geolocations.models import GeoLocation
+from languages.models import Language
+from locations.models import Location
+
+
+@tag('geolocations-export')
+@override_settings(GEOLOCATION_EXPORT_CHUNK_SIZE=2)
+class GeoLocationExportTests(APITestCase):
+    def setUp(self) -> None:
+        language = Language.objects.create(code='pl', name='Polish', native='Polski')
+        for i in range(3):
+            location = Location.objects.create(geoname_id=i, capital='Warsaw', is_eu=True)
+            location.languages.add(language)
+            GeoLocation.objects.create(
+                ip=f'1.1.1.{i}', ip_type='ipv4', continent_code='EU', continent_name='Europe', country_code='PL',
+                country_name='Poland', city='Gdańsk', coordinates=Point(18.6, 54.3, srid=4326), location=location,
+            )
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+
+    def get_export(self, output: str) -> str:
+        response = self.client.get(reverse('api:geolocations-export'), {'output': output})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_geojson(self):
+        collection = json.loads(self.get_export('geojson'))
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(len(collection['features']), 3)
+        feature = collection['features'][0]
+        self.assertEqual(feature['geometry'], {'type': 'Point', 'coordinates': [18.6, 54.3]})
+        self.assertEqual(feature['properties']['city'], 'Gdańsk')
+        self.assertEqual(feature['properties']['location']['languages'], [{'code': 'pl', 'name': 'Polish', 'native': 'Polski'}])
+
+    def test_ndjson(self):
+        features = [json.loads(line) for line in self.get_export('ndjson').splitlines()]
+        self.assertEqual([feature['properties']['ip'] for feature in features], ['1.1.1.0', '1.1.1.1', '1.1.1.2'])
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.get_export('csv'))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual((rows[0]['longitude'], rows[0]['latitude'], rows[0]['languages']), ('18.6', '54.3', 'pl'))
+
+    def test_unknown_output_negative(self):
+        response = self.client.get(reverse('api:geolocations-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'geolocations.geojson')
+            call_command('export_geolocations', format='geojson', output=path)
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual(len(json.load(file)['features']), 3)
@@ -0,0 +1,65 @@
+from django.contrib.gis.geos import Point
+from django.test import tag
+
+from rest_framework.test import APITestCase
+
+from geolocations.models import GeoLocation
+from locations.models import Location
+
+
+@tag('geolocations-manager')
+class GeoLocationUpsertTests(APITestCase):
+    def setUp(self) -> None:
+        self.values = {
+            'ip': '134.201.250.155', 'ip_type': 'ipv4', 'continent_code': 'NA',
+            'continent_name': 'North America', 'country_code': 'US', 'country_name': 'United States',
+            'region_code': 'CA', 'region_name': 'California', 'city': 'Los Angeles',
+            'postal_code': '90012', 'coordinates': Point(-118.24053955078125, 34.0655517578125, srid=4326),
+        }
+
+    def test_upsert_inserts_new_ip(self):
+        geolocation, created = GeoLocation.objects.upsert(**self.values)
+        self.assertTrue(created)
+        self.assertIsNotNone(geolocation.pk)
+        self.assertIsNotNone(geolocation.created_at)
+        self.assertEqual(GeoLocation.objects.get(pk=geolocation.pk).city, 'Los Angeles')
+
+    def test_upsert_updates_existing_ip(self):
+        first, _ = GeoLocation.objects.upsert(**self.values)
+        second, created = GeoLocation.objects.upsert(**{**self.values, 'city': 'Gdańsk'})
+        self.assertFalse(created)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.created_at, first.created_at)
+        self.assertEqual(GeoLocation.objects.count(), 1)
+        self.assertEqual(GeoLocation.objects.get(pk=first.pk).city, 'Gdańsk')
+
+    def test_upsert_in_a_single_query(self):
+        GeoLocation.objects.upsert(**self.values)
+        with self.assertNumQueries(1):
+            GeoLocation.objects.upsert(**self.values)
+
+    def test_upsert_deletes_replaced_location(self):
+        old_location = Location.objects.create()
+        new_location = Location.objects.create()
+        GeoLocation.objects.upsert(**self.values, location=old_location)
+        geolocation, _ = GeoLocation.objects.upsert(**self.values, location=new_location)
+        self.assertEqual(GeoLocation.objects.get(pk=geolocation.pk).location, new_location)
+        self.assertFalse(Location.objects.filter(pk=old_location.pk).exists())
+
+    def test_upsert_without_ip_always_inserts(self):
+        values = {**self.values, 'ip': None, 'ip_type': ''}
+        GeoLocation.objects.upsert(**values)
+        _, created = GeoLocation.objects.upsert(**values)
+        self.assertTrue(created)
+        self.assertEqual(GeoLocation.objects.count(), 2)
+
+    def test_bulk_upsert_keeps_order_and_last_duplicate(self):
+        objs = [
+            GeoLocation(**self.values),
+            GeoLocation(**{**self.values, 'ip': '212.77.100.101', 'city': 'Gdańsk'}),
+            GeoLocation(**{**self.values, 'city': 'San Francisco'}),
+        ]
+        results = GeoLocation.objects.bulk_upsert(objs)
+        self.assertEqual([geolocation.city for geolocation, _ in results], ['San Francisco', 'Gdańsk', 'San Francisco'])
+        self.assertEqual([created for _, created in results], [False, True, True])
+        self.assertEqual(GeoLocation.objects.count(), 2)
@@ -0,0 +1,80 @@
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.core.management import call_command
+from django.test import override_settings, tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from geolocations.models import GeoLocation
+from geolocations.serializers import GeoLocationReadSerializer, GeoLocationSerializer
+from languages.models import Language
+from locations.models import Location
+
+
+@tag('geolocations-read-serializer')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class GeoLocationReadSerializerTests(APITestCase):
+    def setUp(self) -> None:
+        languages = [
+            Language.objects.create(code='pl', name='Polish', native='Polski'),
+            Language.objects.create(code='de', name='German', native='Deutsch'),
+        ]
+        location = Location.objects.create(geoname_id=798544, capital='Warsaw', is_eu=True)
+        location.languages.add(*languages)
+        GeoLocation.objects.create(
+            ip='1.1.1.1', ip_type='ipv4', continent_code='EU', continent_name='Europe', country_code='PL',
+            country_name='Poland', region_code='PM', region_name='Pomerania', city='Gdańsk', postal_code='80-001',
+            coordinates=Point(18.6466384, 54.3520252, srid=4326), location=location,
+        )
+        GeoLocation.objects.create(
+            ip='2001:db8::1', ip_type='ipv6', continent_code='NA', continent_name='North America', country_code='US',
+            country_name='United States', coordinates=Point(-118.24053955078125, 34.0655517578125, srid=4326),
+            location=Location.objects.create(),
+        )
+        GeoLocation.objects.create(
+            ip=None, continent_code='EU', continent_name='Europe', country_code='DE', country_name='Germany',
+            coordinates=Point(13.4, 52.5, srid=4326), location=None,
+        )
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+
+    def render(self, serializer_class, instance, many: bool = False) -> bytes:
+        return JSONRenderer().render(serializer_class(instance, many=many).data)
+
+    def test_list_output_identical(self):
+        geolocations = GeoLocation.objects.with_location().order_by('pk')
+        self.assertEqual(
+            self.render(GeoLocationReadSerializer, geolocations, many=True),
+            self.render(GeoLocationSerializer, geolocations, many=True),
+        )
+
+    def test_retrieve_output_identical(self):
+        for geolocation in GeoLocation.objects.with_location():
+            with self.subTest(ip=geolocation.ip):
+                self.assertEqual(
+                    self.render(GeoLocationReadSerializer, geolocation),
+                    self.render(GeoLocationSerializer, geolocation),
+                )
+
+    def test_list_endpoint(self):
+        response = self.client.get(reverse('api:geolocations-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = sorted(json.loads(response.content)['results'], key=lambda item: item['id'])
+        expected = json.loads(self.render(GeoLocationSerializer, GeoLocation.objects.with_location().order_by('pk'), many=True))
+        self.assertEqual(results, expected)
+
+    def test_benchmark_command(self):
+        stdout = io.StringIO()
+        call_command('benchmark_serializers', rows=10, repeat=1, stdout=stdout)
+        self.assertIn('Identical output', stdout.getvalue())
@@ -0,0 +1,119 @@
+import json
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.test import override_settings, tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from geolocations.models import GeoLocation
+
+
+@tag('geolocations-search')
+class GeoLocationSearchTests(APITestCase):
+    def setUp(self) -> None:
+        for ip, country_code, city, longitude, latitude in (
+            ('1.1.1.1', 'PL', 'Warsaw', 21.0122, 52.2297),
+            ('1.1.1.2', 'PL', 'Krakow', 19.9450, 50.0647),
+            ('1.1.1.3', 'DE', 'Berlin', 13.4050, 52.5200),
+            ('1.1.1.4', 'US', 'New York', -74.0060, 40.7128),
+        ):
+            GeoLocation.objects.create(
+                ip=ip, ip_type='ipv4', continent_code='EU', continent_name='Europe', country_code=country_code,
+                country_name=country_code, city=city, coordinates=Point(longitude, latitude, srid=4326),
+            )
+
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+
+    def test_nearest(self):
+        response = self.client.get(reverse('api:geolocations-nearest'), {'latitude': 52.2, 'longitude': 21.0, 'k': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['city'] for item in response.data], ['Warsaw', 'Krakow'])
+        self.assertLess(response.data[0]['distance'], 5000)
+        self.assertAlmostEqual(response.data[1]['distance'], 250000, delta=10000)
+
+    def test_nearest_filtered(self):
+        response = self.client.get(reverse('api:geolocations-nearest'), {'latitude': 52.2, 'longitude': 21.0, 'country_code': 'DE'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['city'] for item in response.data], ['Berlin'])
+
+    @override_settings(GEOLOCATION_NEAREST_MAX_K=5)
+    def test_nearest_too_many_negative(self):
+        response = self.client.get(reverse('api:geolocations-nearest'), {'latitude': 52.2, 'longitude': 21.0, 'k': 6})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nearest_by_metres_at_high_latitude(self):
+        for ip, city, longitude, latitude in (
+            # 2.5 degrees east is about 95 km at 70 degrees north, 1.5 degrees north about 167 km.
+            ('1.1.1.5', 'East', 22.5, 70.0),
+            ('1.1.1.6', 'North', 20.0, 71.5),
+        ):
+            GeoLocation.objects.create(
+                ip=ip, ip_type='ipv4', continent_code='EU', continent_name='Europe', country_code='NO',
+                country_name='NO', city=city, coordinates=Point(longitude, latitude, srid=4326),
+            )
+        response = self.client.get(reverse('api:geolocations-nearest'), {'latitude': 70.0, 'longitude': 20.0, 'k': 2})
+        self.assertEqual([item['city'] for item in response.data], ['East', 'North'])
+
+    def test_within(self):
+        response = self.client.get(reverse('api:geolocations-within'), {'latitude': 52.2, 'longitude': 21.0, 'radius': 600000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([item['city'] for item in response.data['results']], ['Warsaw', 'Krakow', 'Berlin'])
+
+    def test_within_near_pole(self):
+        GeoLocation.objects.create(
+            ip='1.1.1.5', ip_type='ipv4', continent_code='EU', continent_name='Europe', country_code='NO',
+            country_name='NO', city='Svalbard', coordinates=Point(-160.0, 89.9, srid=4326),
+        )
+        # On the other side of the pole, 180 degrees of longitude away.
+        response = self.client.get(reverse('api:geolocations-within'), {'latitude': 89.9, 'longitude': 20.0, 'radius': 50000})
+        self.assertEqual([item['city'] for item in response.data['results']], ['Svalbard'])
+
+    def test_within_paging(self):
+        url = f'{reverse("api:geolocations-within")}?latitude=52.2&longitude=21.0&radius=600000&limit=2'
+        cities = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            cities += [item['city'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(cities, ['Warsaw', 'Krakow', 'Berlin'])
+
+    def test_within_across_antimeridian(self):
+        GeoLocation.objects.create(
+            ip='1.1.1.5', ip_type='ipv4', continent_code='OC', continent_name='Oceania', country_code='FJ',
+            country_name='FJ', city='Taveuni', coordinates=Point(-179.9, -16.8, srid=4326),
+        )
+        # About 21 km away, on the other side of the antimeridian.
+        response = self.client.get(reverse('api:geolocations-within'), {'latitude': -16.8, 'longitude': 179.9, 'radius': 50000})
+        self.assertEqual([item['city'] for item in response.data['results']], ['Taveuni'])
+
+        response = self.client.get(reverse('api:geolocations-nearest'), {'latitude': -16.8, 'longitude': 179.9, 'k': 1})
+        self.assertEqual([item['city'] for item in response.data], ['Taveuni'])
+
+    def test_within_cursor_paging_negative(self):
+        response = self.client.get(
+            reverse('api:geolocations-within'),
+            {'latitude': 52.2, 'longitude': 21.0, 'radius': 600000, 'pagination': 'cursor'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pagination', response.data)
+
+    def test_nearest_cursor_paging_negative(self):
+        response = self.client.get(
+            reverse('api:geolocations-nearest'), {'latitude': 52.2, 'longitude': 21.0, 'cursor': 'invalid'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_within_missing_radius_negative(self):
+        response = self.client.get(reverse('api:geolocations-within'), {'latitude': 52.2, 'longitude': 21.0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
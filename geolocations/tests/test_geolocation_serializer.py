@@ -39,6 +39,28 @@ class GeoLocationSerializerTests(APITestCase):
         serializer = GeoLocationSerializer(data=payload_data)
         self.assertTrue(serializer.is_valid(raise_exception=True))
     
+    def test_ip_unique(self):
+        serializer = GeoLocationSerializer(data=self.payload_data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        serializer = GeoLocationSerializer(data=self.payload_data)
+        with self.assertRaisesMessage(ValidationError, 'geo location with this ip already exists.') as cm:
+            serializer.is_valid(raise_exception=True)
+
+        self.assertEqual(cm.exception.detail['ip'][0].code, 'unique')
+
+    def test_ip_null_not_unique(self):
+        payload_data = self.payload_data
+        payload_data['ip'] = None
+        payload_data['location'] = None
+        serializer = GeoLocationSerializer(data=payload_data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        serializer = GeoLocationSerializer(data=payload_data)
+        self.assertTrue(serializer.is_valid(raise_exception=True))
+
     def test_ip_blank(self):
         payload_data = self.payload_data
         payload_data['ip'] = ''
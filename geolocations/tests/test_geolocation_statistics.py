@@ -0,0 +1,92 @@
+import json
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.test import tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from geolocations.models import GeoLocation, GeoLocationStatistic
+from locations.models import Location
+
+
+@tag('geolocations-statistics')
+class GeoLocationStatisticsTests(APITestCase):
+    def setUp(self) -> None:
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+
+    def create_geolocation(self, ip: str, continent_code: str, country_code: str, is_eu: bool = False) -> GeoLocation:
+        return GeoLocation.objects.create(
+            ip=ip, ip_type='ipv4', continent_code=continent_code, continent_name=continent_code,
+            country_code=country_code, country_name=country_code, coordinates=Point(0, 0, srid=4326),
+            location=Location.objects.create(is_eu=is_eu),
+        )
+
+    def counts(self) -> dict:
+        return {
+            (statistic.continent_code, statistic.country_code, statistic.is_eu): statistic.count
+            for statistic in GeoLocationStatistic.objects.filter(count__gt=0)
+        }
+
+    def test_counted_on_insert_update_and_delete(self):
+        geolocation = self.create_geolocation('1.1.1.1', 'EU', 'PL', is_eu=True)
+        self.create_geolocation('1.1.1.2', 'EU', 'PL', is_eu=True)
+        self.assertEqual(self.counts(), {('EU', 'PL', True): 2})
+
+        geolocation.country_code = 'DE'
+        geolocation.save()
+        self.assertEqual(self.counts(), {('EU', 'PL', True): 1, ('EU', 'DE', True): 1})
+
+        Location.objects.filter(pk=geolocation.location_id).update(is_eu=False)
+        self.assertEqual(self.counts(), {('EU', 'PL', True): 1, ('EU', 'DE', False): 1})
+
+        geolocation.delete()
+        self.assertEqual(self.counts(), {('EU', 'PL', True): 1})
+
+    def test_counted_on_bulk_upsert(self):
+        GeoLocation.objects.bulk_upsert([
+            GeoLocation(ip='1.1.1.1', continent_code='NA', continent_name='NA', country_code='US', country_name='US', coordinates=Point(0, 0)),
+            GeoLocation(ip='1.1.1.2', continent_code='NA', continent_name='NA', country_code='US', country_name='US', coordinates=Point(0, 0)),
+        ])
+        GeoLocation.objects.bulk_upsert([
+            GeoLocation(ip='1.1.1.2', continent_code='NA', continent_name='NA', country_code='CA', country_name='CA', coordinates=Point(0, 0)),
+        ])
+        self.assertEqual(self.counts(), {('NA', 'US', False): 1, ('NA', 'CA', False): 1})
+
+    def test_location_deleted(self):
+        geolocation = self.create_geolocation('1.1.1.1', 'EU', 'PL', is_eu=True)
+        geolocation.location.delete()
+        self.assertEqual(self.counts(), {('EU', 'PL', False): 1})
+
+    def test_rebuild(self):
+        self.create_geolocation('1.1.1.1', 'EU', 'PL', is_eu=True)
+        GeoLocationStatistic.objects.all().delete()
+        GeoLocationStatistic.objects.rebuild()
+        self.assertEqual(self.counts(), {('EU', 'PL', True): 1})
+
+    def test_statistics_endpoint(self):
+        self.create_geolocation('1.1.1.1', 'EU', 'PL', is_eu=True)
+        self.create_geolocation('1.1.1.2', 'EU', 'NO')
+        self.create_geolocation('1.1.1.3', 'NA', 'US')
+        # The user and the statistics, however many geo locations there are.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api:geolocations-statistics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'total': 3,
+            'continents': [{'continent_code': 'EU', 'count': 2}, {'continent_code': 'NA', 'count': 1}],
+            'countries': [
+                {'continent_code': 'EU', 'country_code': 'NO', 'count': 1},
+                {'continent_code': 'EU', 'country_code': 'PL', 'count': 1},
+                {'continent_code': 'NA', 'country_code': 'US', 'count': 1},
+            ],
+            'is_eu': {'true': 1, 'false': 2},
+        })
@@ -0,0 +1,71 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.test import override_settings, tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from geolocations.models import GeoLocation
+
+
+@tag('geolocations-tiles')
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+})
+class GeoLocationTileTests(APITestCase):
+    def setUp(self) -> None:
+        GeoLocation.objects.create(
+            ip='1.1.1.1', ip_type='ipv4', continent_code='EU', continent_name='Europe', country_code='PL',
+            country_name='Poland', city='Warsaw', coordinates=Point(21.0122, 52.2297, srid=4326),
+        )
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        patcher = patch('geolocations.tiles.get_cache_version', return_value=1)
+        self.get_cache_version_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tile_url(self, z: int, x: int, y: int) -> str:
+        return reverse('api:geolocations-tiles', kwargs={'z': z, 'x': x, 'y': y})
+
+    def test_tile(self):
+        response = self.client.get(self.tile_url(0, 0, 0))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertIn(b'geolocations', response.content)
+        self.assertIn(b'Warsaw', response.content)
+
+    def test_empty_tile(self):
+        # The south-west quarter of the world.
+        response = self.client.get(self.tile_url(1, 0, 1))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'')
+
+    def test_tile_cached_until_version_bumped(self):
+        content = self.client.get(self.tile_url(0, 0, 0)).content
+        # Only the user is read.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.tile_url(0, 0, 0)).content, content)
+
+        self.get_cache_version_mock.return_value = 2
+        with self.assertNumQueries(2):
+            self.client.get(self.tile_url(0, 0, 0))
+
+    def test_tile_not_cached_without_version(self):
+        self.get_cache_version_mock.return_value = None
+        self.client.get(self.tile_url(0, 0, 0))
+        with self.assertNumQueries(2):
+            self.client.get(self.tile_url(0, 0, 0))
+
+    def test_tile_out_of_range_negative(self):
+        response = self.client.get(self.tile_url(1, 2, 0))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
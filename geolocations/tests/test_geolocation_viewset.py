@@ -1,3 +1,4 @@
+import ipaddress
 import json
 
 import os
@@ -5,9 +6,12 @@ import random
 
 from unittest import mock
 
+import requests
+from geoip2.errors import AddressNotFoundError
+
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.test import tag
+from django.test import override_settings, tag
 from django.urls import reverse
 
 from rest_framework import status
@@ -16,17 +20,19 @@ from rest_framework.test import (
     APITestCase,
 )
 
+from geolocations.cache import geoip2_cache, ipstack_cache
 from geolocations.models import GeoLocation
 from geolocations.serializers import GeoLocationSerializer
-from geolocations.views import (
-    IPSTACK_URL,
-    GeoLocationViewSet,
-)
+from geolocations.ipstack import IPSTACK_URL, ipstack_client, ipstack_quota
+from geolocations.views import GeoLocationViewSet
+from languages.models import Language
 from languages.serializers import LanguageSerializer
+from locations.models import Location
 from locations.serializers import LocationSerializer
 
 
 @tag('geolocations-viewset')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
 class GeoLocationViewSetTests(APITestCase):
     def setUp(self) -> None:
         location_serializer = LocationSerializer(data={'geoname_id': 12345, 'capital':'Capital City'})
@@ -144,6 +150,8 @@ class GeoLocationViewSetTests(APITestCase):
 @tag('geolocation-add-action')
 class GeoLocationAddActionTests(APITestCase):
     class IPStackValidResponseMock:
+        status_code = 200
+
         def __init__(self, *args, **kwargs) -> None:
             pass
 
@@ -169,6 +177,8 @@ class GeoLocationAddActionTests(APITestCase):
             }
     
     class IPStackInvalidResponseMock:
+        status_code = 200
+
         def __init__(self, *args, **kwargs) -> None:
             pass
 
@@ -206,6 +216,10 @@ class GeoLocationAddActionTests(APITestCase):
             
 
     def setUp(self) -> None:
+        geoip2_cache.clear()
+        ipstack_cache.clear()
+        ipstack_client.breaker.record_success()
+        ipstack_client.bulk_supported = True
         self.rf_client = APIRequestFactory(enforce_csrf_checks=True)
         User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
         response = self.client.post(
@@ -235,24 +249,76 @@ class GeoLocationAddActionTests(APITestCase):
     def test_add_valid_ip_get_parameter_positive(self):
         ip_addr = '134.201.250.155'
         view = GeoLocationViewSet.as_view({'get': 'add'})
-        with mock.patch('requests.get', mock.Mock(wraps=self.IPStackValidResponseMock)) as req_mock:
+        with mock.patch('requests.Session.get', mock.Mock(wraps=self.IPStackValidResponseMock)) as req_mock:
             request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip={ip_addr}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
             response = view(request)
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
             self.assertDictContainsSubset({'ip': ip_addr}, response.data)
             self.assertEqual(GeoLocation.objects.count(), 1)
-            req_mock.assert_called_once_with(IPSTACK_URL + ip_addr, params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]})
+            req_mock.assert_called_once_with(IPSTACK_URL + ip_addr, params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]}, timeout=ipstack_client.timeout)
     
     def test_add_valid_ip_get_parameter_ipstack_api_error_positive(self):
         ip_addr = '134.201.250.155'
         view = GeoLocationViewSet.as_view({'get': 'add'})
-        with mock.patch('requests.get', mock.Mock(wraps=self.IPStackInvalidResponseMock)) as req_mock:
+        with mock.patch('requests.Session.get', mock.Mock(wraps=self.IPStackInvalidResponseMock)) as req_mock:
             request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip={ip_addr}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
             response = view(request)
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
             self.assertDictContainsSubset({'ip': ip_addr}, response.data)
             self.assertEqual(GeoLocation.objects.count(), 1)
-            req_mock.assert_called_once_with(IPSTACK_URL + ip_addr, params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]})
+            req_mock.assert_called_once_with(IPSTACK_URL + ip_addr, params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]}, timeout=ipstack_client.timeout)
+
+    def test_add_same_ip_twice_refreshes_geolocation(self):
+        ip_addr = '134.201.250.155'
+        view = GeoLocationViewSet.as_view({'get': 'add'})
+        with mock.patch('requests.Session.get', mock.Mock(wraps=self.IPStackValidResponseMock)):
+            request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip={ip_addr}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            first_response = view(request)
+            self.assertEqual(first_response.status_code, status.HTTP_201_CREATED)
+
+            request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip={ip_addr}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            second_response = view(request)
+            self.assertEqual(second_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(second_response.data['id'], first_response.data['id'])
+            self.assertEqual(GeoLocation.objects.count(), 1)
+            self.assertEqual(Location.objects.count(), 1)
+
+    def test_add_ip_from_cached_network_positive(self):
+        view = GeoLocationViewSet.as_view({'get': 'add'})
+        with mock.patch('requests.Session.get', mock.Mock(wraps=self.IPStackValidResponseMock)) as req_mock:
+            request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip=134.201.250.155', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            response = view(request)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+            request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip=134.201.250.17', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            response = view(request)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertDictContainsSubset({'ip': '134.201.250.17'}, response.data)
+            self.assertEqual(GeoLocation.objects.count(), 2)
+            req_mock.assert_called_once()
+        self.assertEqual(ipstack_cache.stats()['hits'], 1)
+
+    def test_add_valid_ip_get_parameter_ipstack_unavailable_positive(self):
+        ip_addr = '134.201.250.155'
+        view = GeoLocationViewSet.as_view({'get': 'add'})
+        with mock.patch('requests.Session.get', mock.Mock(side_effect=requests.ConnectionError)) as req_mock, \
+                mock.patch('geolocations.ipstack.time.sleep'):
+            request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip={ip_addr}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            response = view(request)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertDictContainsSubset({'ip': ip_addr}, response.data)
+            self.assertEqual(req_mock.call_count, ipstack_client.retries + 1)
+
+    def test_add_valid_ip_get_parameter_ipstack_quota_exhausted_positive(self):
+        ip_addr = '134.201.250.155'
+        view = GeoLocationViewSet.as_view({'get': 'add'})
+        with mock.patch('requests.Session.get') as req_mock, \
+                mock.patch.object(ipstack_quota, 'acquire', return_value=False):
+            request = self.rf_client.get(f'{reverse("api:geolocations-add")}?ip={ip_addr}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            response = view(request)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertDictContainsSubset({'ip': ip_addr}, response.data)
+            req_mock.assert_not_called()
 
     def test_add_valid_url_get_parameter_positive(self):
         url = 'wp.pl'
@@ -270,3 +336,139 @@ class GeoLocationAddActionTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(str(response.data[0]), 'Name or service not known')
         self.assertEqual(str(response.data[0].code), 'invalid')
+
+
+@tag('geolocation-bulk-add-action')
+class GeoLocationBulkAddActionTests(APITestCase):
+    class IPStackResponseMock:
+        status_code = 200
+
+        def __init__(self, url, *args, **kwargs) -> None:
+            self.query = url.rsplit('/', 1)[-1]
+
+        def _entry(self, ip: str) -> dict:
+            return {
+                'ip': ip, 'type': 'ipv4', 'continent_code': 'NA',
+                'continent_name': 'North America', 'country_code': 'US',
+                'country_name': 'United States', 'region_code': 'CA', 'region_name': 'California',
+                'city': 'Los Angeles', 'zip': '90012',
+                'latitude': 34.0655517578125, 'longitude': -118.24053955078125,
+                'location': {
+                    'geoname_id': 5368361, 'capital': 'Washington D.C.',
+                    'languages': [{'code': 'en', 'name': 'English', 'native': 'English'}],
+                    'is_eu': False
+                }
+            }
+
+        def json(self):
+            entries = [self._entry(ip) for ip in self.query.split(',')]
+            return entries if len(entries) > 1 else entries[0]
+
+    def setUp(self) -> None:
+        geoip2_cache.clear()
+        ipstack_cache.clear()
+        ipstack_client.breaker.record_success()
+        self.rf_client = APIRequestFactory(enforce_csrf_checks=True)
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.token = response.data["access"]
+        self.view = GeoLocationViewSet.as_view({'post': 'bulk_add'})
+
+    def _post(self, payload: dict):
+        request = self.rf_client.post(reverse('api:geolocations-bulk-add'), payload, HTTP_AUTHORIZATION=f'Bearer {self.token}', format='json')
+        return self.view(request)
+
+    def test_bulk_add_ips_positive(self):
+        ips = ['134.201.250.155', '134.201.251.17', '134.201.252.1']
+        with mock.patch('requests.Session.get', mock.Mock(wraps=self.IPStackResponseMock)) as req_mock:
+            response = self._post({'ips': ips})
+            req_mock.assert_called_once_with(IPSTACK_URL + ','.join(ips), params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]}, timeout=ipstack_client.timeout)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['errors'], {})
+        self.assertEqual({geolocation['ip'] for geolocation in response.data['results']}, set(ips))
+        self.assertEqual(GeoLocation.objects.count(), 3)
+        self.assertEqual(Location.objects.count(), 3)
+        self.assertEqual(Language.objects.count(), 1)
+        for location in Location.objects.all():
+            self.assertEqual(location.languages.count(), 1)
+
+    def test_bulk_add_existing_ips_refreshed(self):
+        with mock.patch('requests.Session.get', mock.Mock(wraps=self.IPStackResponseMock)):
+            self._post({'ips': ['134.201.250.155']})
+            response = self._post({'ips': ['134.201.250.155']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(GeoLocation.objects.count(), 1)
+        self.assertEqual(Location.objects.count(), 1)
+
+    def test_bulk_add_invalid_url_reported(self):
+        response = self._post({'urls': ['wesgeryhr.rgtrt']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(str(response.data['errors']['wesgeryhr.rgtrt'][0]), 'Name or service not known')
+
+    def test_bulk_add_private_ip_reported(self):
+        def city_with_network(ip):
+            if ip == '10.0.0.1':
+                raise AddressNotFoundError('The address 10.0.0.1 is not in the database.')
+            return {
+                'city': 'Los Angeles', 'continent_code': 'NA', 'continent_name': 'North America',
+                'country_code': 'US', 'country_name': 'United States', 'is_in_european_union': False,
+                'latitude': 34.0655, 'longitude': -118.2405, 'postal_code': '90012', 'region': 'CA',
+            }, ipaddress.ip_network(f'{ip}/32')
+
+        ips = ['134.201.250.155', '10.0.0.1', '134.201.251.17']
+        with mock.patch('requests.Session.get', side_effect=requests.ConnectionError), \
+                mock.patch('geolocations.views.get_geoip2') as get_geoip2_mock:
+            get_geoip2_mock.return_value.city_with_network.side_effect = city_with_network
+            response = self._post({'ips': ips})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(list(response.data['errors']), ['10.0.0.1'])
+        self.assertEqual({geolocation['ip'] for geolocation in response.data['results']}, {'134.201.250.155', '134.201.251.17'})
+
+    def test_bulk_add_no_addresses_negative(self):
+        response = self._post({})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data['non_field_errors'][0]), "'ips' or 'urls' is required.")
+
+    def test_bulk_add_too_many_addresses_negative(self):
+        with self.settings(GEOLOCATION_BULK_MAX_ITEMS=2):
+            response = self._post({'ips': ['1.1.1.1', '2.2.2.2', '3.3.3.3']})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@tag('geolocation-metrics-action')
+class GeoLocationMetricsActionTests(APITestCase):
+    def setUp(self) -> None:
+        geoip2_cache.clear()
+        ipstack_cache.clear()
+        ipstack_client.breaker.record_success()
+        self.rf_client = APIRequestFactory(enforce_csrf_checks=True)
+        User.objects.create_superuser(username='test_user', email='test_user@test.com', password='test_pass')
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            json.dumps({"username": "test_user", "password": "test_pass"}),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.token = response.data["access"]
+
+    def test_metrics_positive(self):
+        view = GeoLocationViewSet.as_view({'get': 'metrics'})
+        usage = {'month': '2022-09', 'monthly_limit': 100, 'rate': None, 'burst': 10, 'used': 40, 'remaining': 60, 'exhausted': False}
+        with mock.patch.object(ipstack_quota, 'usage', return_value=usage):
+            request = self.rf_client.get(reverse('api:geolocations-metrics'), HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertDictEqual(response.data['ipstack'], {'quota': usage, 'circuit': 'closed'})
+        self.assertDictEqual(response.data['lookup_cache']['ipstack'], ipstack_cache.stats())
+
+    def test_metrics_unauthenticated_negative(self):
+        view = GeoLocationViewSet.as_view({'get': 'metrics'})
+        request = self.rf_client.get(reverse('api:geolocations-metrics'))
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
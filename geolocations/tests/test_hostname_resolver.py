@@ -0,0 +1,97 @@
+import socket
+from unittest import mock
+
+import dns.exception
+import dns.resolver
+
+from django.test import SimpleTestCase, tag
+
+from geolocations.resolver import HostnameNotResolved, HostnameResolver
+
+
+def answer(address: str, ttl: int) -> mock.Mock:
+    rrset = mock.Mock(ttl=ttl)
+    result = mock.MagicMock(rrset=rrset)
+    result.__getitem__.return_value = mock.Mock(address=address)
+    return result
+
+
+@tag('hostname-resolver')
+class HostnameResolverTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.resolver = HostnameResolver(max_entries=2, min_ttl=30, max_ttl=3600, negative_ttl=60, lifetime=2.0)
+        self.resolver._resolver = mock.Mock()
+        self.resolver._async_resolver = mock.Mock()
+        getaddrinfo_patcher = mock.patch('geolocations.resolver.socket.getaddrinfo', side_effect=socket.gaierror(socket.EAI_NONAME, 'Name or service not known'))
+        self.getaddrinfo = getaddrinfo_patcher.start()
+        self.addCleanup(getaddrinfo_patcher.stop)
+
+    def test_resolve_cached_for_record_ttl(self):
+        self.resolver.resolver.resolve.return_value = answer('212.77.98.9', 300)
+        with mock.patch('geolocations.resolver.time.monotonic', return_value=1000):
+            self.assertEqual(self.resolver.resolve('WP.pl.'), '212.77.98.9')
+            self.assertEqual(self.resolver.resolve('wp.pl'), '212.77.98.9')
+        self.resolver.resolver.resolve.assert_called_once_with('wp.pl', 'A', lifetime=2.0)
+
+        with mock.patch('geolocations.resolver.time.monotonic', return_value=1301):
+            self.resolver.resolve('wp.pl')
+        self.assertEqual(self.resolver.resolver.resolve.call_count, 2)
+
+    def test_short_ttl_raised_to_minimum(self):
+        self.resolver.resolver.resolve.return_value = answer('212.77.98.9', 0)
+        with mock.patch('geolocations.resolver.time.monotonic', return_value=1000):
+            self.resolver.resolve('wp.pl')
+        with mock.patch('geolocations.resolver.time.monotonic', return_value=1029):
+            self.resolver.resolve('wp.pl')
+        self.resolver.resolver.resolve.assert_called_once()
+
+    def test_ipv6_only_hostname(self):
+        self.resolver.resolver.resolve.side_effect = [dns.resolver.NoAnswer(), answer('2001:db8::1', 300)]
+        self.assertEqual(self.resolver.resolve('ipv6.example.com'), '2001:db8::1')
+        self.assertEqual(self.resolver.resolver.resolve.call_args.args[:2], ('ipv6.example.com', 'AAAA'))
+
+    def test_nonexistent_hostname_cached(self):
+        self.resolver.resolver.resolve.side_effect = dns.resolver.NXDOMAIN()
+        for _ in range(2):
+            with self.assertRaisesMessage(HostnameNotResolved, 'Name or service not known'):
+                self.resolver.resolve('wesgeryhr.rgtrt')
+        self.resolver.resolver.resolve.assert_called_once()
+
+    def test_hosts_file_name(self):
+        self.resolver.resolver.resolve.side_effect = dns.resolver.NXDOMAIN()
+        self.getaddrinfo.side_effect = None
+        self.getaddrinfo.return_value = [
+            (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('::1', 0, 0, 0)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 0)),
+        ]
+        for _ in range(2):
+            self.assertEqual(self.resolver.resolve('localhost'), '127.0.0.1')
+        self.resolver.resolver.resolve.assert_called_once_with('localhost', 'A', lifetime=2.0)
+        self.getaddrinfo.assert_called_once_with('localhost', None, type=socket.SOCK_STREAM)
+
+    def test_timeout_not_cached(self):
+        self.resolver.resolver.resolve.side_effect = dns.exception.Timeout()
+        for _ in range(2):
+            with self.assertRaisesMessage(HostnameNotResolved, 'Temporary failure in name resolution'):
+                self.resolver.resolve('wp.pl')
+        self.assertEqual(self.resolver.resolver.resolve.call_count, 2)
+
+    def test_least_recently_used_entry_evicted(self):
+        self.resolver.resolver.resolve.return_value = answer('212.77.98.9', 300)
+        for hostname in ('a.pl', 'b.pl', 'a.pl', 'c.pl', 'a.pl', 'b.pl'):
+            self.resolver.resolve(hostname)
+        self.assertEqual(self.resolver.resolver.resolve.call_count, 4)
+
+    def test_resolve_many(self):
+        async def resolve(hostname, rdtype, lifetime):
+            if hostname == 'wesgeryhr.rgtrt':
+                raise dns.resolver.NXDOMAIN()
+            return answer('212.77.98.9', 300)
+
+        self.resolver.async_resolver.resolve.side_effect = resolve
+        results = self.resolver.resolve_many(['wp.pl', 'wesgeryhr.rgtrt', 'wp.pl'])
+        self.assertEqual(results['wp.pl'], '212.77.98.9')
+        self.assertIsInstance(results['wesgeryhr.rgtrt'], HostnameNotResolved)
+        self.assertEqual(self.resolver.async_resolver.resolve.call_count, 2)
+        self.assertEqual(self.resolver.resolve('wp.pl'), '212.77.98.9')
+        self.resolver.resolver.resolve.assert_not_called()
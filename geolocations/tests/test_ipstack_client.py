@@ -0,0 +1,380 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase, tag
+
+import requests
+
+from geolocations.ipstack import (
+    AsyncIPStackClient,
+    CircuitBreaker,
+    IPStackBatcher,
+    IPStackClient,
+    IPStackQuotaExhausted,
+    IPStackUnavailable,
+)
+
+
+class IPStackStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Responses served in order, the last one is repeated.
+    responses: list[tuple[int, dict, float]] = []
+    requests: list[str] = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        index = min(len(self.requests), len(self.responses)) - 1
+        status_code, payload, delay = self.responses[index]
+        time.sleep(delay)
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            # The client gave up waiting (read timeout tests).
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@tag('ipstack-client')
+class IPStackClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), IPStackStubHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        IPStackStubHandler.requests = []
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.client = IPStackClient(
+            f'http://127.0.0.1:{self.server.server_port}/',
+            connect_timeout=0.5,
+            read_timeout=0.2,
+            retries=2,
+            backoff=0,
+            pool_maxsize=4,
+            breaker=self.breaker,
+        )
+        env_patcher = mock.patch.dict('os.environ', {'IPSTACK_ACCESS_KEY': 'test-key'})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+    def test_get_positive(self):
+        IPStackStubHandler.responses = [(200, {'ip': '134.201.250.155'}, 0)]
+        self.assertDictEqual(self.client.get('134.201.250.155'), {'ip': '134.201.250.155'})
+        self.assertEqual(IPStackStubHandler.requests, ['/134.201.250.155?access_key=test-key'])
+
+    def test_exhausted_quota_skips_request(self):
+        self.client.quota = mock.Mock()
+        self.client.quota.acquire.return_value = False
+        with self.assertRaises(IPStackQuotaExhausted):
+            self.client.get('134.201.250.155')
+        self.assertEqual(IPStackStubHandler.requests, [])
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_open_circuit_does_not_use_quota(self):
+        self.client.quota = mock.Mock()
+        self.breaker.failure_threshold = 1
+        self.breaker.record_failure()
+        with self.assertRaises(IPStackUnavailable):
+            self.client.get('134.201.250.155')
+        self.client.quota.acquire.assert_not_called()
+
+    def test_rejected_probe_does_not_use_quota(self):
+        self.client.quota = mock.Mock()
+        self.breaker.failure_threshold = 1
+        self.breaker.record_failure()
+        with mock.patch('geolocations.ipstack.time.monotonic', return_value=time.monotonic() + 61):
+            # Another request is already probing the half-open circuit.
+            self.assertTrue(self.breaker.allow_request())
+            with self.assertRaises(IPStackUnavailable):
+                self.client.get('134.201.250.155')
+        self.client.quota.acquire.assert_not_called()
+
+    def test_exhausted_quota_releases_probe(self):
+        self.client.quota = mock.Mock()
+        self.client.quota.acquire.return_value = False
+        self.breaker.failure_threshold = 1
+        self.breaker.record_failure()
+        with mock.patch('geolocations.ipstack.time.monotonic', return_value=time.monotonic() + 61):
+            with self.assertRaises(IPStackQuotaExhausted):
+                self.client.get('134.201.250.155')
+            self.assertTrue(self.breaker.allow_request())
+
+    def test_usage_limit_reached_marks_quota_exhausted(self):
+        error = {'success': False, 'error': {'code': 104, 'type': 'usage_limit_reached'}}
+        IPStackStubHandler.responses = [(200, error, 0)]
+        self.client.quota = mock.Mock()
+        self.client.quota.acquire.return_value = True
+        self.assertDictEqual(self.client.get('134.201.250.155'), error)
+        self.client.quota.acquire.assert_called_once_with(1)
+        self.client.quota.mark_exhausted.assert_called_once_with()
+
+    def test_connection_reused(self):
+        IPStackStubHandler.responses = [(200, {'ip': '134.201.250.155'}, 0)]
+        with mock.patch('urllib3.connectionpool.HTTPConnectionPool._new_conn', autospec=True,
+                        side_effect=lambda pool: pool.ConnectionCls(host=pool.host, port=pool.port)) as new_conn_mock:
+            for _ in range(3):
+                self.client.get('134.201.250.155')
+            new_conn_mock.assert_called_once()
+
+    def test_server_error_retried(self):
+        IPStackStubHandler.responses = [(503, {}, 0), (200, {'ip': '134.201.250.155'}, 0)]
+        self.assertDictEqual(self.client.get('134.201.250.155'), {'ip': '134.201.250.155'})
+        self.assertEqual(len(IPStackStubHandler.requests), 2)
+
+    def test_read_timeout_raises_unavailable(self):
+        IPStackStubHandler.responses = [(200, {}, 0.5)]
+        with self.assertRaises(IPStackUnavailable):
+            self.client.get('134.201.250.155')
+        self.assertEqual(len(IPStackStubHandler.requests), 3)
+
+    def test_circuit_opens_after_failures(self):
+        IPStackStubHandler.responses = [(500, {}, 0)]
+        for _ in range(2):
+            with self.assertRaises(IPStackUnavailable):
+                self.client.get('134.201.250.155')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        IPStackStubHandler.requests = []
+        with self.assertRaisesMessage(IPStackUnavailable, 'ipstack circuit is open.'):
+            self.client.get('134.201.250.155')
+        self.assertEqual(IPStackStubHandler.requests, [])
+
+    def test_circuit_closes_after_successful_probe(self):
+        IPStackStubHandler.responses = [(500, {}, 0)]
+        for _ in range(2):
+            with self.assertRaises(IPStackUnavailable):
+                self.client.get('134.201.250.155')
+
+        IPStackStubHandler.responses = [(200, {'ip': '134.201.250.155'}, 0)]
+        IPStackStubHandler.requests = []
+        with mock.patch('geolocations.ipstack.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+            self.client.get('134.201.250.155')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_other_request_errors_raise_unavailable(self):
+        with mock.patch.object(self.client.session, 'get', side_effect=requests.TooManyRedirects('redirected')):
+            with self.assertRaises(IPStackUnavailable):
+                self.client.get('134.201.250.155')
+        self.assertEqual(self.breaker._failures, 1)
+
+    def test_unexpected_error_during_probe_reopens_circuit(self):
+        self.breaker.failure_threshold = 1
+        self.breaker.record_failure()
+        with mock.patch('geolocations.ipstack.time.monotonic', return_value=time.monotonic() + 61), \
+                mock.patch.dict('os.environ', clear=True):
+            with self.assertRaises(KeyError):
+                self.client.get('134.201.250.155')
+            self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+
+@tag('circuit-breaker')
+class CircuitBreakerTests(SimpleTestCase):
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+        with mock.patch('geolocations.ipstack.time.monotonic', return_value=time.monotonic() + 11):
+            self.assertTrue(breaker.allow_request())
+            self.assertFalse(breaker.allow_request())
+
+    def test_failed_probe_reopens_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+        with mock.patch('geolocations.ipstack.time.monotonic', return_value=time.monotonic() + 11):
+            breaker.allow_request()
+            breaker.record_failure()
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+@tag('ipstack-bulk')
+class IPStackBulkLookupTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.client = IPStackClient(
+            'http://api.ipstack.test/', connect_timeout=0.5, read_timeout=0.5, retries=0, backoff=0,
+            pool_maxsize=1, breaker=CircuitBreaker(failure_threshold=5, reset_timeout=60), bulk_size=2,
+        )
+
+    def test_bulk_get_splits_response_per_ip(self):
+        responses = [
+            [{'ip': '1.1.1.1', 'country_code': 'AU'}, {'ip': '2001:db8::1', 'country_code': 'US'}],
+            {'ip': '8.8.8.8', 'country_code': 'US'},
+        ]
+        with mock.patch.object(IPStackClient, '_request', side_effect=responses) as request_mock:
+            results = self.client.bulk_get(['1.1.1.1', '2001:DB8:0::1', '8.8.8.8'])
+        self.assertEqual(request_mock.call_args_list, [mock.call('1.1.1.1,2001:DB8:0::1', calls=2), mock.call('8.8.8.8')])
+        self.assertEqual(results['1.1.1.1']['country_code'], 'AU')
+        self.assertEqual(results['2001:DB8:0::1']['country_code'], 'US')
+        self.assertEqual(results['8.8.8.8']['country_code'], 'US')
+
+    def test_bulk_get_missing_entry_is_an_error(self):
+        with mock.patch.object(IPStackClient, '_request', return_value=[{'ip': '1.1.1.1'}]):
+            results = self.client.bulk_get(['1.1.1.1', '1.0.0.1'])
+        self.assertDictEqual(results['1.0.0.1'], {'success': False})
+
+    def test_bulk_get_failed_call_applies_to_all_ips(self):
+        error = {'success': False, 'error': {'code': 101, 'type': 'invalid_access_key'}}
+        with mock.patch.object(IPStackClient, '_request', return_value=error):
+            results = self.client.bulk_get(['1.1.1.1', '1.0.0.1'])
+        self.assertDictEqual(results, {'1.1.1.1': error, '1.0.0.1': error})
+
+    def test_bulk_get_single_entry_response(self):
+        with mock.patch.object(IPStackClient, '_request', return_value={'ip': '1.1.1.1', 'country_code': 'AU'}):
+            results = self.client.bulk_get(['1.1.1.1', '1.0.0.1'])
+        self.assertEqual(results['1.1.1.1']['country_code'], 'AU')
+        self.assertDictEqual(results['1.0.0.1'], {'success': False})
+
+    def test_bulk_get_falls_back_to_single_lookups_without_bulk_plan(self):
+        error = {'success': False, 'error': {'code': 303, 'type': 'batch_not_supported_on_plan'}}
+        responses = [error, {'ip': '1.1.1.1'}, {'ip': '1.0.0.1'}, {'ip': '8.8.8.8'}, {'ip': '8.8.4.4'}]
+        with mock.patch.object(IPStackClient, '_request', side_effect=responses) as request_mock:
+            results = self.client.bulk_get(['1.1.1.1', '1.0.0.1'])
+            self.assertDictEqual(results, {'1.1.1.1': {'ip': '1.1.1.1'}, '1.0.0.1': {'ip': '1.0.0.1'}})
+            self.assertFalse(self.client.bulk_supported)
+
+            # Later batches skip the bulk call.
+            results = self.client.bulk_get(['8.8.8.8', '8.8.4.4'])
+        self.assertDictEqual(results, {'8.8.8.8': {'ip': '8.8.8.8'}, '8.8.4.4': {'ip': '8.8.4.4'}})
+        self.assertEqual(request_mock.call_args_list[3:], [mock.call('8.8.8.8'), mock.call('8.8.4.4')])
+
+
+@tag('ipstack-batcher')
+class IPStackBatcherTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.client = mock.Mock()
+        self.client.bulk_get.side_effect = lambda ips: {ip: {'ip': ip} for ip in ips}
+
+        def get(ip: str) -> dict:
+            # Lookups made meanwhile are batched.
+            time.sleep(0.2)
+            return {'ip': ip}
+
+        self.client.get.side_effect = get
+
+    def _lookup_concurrently(self, batcher: IPStackBatcher, ips: list[str]) -> dict:
+        results = {}
+
+        def lookup(ip: str) -> None:
+            try:
+                results[ip] = batcher.lookup(ip)
+            except Exception as exc:
+                results[ip] = exc
+
+        threads = [threading.Thread(target=lookup, args=(ip,)) for ip in ips]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_lone_lookup_sent_at_once(self):
+        batcher = IPStackBatcher(self.client, max_batch=50, max_delay=30)
+        self.assertDictEqual(batcher.lookup('10.0.0.1'), {'ip': '10.0.0.1'})
+        self.client.bulk_get.assert_not_called()
+
+    def test_concurrent_lookups_sent_as_one_bulk_call(self):
+        batcher = IPStackBatcher(self.client, max_batch=50, max_delay=0.5)
+        ips = [f'10.0.0.{i}' for i in range(10)]
+        results = self._lookup_concurrently(batcher, ips)
+        self.assertEqual(results, {ip: {'ip': ip} for ip in ips})
+        self.client.get.assert_called_once()
+        self.client.bulk_get.assert_called_once()
+        self.assertEqual(len(self.client.bulk_get.call_args.args[0]), 9)
+
+    def test_full_batch_sent_without_waiting(self):
+        batcher = IPStackBatcher(self.client, max_batch=2, max_delay=30)
+        started = time.monotonic()
+        self._lookup_concurrently(batcher, ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        self.assertLess(time.monotonic() - started, 30)
+
+    def test_failed_bulk_call_raised_for_every_lookup(self):
+        self.client.bulk_get.side_effect = IPStackUnavailable('ipstack circuit is open.')
+        batcher = IPStackBatcher(self.client, max_batch=50, max_delay=0.05)
+        results = self._lookup_concurrently(batcher, ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        errors = [result for result in results.values() if isinstance(result, IPStackUnavailable)]
+        self.assertEqual(len(errors), 2)
+
+    def test_batching_disabled(self):
+        self.client.get.return_value = {'ip': '10.0.0.1'}
+        batcher = IPStackBatcher(self.client, max_batch=50, max_delay=0)
+        self.assertDictEqual(batcher.lookup('10.0.0.1'), {'ip': '10.0.0.1'})
+        self.client.bulk_get.assert_not_called()
+
+
+@tag('ipstack-async-client')
+class AsyncIPStackClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), IPStackStubHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        IPStackStubHandler.requests = []
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.client = AsyncIPStackClient(
+            f'http://127.0.0.1:{self.server.server_port}/',
+            connect_timeout=0.5,
+            read_timeout=0.2,
+            retries=1,
+            backoff=0,
+            pool_maxsize=4,
+            breaker=self.breaker,
+        )
+        env_patcher = mock.patch.dict('os.environ', {'IPSTACK_ACCESS_KEY': 'test-key'})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+    def test_client_closed_with_its_loop(self):
+        async def open_client():
+            return self.client.client
+
+        self.assertTrue(asyncio.run(open_client()).is_closed)
+
+    async def test_aclose(self):
+        client = self.client.client
+        await self.client.aclose()
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(self.client.client, client)
+
+    async def test_get_positive(self):
+        IPStackStubHandler.responses = [(200, {'ip': '134.201.250.155'}, 0)]
+        self.assertDictEqual(await self.client.get('134.201.250.155'), {'ip': '134.201.250.155'})
+        self.assertEqual(IPStackStubHandler.requests, ['/134.201.250.155?access_key=test-key'])
+
+    async def test_server_error_retried(self):
+        IPStackStubHandler.responses = [(502, {}, 0), (200, {'ip': '134.201.250.155'}, 0)]
+        self.assertDictEqual(await self.client.get('134.201.250.155'), {'ip': '134.201.250.155'})
+        self.assertEqual(len(IPStackStubHandler.requests), 2)
+
+    async def test_read_timeout_opens_circuit(self):
+        IPStackStubHandler.responses = [(200, {}, 0.5)]
+        with self.assertRaises(IPStackUnavailable):
+            await self.client.get('134.201.250.155')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
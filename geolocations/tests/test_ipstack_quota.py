@@ -0,0 +1,82 @@
+from unittest import mock
+
+import redis
+
+from django.test import SimpleTestCase, tag
+
+from geolocations.quota import IPStackQuota
+
+
+@tag('ipstack-quota')
+class IPStackQuotaTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.quota = IPStackQuota(monthly_limit=100, rate=5, burst=10, use_redis=True)
+        self.client = mock.Mock()
+        patcher = mock.patch('geolocations.quota.get_redis_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        month_patcher = mock.patch.object(IPStackQuota, '_month', return_value='2022-09')
+        month_patcher.start()
+        self.addCleanup(month_patcher.stop)
+
+    def test_acquire_allowed(self):
+        self.client.eval.return_value = [1, 3]
+        self.assertTrue(self.quota.acquire(3))
+        self.client.eval.assert_called_once_with(
+            mock.ANY,
+            3,
+            'geolocations:ipstack:quota:bucket',
+            'geolocations:ipstack:quota:used:2022-09',
+            'geolocations:ipstack:quota:exhausted:2022-09',
+            5,
+            10,
+            100,
+            3,
+            IPStackQuota.MONTH_TIMEOUT,
+        )
+
+    def test_acquire_denied(self):
+        self.client.eval.return_value = [0, 100]
+        self.assertFalse(self.quota.acquire())
+
+    def test_acquire_without_limits(self):
+        quota = IPStackQuota(monthly_limit=None, rate=None, burst=10, use_redis=True)
+        self.client.eval.return_value = [1, 1]
+        self.assertTrue(quota.acquire())
+        self.assertEqual(self.client.eval.call_args.args[5:8], (0, 10, -1))
+
+    def test_acquire_redis_unavailable_allowed(self):
+        self.client.eval.side_effect = redis.ConnectionError
+        self.assertTrue(self.quota.acquire())
+
+    def test_disabled_quota_does_not_use_redis(self):
+        quota = IPStackQuota(monthly_limit=1, rate=1, burst=1, use_redis=False)
+        self.assertTrue(quota.acquire(5))
+        quota.mark_exhausted()
+        self.assertIsNone(quota.usage()['used'])
+        self.client.eval.assert_not_called()
+        self.client.set.assert_not_called()
+
+    def test_mark_exhausted(self):
+        self.quota.mark_exhausted()
+        self.client.set.assert_called_once_with(
+            'geolocations:ipstack:quota:exhausted:2022-09', 1, ex=IPStackQuota.MONTH_TIMEOUT
+        )
+
+    def test_usage(self):
+        self.client.mget.return_value = [b'40', None]
+        self.assertDictEqual(self.quota.usage(), {
+            'month': '2022-09',
+            'monthly_limit': 100,
+            'rate': 5,
+            'burst': 10,
+            'used': 40,
+            'remaining': 60,
+            'exhausted': False,
+        })
+
+    def test_usage_exhausted(self):
+        self.client.mget.return_value = [b'40', b'1']
+        self.assertTrue(self.quota.usage()['exhausted'])
+        self.client.mget.return_value = [b'100', None]
+        self.assertTrue(self.quota.usage()['exhausted'])
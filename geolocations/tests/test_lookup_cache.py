@@ -0,0 +1,70 @@
+import ipaddress
+from unittest import mock
+
+from django.test import SimpleTestCase, tag
+
+from geolocations.cache import LookupCache
+
+
+@tag('lookup-cache')
+class LookupCacheTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.cache = LookupCache('test', max_entries=2, timeout=60, default_prefixlen={4: 24, 6: 48})
+        self.payload = {'country_code': 'US', 'city': 'Los Angeles'}
+
+    def test_miss_on_empty_cache(self):
+        self.assertIsNone(self.cache.get('134.201.250.155'))
+        self.assertDictEqual(self.cache.stats(), {'entries': 0, 'hits': 0, 'local_hits': 0, 'redis_hits': 0, 'misses': 1})
+
+    def test_hit_for_address_in_default_prefix(self):
+        self.cache.set('134.201.250.155', self.payload)
+        self.assertDictEqual(self.cache.get('134.201.250.1'), self.payload)
+        self.assertIsNone(self.cache.get('134.201.251.1'))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_hit_for_address_in_ipv6_prefix(self):
+        self.cache.set('2001:db8:1::1', self.payload)
+        self.assertDictEqual(self.cache.get('2001:db8:1:ffff::1'), self.payload)
+        self.assertIsNone(self.cache.get('2001:db8:2::1'))
+
+    def test_hit_for_address_in_provider_network(self):
+        self.cache.set('134.201.250.155', self.payload, ipaddress.ip_network('134.201.0.0/16'))
+        self.assertDictEqual(self.cache.get('134.201.1.1'), self.payload)
+
+    def test_returned_payload_is_a_copy(self):
+        self.cache.set('134.201.250.155', self.payload)
+        self.cache.get('134.201.250.155')['city'] = 'Gdańsk'
+        self.assertEqual(self.cache.get('134.201.250.155')['city'], 'Los Angeles')
+
+    def test_entry_expires_after_timeout(self):
+        self.cache.set('134.201.250.155', self.payload)
+        with mock.patch('geolocations.cache.time.time', return_value=10 ** 12):
+            self.assertIsNone(self.cache.get('134.201.250.155'))
+
+    def test_least_recently_used_entry_evicted(self):
+        self.cache.set('10.0.1.1', self.payload)
+        self.cache.set('10.0.2.1', self.payload)
+        self.cache.get('10.0.1.1')
+        self.cache.set('10.0.3.1', self.payload)
+        self.assertIsNotNone(self.cache.get('10.0.1.1'))
+        self.assertIsNone(self.cache.get('10.0.2.1'))
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+    def test_not_an_ip_address_is_not_cached(self):
+        self.cache.set('wp.pl', self.payload)
+        self.assertIsNone(self.cache.get('wp.pl'))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_redis_tier_hit_populates_local_tier(self):
+        redis_cache = LookupCache('test', max_entries=2, timeout=60, default_prefixlen={4: 24, 6: 48}, use_redis=True)
+        client = mock.Mock()
+        client.smembers.return_value = {b'24'}
+        client.mget.return_value = [b'{"expires_at": 99999999999, "payload": {"country_code": "US"}}']
+        with mock.patch('geolocations.cache.get_redis_client', return_value=client):
+            self.assertDictEqual(redis_cache.get('134.201.250.155'), {'country_code': 'US'})
+            client.mget.assert_called_once_with(['geolocations:lookup:test:134.201.250.0/24'])
+            self.assertDictEqual(redis_cache.get('134.201.250.1'), {'country_code': 'US'})
+            client.mget.assert_called_once()
+        self.assertEqual(redis_cache.stats()['redis_hits'], 1)
+        self.assertEqual(redis_cache.stats()['local_hits'], 1)
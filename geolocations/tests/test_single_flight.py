@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from unittest import mock
+
+import redis
+
+from django.test import SimpleTestCase, tag
+
+from geolocations.singleflight import SingleFlight, SingleFlightError
+
+
+@tag('single-flight')
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.flight = SingleFlight('test', lock_timeout=5, wait_timeout=1, result_timeout=5, poll_interval=0.01)
+
+    def test_concurrent_callers_share_one_call(self):
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 42
+
+        leader = threading.Thread(target=lambda: results.append(self.flight.do('ip:1.1.1.1', fn)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(self.flight.do('ip:1.1.1.1', fn))) for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertCountEqual(results, [(42, False), (42, True), (42, True), (42, True)])
+
+    def test_exception_raised_to_every_caller(self):
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def fn():
+            started.set()
+            release.wait(5)
+            raise ValueError('lookup failed')
+
+        def call():
+            try:
+                self.flight.do('ip:1.1.1.1', fn)
+            except ValueError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(errors), 2)
+
+    def test_sequential_calls_not_shared(self):
+        fn = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(self.flight.do('ip:1.1.1.1', fn), (1, False))
+        self.assertEqual(self.flight.do('ip:1.1.1.1', fn), (2, False))
+
+    def test_redis_lock_holder_result_shared(self):
+        flight = SingleFlight('test', lock_timeout=5, wait_timeout=1, result_timeout=5, poll_interval=0.01, use_redis=True)
+        client = mock.Mock()
+        client.set.return_value = None
+        client.get.side_effect = [None, b'{"result": 42}']
+        client.exists.return_value = 1
+        fn = mock.Mock()
+        with mock.patch('geolocations.singleflight.get_redis_client', return_value=client):
+            self.assertEqual(flight.do('ip:1.1.1.1', fn), (42, True))
+        fn.assert_not_called()
+        client.set.assert_called_once_with('geolocations:flight:test:lock:ip:1.1.1.1', mock.ANY, nx=True, px=5000)
+
+    def test_redis_lock_acquired_result_published(self):
+        flight = SingleFlight('test', lock_timeout=5, wait_timeout=1, result_timeout=5, poll_interval=0.01, use_redis=True)
+        client = mock.Mock()
+        client.set.return_value = True
+        with mock.patch('geolocations.singleflight.get_redis_client', return_value=client):
+            self.assertEqual(flight.do('ip:1.1.1.1', lambda: 42), (42, False))
+        client.delete.assert_called_once_with('geolocations:flight:test:result:ip:1.1.1.1')
+        pipeline = client.pipeline.return_value
+        pipeline.set.assert_called_once_with('geolocations:flight:test:result:ip:1.1.1.1', '{"result": 42}', px=5000)
+        pipeline.eval.assert_called_once()
+        pipeline.execute.assert_called_once()
+
+    def test_redis_leader_failure_releases_lock(self):
+        flight = SingleFlight('test', lock_timeout=5, wait_timeout=1, result_timeout=5, poll_interval=0.01, use_redis=True)
+        client = mock.Mock()
+        client.set.return_value = True
+        fn = mock.Mock(side_effect=ValueError('lookup failed'))
+        with mock.patch('geolocations.singleflight.get_redis_client', return_value=client):
+            with self.assertRaises(ValueError):
+                flight.do('ip:1.1.1.1', fn)
+        pipeline = client.pipeline.return_value
+        pipeline.set.assert_called_once_with(
+            'geolocations:flight:test:result:ip:1.1.1.1', '{"error": "ValueError: lookup failed"}', px=5000
+        )
+        pipeline.eval.assert_called_once()
+        pipeline.execute.assert_called_once()
+
+    def test_redis_leader_failure_raised_to_followers(self):
+        flight = SingleFlight('test', lock_timeout=5, wait_timeout=10, result_timeout=5, poll_interval=0.01, use_redis=True)
+        client = mock.Mock()
+        client.set.return_value = None
+        client.get.return_value = b'{"error": "ValueError: lookup failed"}'
+        fn = mock.Mock()
+        with mock.patch('geolocations.singleflight.get_redis_client', return_value=client):
+            with self.assertRaisesMessage(SingleFlightError, 'ValueError: lookup failed'):
+                flight.do('ip:1.1.1.1', fn)
+        fn.assert_not_called()
+
+    def test_redis_unavailable_calls_function(self):
+        flight = SingleFlight('test', lock_timeout=5, wait_timeout=1, result_timeout=5, poll_interval=0.01, use_redis=True)
+        client = mock.Mock()
+        client.set.side_effect = redis.ConnectionError
+        with mock.patch('geolocations.singleflight.get_redis_client', return_value=client):
+            self.assertEqual(flight.do('ip:1.1.1.1', lambda: 42), (42, False))
+
+    async def test_concurrent_async_callers_share_one_call(self):
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 42
+
+        results = await asyncio.gather(*[self.flight.do_async('ip:1.1.1.1', fn) for _ in range(4)])
+        self.assertEqual(len(calls), 1)
+        self.assertCountEqual(results, [(42, False), (42, True), (42, True), (42, True)])
+
+    async def test_async_exception_raised_to_every_caller(self):
+        async def fn():
+            await asyncio.sleep(0.05)
+            raise ValueError('lookup failed')
+
+        results = await asyncio.gather(*[self.flight.do_async('ip:1.1.1.1', fn) for _ in range(2)], return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_redis_async_lock_holder_result_shared(self):
+        flight = SingleFlight('test', lock_timeout=5, wait_timeout=1, result_timeout=5, poll_interval=0.01, use_redis=True)
+        client = mock.Mock()
+        client.set.return_value = None
+        client.get.side_effect = [None, b'{"result": 42}']
+        client.exists.return_value = 1
+        fn = mock.AsyncMock()
+        with mock.patch('geolocations.singleflight.get_redis_client', return_value=client):
+            self.assertEqual(await flight.do_async('ip:1.1.1.1', fn), (42, True))
+        fn.assert_not_awaited()
+        client.set.assert_called_once_with('geolocations:flight:test:lock:ip:1.1.1.1', mock.ANY, nx=True, px=5000)
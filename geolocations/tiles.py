@@ -0,0 +1,71 @@
+"""
+Mapbox Vector Tiles of geo locations, built by PostGIS with ``ST_AsMVT``. Tiles are cached
+under the version of the geo locations data, which the outbox relay bumps after writes.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+import redis
+
+from base.cache import get_cache_version
+from geolocations.models import GeoLocation
+
+logger = logging.getLogger(__name__)
+
+LAYER_NAME = 'geolocations'
+# Attributes of every point, besides its geometry.
+ATTRIBUTE_FIELDS = ('id', 'ip_type', 'country_code', 'city')
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= settings.GEOLOCATION_TILES['MAX_ZOOM'] and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def render_tile(z: int, x: int, y: int) -> bytes:
+    opts = GeoLocation._meta
+    quote_name = connection.ops.quote_name
+    coordinates = quote_name(opts.get_field('coordinates').column)
+    attributes = ', '.join(quote_name(opts.get_field(name).column) for name in ATTRIBUTE_FIELDS)
+    extent = settings.GEOLOCATION_TILES['EXTENT']
+    query = (
+        'WITH bounds AS (SELECT ST_TileEnvelope(%s, %s, %s) AS geom), '
+        'features AS ('
+        f'SELECT ST_AsMVTGeom(ST_Transform({coordinates}, 3857), bounds.geom, %s, %s) AS geom, {attributes} '
+        f'FROM {quote_name(opts.db_table)}, bounds '
+        # Compared in the SRID of the column, so the spatial index serves it.
+        f'WHERE {coordinates} && ST_Transform(bounds.geom, {opts.get_field("coordinates").srid})'
+        ') '
+        'SELECT ST_AsMVT(features.*, %s, %s, %s) FROM features'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(query, [z, x, y, extent, settings.GEOLOCATION_TILES['BUFFER'], LAYER_NAME, extent, 'geom'])
+        tile = cursor.fetchone()[0]
+    return bytes(tile) if tile is not None else b''
+
+
+def _cache_key(version: int, z: int, x: int, y: int) -> str:
+    return f'geolocations:tile:{version}:{z}:{x}:{y}'
+
+
+def get_tile(z: int, x: int, y: int) -> bytes:
+    version = get_cache_version(GeoLocation._meta.label_lower)
+    if version is None:
+        return render_tile(z, x, y)
+
+    cache = caches[settings.GEOLOCATION_TILES['CACHE']]
+    key = _cache_key(version, z, x, y)
+    try:
+        tile = cache.get(key)
+    except redis.RedisError:
+        logger.warning('Tile cache unavailable.', exc_info=True)
+        return render_tile(z, x, y)
+    if tile is None:
+        tile = render_tile(z, x, y)
+        try:
+            cache.set(key, tile, settings.GEOLOCATION_TILES['TIMEOUT'])
+        except redis.RedisError:
+            logger.warning('Tile cache unavailable.', exc_info=True)
+    return tile
@@ -1,52 +1,116 @@
-import os
-import socket
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Awaitable, Callable, Optional
 
-from django.contrib.gis.geoip2 import GeoIP2
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.http import HttpRequest, HttpResponse, QueryDict, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views import View
 
-import requests
+from geoip2.errors import AddressNotFoundError
 
+from rest_framework import exceptions
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView, exception_handler
 
+from geolocations.aggregation import AggregationError, aggregate
+from geolocations.bulk import GeoLocationBulkWriter
+from geolocations.cache import geoip2_cache, ipstack_cache
+from geolocations.export import CONTENT_TYPES, FORMATS as EXPORT_FORMATS, export as export_geolocations
+from geolocations.geoip import get_geoip2
+from geolocations.ipstack import IPStackUnavailable, async_ipstack_client, ipstack_batcher, ipstack_client, ipstack_quota
+from geolocations.resolver import HostnameNotResolved, hostname_resolver
 from geolocations.models import (
     GeoLocation,
+    GeoLocationStatistic,
 )
+from geolocations.singleflight import SingleFlightError, geolocation_flight
+from geolocations.tiles import get_tile, is_valid_tile
 from geolocations.serializers import (
     GeoIP2Serializer,
     GeoIP2WithIPSerializer,
+    GeoLocationAggregateSerializer,
+    GeoLocationBulkAddSerializer,
+    GeoLocationDistanceSerializer,
+    GeoLocationNearestSerializer,
+    GeoLocationReadSerializer,
     GeoLocationSerializer,
+    GeoLocationUpsertSerializer,
+    GeoLocationWithinSerializer,
     IPStackSerializer,
 )
+from base.mixins import CachedResponseMixin
+from base.pagination import OptionalKeysetPagination
 from base.utils import is_ip_address
-from base.tasks import dump_data_base
-
 
-IPSTACK_URL = 'http://api.ipstack.com/'
+logger = logging.getLogger(__name__)
 
 
 class GeoLocationCreateFactory:
     def create(self, data: dict) -> Response:
-        serializer = GeoLocationSerializer(data=data)
+        serializer = GeoLocationUpsertSerializer(data=data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        response_status = status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK
+        return Response(serializer.data, status=response_status)
+
+    def _create_shared(self, key: str, create: Callable[[], Response]) -> Response:
+        """
+        Coalesce concurrent adds of the same address: one caller looks it up and stores it,
+        the others respond with the stored geo location.
+        """
+        responses = []
+
+        def create_pk() -> int:
+            responses.append(create())
+            return responses[0].data['id']
 
-    def _get_geoip2_payload(self, data: str) -> dict:
-        g = GeoIP2()
         try:
-            payload = g.city(data)
+            pk, shared = geolocation_flight.do(key, create_pk)
+        except SingleFlightError:
+            # The add failed in another worker, this one fails (or succeeds) on its own.
+            return create()
+        if not shared:
+            return responses[0]
+        response = self._stored_response(pk)
+        # None when deleted in the meantime.
+        return response if response is not None else create()
+
+    def _stored_response(self, pk: int) -> Optional[Response]:
+        geolocation = GeoLocation.objects.with_location().filter(pk=pk).first()
+        if geolocation is None:
+            return None
+        return Response(GeoLocationSerializer(geolocation).data, status=status.HTTP_200_OK)
+
+    def _get_geoip2_payload(self, data: str, ip: Optional[str] = None) -> dict:
+        ip_addr = is_ip_address(data)
+        try:
+            if ip is None:
+                ip = data if ip_addr else hostname_resolver.resolve(data)
+            payload = geoip2_cache.get(ip)
+            if payload is None:
+                payload, network = get_geoip2().city_with_network(ip)
+                geoip2_cache.set(ip, payload, network)
         except ValidationError as exc:
             raise serializers.ValidationError(detail=exc.message, code=exc.code) from exc
-        except socket.gaierror as exc:
-            raise serializers.ValidationError(detail=exc.strerror, code='invalid')
+        except HostnameNotResolved as exc:
+            raise serializers.ValidationError(detail=str(exc), code='invalid') from exc
+        except (AddressNotFoundError, ValueError) as exc:
+            # Private and reserved addresses aren't in the database, networks aren't addresses.
+            raise serializers.ValidationError(detail=str(exc), code='invalid') from exc
 
-        ip_addr = is_ip_address(data)
         if ip_addr:
             payload.update({'ip':data,'ip_type':ip_addr})
         return payload
@@ -56,46 +120,345 @@ class GeoLocationCreateFactory:
         geoip2_serializer = GeoIP2Serializer(data=payload)
         geoip2_serializer.is_valid(raise_exception=True)
         return self.create(data=geoip2_serializer.validated_data)
-    
-    def _create_from_ipstack(self, ip: str) -> Response:
-        def get_ipstack_payload_and_serializer_class(ip: str) -> dict:
-            r = requests.get(IPSTACK_URL + ip, params={'access_key': os.environ["IPSTACK_ACCESS_KEY"]})
-            payload = r.json()
-            serializer_class = IPStackSerializer
-            if payload.get('success') == 'false':
-                payload = self._get_geoip2_payload(ip)
-                serializer_class = GeoIP2WithIPSerializer
 
-            return payload, serializer_class
+    def _get_ipstack_payload_and_serializer_class(self, ip: str) -> tuple[dict, type[serializers.Serializer]]:
+        payload = ipstack_cache.get(ip)
+        if payload is not None:
+            payload['ip'] = ip
+            return payload, IPStackSerializer
 
-        payload, serializer_class = get_ipstack_payload_and_serializer_class(ip)
+        try:
+            payload = ipstack_batcher.lookup(ip)
+        except IPStackUnavailable:
+            payload = {'success': False}
+        serializer_class = IPStackSerializer
+        if payload.get('success') in (False, 'false'):
+            payload = self._get_geoip2_payload(ip)
+            serializer_class = GeoIP2WithIPSerializer
+        else:
+            ipstack_cache.set(ip, payload)
+
+        return payload, serializer_class
+
+    def _get_geoip2_with_ip_payload_and_serializer_class(self, ip: str) -> tuple[dict, type[serializers.Serializer]]:
+        return self._get_geoip2_payload(ip), GeoIP2WithIPSerializer
+
+    def _get_ipstack_payloads(self, ips: list[str]) -> tuple[dict, list[str]]:
+        """
+        Resolve ``ips`` with as few ipstack bulk calls as possible.
+        Returns the payloads found and the addresses to look up in GeoIP2 instead.
+        """
+        payloads, misses = {}, []
+        for ip in ips:
+            payload = ipstack_cache.get(ip)
+            if payload is not None:
+                payload['ip'] = ip
+                payloads[ip] = (payload, IPStackSerializer)
+            else:
+                misses.append(ip)
+
+        try:
+            fetched = ipstack_client.bulk_get(misses)
+        except IPStackUnavailable:
+            fetched = {}
+
+        fallbacks = []
+        for ip in misses:
+            payload = fetched.get(ip, {'success': False})
+            if payload.get('success') in (False, 'false'):
+                fallbacks.append(ip)
+            else:
+                ipstack_cache.set(ip, payload)
+                payloads[ip] = (payload, IPStackSerializer)
+        return payloads, fallbacks
+
+    def _get_url_payload_and_serializer_class(self, url: str) -> tuple[dict, type[serializers.Serializer]]:
+        return self._get_geoip2_payload(url), GeoIP2Serializer
+
+    def _create_from_ipstack(self, ip: str) -> Response:
+        payload, serializer_class = self._get_ipstack_payload_and_serializer_class(ip)
         ipstack_serializer = serializer_class(data=payload)
         ipstack_serializer.is_valid(raise_exception=True)
         return self.create(data=ipstack_serializer.validated_data)
 
+    def _resolve_many(self, lookups: list[tuple[str, Callable]]) -> tuple[dict, dict]:
+        payloads, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=settings.GEOLOCATION_BULK_MAX_WORKERS) as executor:
+            futures = {executor.submit(get_payload, query): query for query, get_payload in lookups}
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    payloads[query] = future.result()
+                except serializers.ValidationError as exc:
+                    errors[query] = exc.detail
+                except Exception:
+                    # One failed lookup doesn't cost the others their results.
+                    logger.exception('Looking %s up failed.', query)
+                    errors[query] = ['The lookup failed.']
+        return payloads, errors
+
+    def bulk_create(self, ips: list[str], urls: list[str]) -> tuple[list[tuple[GeoLocation, bool]], dict]:
+        payloads, fallbacks = self._get_ipstack_payloads(list(dict.fromkeys(ips)))
+        lookups = [(ip, self._get_geoip2_with_ip_payload_and_serializer_class) for ip in fallbacks]
+        # Hostnames are resolved concurrently up front, their lookups are then served by the resolver's cache.
+        hostname_resolver.resolve_many([url for url in urls if not is_ip_address(url)])
+        lookups += [(url, self._get_url_payload_and_serializer_class) for url in urls]
+        resolved, errors = self._resolve_many(lookups)
+        payloads.update(resolved)
+
+        writer = GeoLocationBulkWriter()
+        for query, (payload, serializer_class) in payloads.items():
+            serializer = serializer_class(data=payload, context={'defer_location': True})
+            try:
+                serializer.is_valid(raise_exception=True)
+                writer.add(serializer.validated_data)
+            except serializers.ValidationError as exc:
+                errors[query] = exc.detail
+        return writer.save(), errors
+
+    def create_geolocations(self, request: Request) -> Response:
+        bulk_serializer = GeoLocationBulkAddSerializer(data=request.data)
+        bulk_serializer.is_valid(raise_exception=True)
+        results, errors = self.bulk_create(**bulk_serializer.validated_data)
+
+        queryset = GeoLocation.objects.with_location().filter(pk__in=[geolocation.pk for geolocation, _ in results])
+        data = GeoLocationSerializer(queryset, many=True).data
+        created = any(created for _, created in results)
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        return Response({'results': data, 'errors': errors}, status=response_status)
+
     def create_geolocation(self, request: Request) -> Response:
         url = request.GET.get('url', None)
         ip = request.GET.get('ip', None)
         if url and ip:
             raise serializers.ValidationError("Both 'url' and 'ip' parameters provided at the same time are not supported.")
         if url:
-            return self._create_from_geoip2(url)
+            return self._create_shared(f'url:{url.lower()}', lambda: self._create_from_geoip2(url))
         elif ip:
-            return self._create_from_ipstack(ip)
+            return self._create_shared(f'ip:{ip}', lambda: self._create_from_ipstack(ip))
         else:
             raise serializers.ValidationError("'url' or 'ip' parameter is required.")
 
 
-class GeoLocationViewSet(viewsets.ModelViewSet):
+class AsyncGeoLocationCreateFactory:
+    """
+    Non-blocking counterpart of ``GeoLocationCreateFactory`` for the ASGI application:
+    ipstack is called with an async HTTP client, GeoIP2 lookups run in the default
+    executor and validation and writes run in Django's thread for synchronous code.
+    Concurrent adds of an address share one lookup, across workers under the keys of
+    the synchronous factory.
+    """
+
+    def __init__(self) -> None:
+        self.factory = GeoLocationCreateFactory()
+
+    async def _get_geoip2_payload(self, data: str) -> dict:
+        ip = None
+        if not is_ip_address(data):
+            try:
+                ip = await hostname_resolver.resolve_async(data)
+            except HostnameNotResolved as exc:
+                raise serializers.ValidationError(detail=str(exc), code='invalid') from exc
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.factory._get_geoip2_payload, data, ip)
+
+    async def _get_ipstack_payload_and_serializer_class(self, ip: str) -> tuple[dict, type[serializers.Serializer]]:
+        payload = await sync_to_async(ipstack_cache.get, thread_sensitive=False)(ip)
+        if payload is not None:
+            payload['ip'] = ip
+            return payload, IPStackSerializer
+
+        try:
+            payload = await async_ipstack_client.get(ip)
+        except IPStackUnavailable:
+            payload = {'success': False}
+        serializer_class = IPStackSerializer
+        if payload.get('success') in (False, 'false'):
+            payload = await self._get_geoip2_payload(ip)
+            serializer_class = GeoIP2WithIPSerializer
+        else:
+            await sync_to_async(ipstack_cache.set, thread_sensitive=False)(ip, payload)
+
+        return payload, serializer_class
+
+    def _create(self, serializer_class: type[serializers.Serializer], payload: dict) -> Response:
+        # Provider serializers store the location while validating.
+        serializer = serializer_class(data=payload)
+        serializer.is_valid(raise_exception=True)
+        return self.factory.create(data=serializer.validated_data)
+
+    async def _create_from_geoip2(self, url: str) -> Response:
+        payload = await self._get_geoip2_payload(url)
+        return await sync_to_async(self._create)(GeoIP2Serializer, payload)
+
+    async def _create_from_ipstack(self, ip: str) -> Response:
+        payload, serializer_class = await self._get_ipstack_payload_and_serializer_class(ip)
+        return await sync_to_async(self._create)(serializer_class, payload)
+
+    async def _create_shared(self, key: str, create: Callable[[], Awaitable[Response]]) -> Response:
+        """``GeoLocationCreateFactory._create_shared`` for coroutines, coalesced under the same keys."""
+        responses = []
+
+        async def create_pk() -> int:
+            responses.append(await create())
+            return responses[0].data['id']
+
+        try:
+            pk, shared = await geolocation_flight.do_async(key, create_pk)
+        except SingleFlightError:
+            return await create()
+        if not shared:
+            return responses[0]
+        response = await sync_to_async(self.factory._stored_response)(pk)
+        return response if response is not None else await create()
+
+    async def create_geolocation(self, query_params: QueryDict) -> Response:
+        url = query_params.get('url', None)
+        ip = query_params.get('ip', None)
+        if url and ip:
+            raise serializers.ValidationError("Both 'url' and 'ip' parameters provided at the same time are not supported.")
+        if url:
+            return await self._create_shared(f'url:{url.lower()}', lambda: self._create_from_geoip2(url))
+        elif ip:
+            return await self._create_shared(f'ip:{ip}', lambda: self._create_from_ipstack(ip))
+        else:
+            raise serializers.ValidationError("'url' or 'ip' parameter is required.")
+
+
+class GeoLocationAsyncAddView(View):
+    """
+    ``GeoLocationViewSet.add`` served natively by the ASGI application, so a worker can wait
+    on many provider calls at once. Authentication and permissions follow the REST_FRAMEWORK settings.
+    """
+
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+
+    def check_permissions(self, request: Request) -> None:
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+    def render(self, response: Response, request: Request) -> Response:
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = JSONRenderer.media_type
+        response.renderer_context = {'view': self, 'request': request, 'response': response}
+        return response.render()
+
+    async def get(self, request: HttpRequest) -> Response:
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        try:
+            await sync_to_async(self.check_permissions)(drf_request)
+            response = await AsyncGeoLocationCreateFactory().create_geolocation(request.GET)
+        except exceptions.APIException as exc:
+            response = exception_handler(exc, {'view': self, 'request': drf_request})
+        return self.render(response, drf_request)
+
+
+class GeoLocationTileView(APIView):
+    def get(self, request, z: int, x: int, y: int) -> HttpResponse:
+        if not is_valid_tile(z, x, y):
+            raise exceptions.NotFound('Tile out of range.')
+        response = HttpResponse(get_tile(z, x, y), content_type='application/vnd.mapbox-vector-tile')
+        patch_cache_control(response, private=True, max_age=settings.GEOLOCATION_TILES['MAX_AGE'])
+        return response
+
+
+class GeoLocationViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = GeoLocation.objects.all()
     serializer_class = GeoLocationSerializer
-    
-    def destroy(self, request, *args, **kwargs):
-        response = super().destroy(request, *args, **kwargs)
-        transaction.on_commit(lambda: dump_data_base.delay())
-        return response
+    etag_models = ('geolocations.geolocation', 'locations.location', 'languages.language')
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return GeoLocation.objects.with_location()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve'):
+            return GeoLocationReadSerializer
+        return super().get_serializer_class()
 
     @action(detail=False, methods=['get'])
     def add(self, request) -> Response:
         geoloc_create_factory = GeoLocationCreateFactory()
         return geoloc_create_factory.create_geolocation(request)
+
+    @action(detail=False, methods=['post'], url_path='bulk-add')
+    def bulk_add(self, request) -> Response:
+        geoloc_create_factory = GeoLocationCreateFactory()
+        return geoloc_create_factory.create_geolocations(request)
+
+    def check_distance_pagination(self, request: Request) -> None:
+        # Keyset pages follow (created_at, id) and would reorder rows sorted by distance.
+        if isinstance(self.paginator, OptionalKeysetPagination) and self.paginator.is_keyset_requested(request):
+            raise exceptions.ValidationError(
+                {'pagination': 'Results ordered by distance are not available with cursor pagination.'}
+            )
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request) -> Response:
+        self.check_distance_pagination(request)
+        query = GeoLocationNearestSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        point = Point(query.validated_data['longitude'], query.validated_data['latitude'], srid=4326)
+        queryset = GeoLocation.objects.with_location().filter(**query.filters).nearest(point, query.validated_data['k'])
+        serializer = GeoLocationDistanceSerializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def within(self, request) -> Response:
+        self.check_distance_pagination(request)
+        query = GeoLocationWithinSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        point = Point(query.validated_data['longitude'], query.validated_data['latitude'], srid=4326)
+        queryset = (
+            GeoLocation.objects.with_location()
+            .filter(**query.filters)
+            .within(point, query.validated_data['radius'])
+            .order_by('distance', 'id')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = GeoLocationDistanceSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def aggregate(self, request) -> Response:
+        query = GeoLocationAggregateSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        try:
+            data = aggregate(query.validated_data['bbox'], query.validated_data['zoom'], query.validated_data['mode'])
+        except AggregationError as exc:
+            raise exceptions.ValidationError({'bbox': str(exc)})
+        response = Response(data)
+        patch_cache_control(response, private=True, max_age=settings.GEOLOCATION_AGGREGATION['MAX_AGE'])
+        return response
+
+    @action(detail=False, methods=['get'])
+    def export(self, request) -> StreamingHttpResponse:
+        # ?format is taken by DRF for renderers.
+        output = request.query_params.get('output', 'geojson')
+        if output not in EXPORT_FORMATS:
+            raise exceptions.ValidationError({'output': f'Expected one of {", ".join(EXPORT_FORMATS)}.'})
+        response = StreamingHttpResponse(export_geolocations(output), content_type=CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="geolocations.{output}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def statistics(self, request) -> Response:
+        return Response(GeoLocationStatistic.objects.summary())
+
+    @action(detail=False, methods=['get'])
+    def metrics(self, request) -> Response:
+        return Response({
+            'ipstack': {
+                'quota': ipstack_quota.usage(),
+                'circuit': ipstack_client.breaker.state,
+            },
+            'lookup_cache': {
+                'geoip2': geoip2_cache.stats(),
+                'ipstack': ipstack_cache.stats(),
+            },
+        })
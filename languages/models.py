@@ -1,6 +1,33 @@
 from django.contrib.gis.db import models
+from django.db import transaction
+from django.db.models import Q
 
-from base.models import BaseModel
+from base import outbox
+from base.models import BaseModel, OutboxOperations
+
+
+class LanguageManager(models.Manager):
+    def get_or_create_many(self, languages: list[dict]) -> list['Language']:
+        # Languages are shared between locations, reuse the ones already stored.
+        if not languages:
+            return []
+        lookup = Q()
+        for language in languages:
+            lookup |= Q(code=language['code'], name=language['name'], native=language['native'])
+        stored = list(self.filter(lookup))
+        keys = {(language.code, language.name, language.native) for language in stored}
+        missing = [
+            language for language in languages
+            if (language['code'], language['name'], language['native']) not in keys
+        ]
+        if not missing:
+            return stored
+
+        with transaction.atomic(using=self.db):
+            self.bulk_create([self.model(**language) for language in missing], ignore_conflicts=True)
+            created = list(self.filter(lookup).exclude(pk__in=[language.pk for language in stored]))
+            outbox.record(created, OutboxOperations.CREATE, self.db)
+        return stored + created
 
 
 class Language(BaseModel):
@@ -8,8 +35,13 @@ class Language(BaseModel):
     name = models.CharField(max_length=25)
     native = models.CharField(max_length=25)
 
+    objects = LanguageManager()
+
     class Meta:
         unique_together = ['code', 'name', 'native']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='language_created_at_id_idx'),
+        ]
 
     def __repr__(self) -> str:
         return f'{self.name}-{self.native}'
@@ -1,9 +1,29 @@
-from base.serializers import BaseModelSerializer
+from rest_framework import serializers
+
+from base.serializers import BaseModelReadSerializer
 
 from languages.models import Language
 
 
-class LanguageSerializer(BaseModelSerializer):
+class LanguageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Language
         fields = '__all__'
+
+
+class LanguageLookupSerializer(LanguageSerializer):
+    class Meta(LanguageSerializer.Meta):
+        validators = []
+
+
+class LanguageReadSerializer(BaseModelReadSerializer):
+    def to_representation(self, instance) -> dict:
+        to_datetime = self.get_datetime_formatter()
+        return {
+            'id': instance.pk,
+            'created_at': to_datetime(instance.created_at),
+            'updated_at': to_datetime(instance.updated_at),
+            'code': instance.code,
+            'name': instance.name,
+            'native': instance.native,
+        }
@@ -2,7 +2,7 @@ import json
 
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.test import tag
+from django.test import override_settings, tag
 from django.urls import reverse
 
 from rest_framework import status
@@ -97,6 +97,7 @@ class LanguageSerializerTests(APITestCase):
 
 
 @tag('languages-viewset')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
 class LanguageViewSetTests(APITestCase):
     def setUp(self) -> None:
         self.language_1 = Language.objects.create(**{'code':'AA','name':'AAA','native':'AAA'})
@@ -167,6 +168,7 @@ class LanguageViewSetTests(APITestCase):
 
 
 @tag('languages-api')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
 class LanguageApiTests(APITestCase):
     def setUp(self) -> None:
         self.language_1 = Language.objects.create(**{'code':'AA','name':'AAA','native':'AAA'})
@@ -1,9 +1,12 @@
 from rest_framework import viewsets
 
+from base.mixins import CachedResponseMixin
+
 from languages.models import Language
 from languages.serializers import LanguageSerializer
 
 
-class LanguageViewSet(viewsets.ModelViewSet):
+class LanguageViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Language.objects.all()
     serializer_class = LanguageSerializer
+    etag_models = ('languages.language',)
@@ -11,6 +11,11 @@ class Location(BaseModel):
     languages = models.ManyToManyField(Language, blank=True)
     is_eu = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='location_created_at_id_idx'),
+        ]
+
     def __repr__(self) -> str:
         ret = [str(self.id)]
         if self.geoname_id:
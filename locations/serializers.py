@@ -1,24 +1,45 @@
-from base.serializers import BaseModelSerializer
+from rest_framework import serializers
+
+from base.serializers import BaseModelReadSerializer
 from languages.models import Language
 
-from languages.serializers import LanguageSerializer
+from languages.serializers import LanguageLookupSerializer, LanguageReadSerializer, LanguageSerializer
 
 from locations.models import Location
 
 
-class LocationSerializer(BaseModelSerializer):
+class LocationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = '__all__'
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['languages'] = LanguageSerializer(instance.languages, many=True).data
+        # .all() is served by languages prefetched with the location.
+        representation['languages'] = LanguageSerializer(instance.languages.all(), many=True).data
         return representation
 
 
-class LocationWithLanguagesSerializer(BaseModelSerializer):
-    languages = LanguageSerializer(required=True, many=True)
+class LocationReadSerializer(BaseModelReadSerializer):
+    language_serializer = LanguageReadSerializer()
+
+    def to_representation(self, instance) -> dict:
+        to_datetime = self.get_datetime_formatter()
+        to_language = self.language_serializer.to_representation
+        return {
+            'id': instance.pk,
+            'created_at': to_datetime(instance.created_at),
+            'updated_at': to_datetime(instance.updated_at),
+            'geoname_id': instance.geoname_id,
+            'capital': instance.capital,
+            'is_eu': instance.is_eu,
+            # .all() is served by languages prefetched with the location.
+            'languages': [to_language(language) for language in instance.languages.all()],
+        }
+
+
+class LocationWithLanguagesSerializer(serializers.ModelSerializer):
+    languages = LanguageLookupSerializer(required=True, many=True)
 
     class Meta:
         model = Location
@@ -26,7 +47,6 @@ class LocationWithLanguagesSerializer(BaseModelSerializer):
     
     def to_internal_value(self, data):
         internal_value = super().to_internal_value(data)
-        internal_value['languages'] = Language.objects.bulk_create(
-            [Language(**language) for language in internal_value['languages']]
-        )
+        if not self.context.get('defer_location'):
+            internal_value['languages'] = Language.objects.get_or_create_many(internal_value['languages'])
         return internal_value
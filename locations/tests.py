@@ -2,7 +2,7 @@ import json
 
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.test import tag
+from django.test import override_settings, tag
 from django.urls import reverse
 
 from rest_framework import status
@@ -129,6 +129,7 @@ class LocationSerializerTests(APITestCase):
 
 
 @tag('locations-viewset')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
 class LocationViewSetTests(APITestCase):
     def setUp(self) -> None:
         language_1 = Language.objects.create(**{'code':'AA','name':'AAA','native':'AAA'})
@@ -203,6 +204,7 @@ class LocationViewSetTests(APITestCase):
 
 
 @tag('locations-api')
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
 class LocationApiTests(APITestCase):
     def setUp(self) -> None:
         self.language_1 = Language.objects.create(**{'code':'AA','name':'AAA','native':'AAA'})
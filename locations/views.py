@@ -1,9 +1,12 @@
 from rest_framework import viewsets
 
+from base.mixins import CachedResponseMixin
+
 from locations.models import Location
 from locations.serializers import LocationSerializer
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
+    etag_models = ('locations.location', 'languages.language')